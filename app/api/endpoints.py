@@ -2,123 +2,826 @@
 API endpoints cho RAG Pipeline.
 """
 
-import os
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from typing import Dict, Optional
-from dotenv import load_dotenv
+import asyncio
+import json
+import hashlib
+from dataclasses import dataclass
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from typing import Dict, List, Optional, Tuple, Union
 import shutil
 from pathlib import Path
+from langchain_core.documents import Document
+from langchain_core.documents.compressor import BaseDocumentCompressor
+from langchain_core.retrievers import BaseRetriever
 
-from ..models.document import DocumentProcessor
-from ..models.embeddings import EmbeddingManager
-from ..models.llm import LLMManager
-from ..models.chat_history import ChatHistoryManager
+from ..models.embeddings import EmbeddingModelMismatchError
+from ..models.concurrency import run_blocking
+from ..models.fanout import FanOutRetriever
+from ..models.metrics import (
+    CONTEXT_TOKENS,
+    REQUEST_LATENCY,
+    Timings,
+    render_metrics,
+    span
+)
+from ..config import (
+    RERANK_FETCH_K,
+    RETRIEVAL_MODE,
+    SEARCH_TYPE,
+    MMR_FETCH_K,
+    MMR_LAMBDA,
+    SEARCH_SCORE_THRESHOLD,
+    QUERY_CONDENSE_MODE,
+    BATCH_MAX_QUESTIONS,
+    BATCH_RETRIEVAL_SIZE,
+    BATCH_MAX_CONCURRENCY
+)
+from .services import (
+    UPLOAD_DIR,
+    embedding_manager,
+    llm_manager,
+    chat_history_manager,
+    ingestion_job_manager,
+    context_builder,
+    summarization_engine,
+    answer_cache
+)
+from .initialization import startup_state
 from .schemas import (
     MessageRequest,
     MessageResponse,
-    ChatHistoryResponse
+    BatchMessageRequest,
+    BatchMessageResult,
+    ChatHistoryResponse,
+    IngestionJobResponse
 )
 
-# Load environment variables
-load_dotenv()
-
 router = APIRouter()
-api_key = os.getenv("GOOGLE_API_KEY")
 
-# Tạo thư mục lưu trữ
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
 
-# Khởi tạo các managers
-document_processor = DocumentProcessor()
-embedding_manager = EmbeddingManager(
-    api_key=api_key,
-    persist_directory=str(UPLOAD_DIR / "vector_store")
-)
-llm_manager = LLMManager(api_key)
-chat_history_manager = ChatHistoryManager()
+async def _setup_retrieval(
+    collection_names: List[str],
+    rerank_mode: Optional[str] = None,
+    rerank_top_n: Optional[int] = None,
+    rerank_score_threshold: Optional[float] = None,
+    retrieval_mode: Optional[str] = None,
+    search_type: Optional[str] = None,
+    fetch_k: Optional[int] = None,
+    lambda_mult: Optional[float] = None,
+    search_score_threshold: Optional[float] = None,
+    timings: Optional[Timings] = None
+) -> Tuple[BaseRetriever, BaseDocumentCompressor]:
+    """
+    Mở các collection và dựng retriever cùng compressor dùng để rerank.
+
+    Với nhiều collection, các collection được truy vấn song song và kết quả
+    được gộp thành top-k chung (đã loại trùng) trước khi rerank.
+
+    Args:
+        collection_names: Các collection cần truy vấn
+        rerank_mode: Chế độ rerank ("cross_encoder" hoặc "llm")
+        rerank_top_n: Số document giữ lại sau rerank
+        rerank_score_threshold: Điểm tối thiểu để giữ document
+        retrieval_mode: "hybrid", "vector" hoặc "bm25"
+        search_type: Tìm kiếm vector "mmr" hoặc "similarity"
+        fetch_k: Số candidate lấy một lần cho MMR
+        lambda_mult: Hệ số MMR (1 chỉ xét độ liên quan, 0 chỉ xét độ đa dạng)
+        search_score_threshold: Cosine similarity tối thiểu với câu hỏi
+        timings: Nơi ghi thời gian stage "vector_store_open"
+
+    Returns:
+        Tuple[BaseRetriever, BaseDocumentCompressor]: Retriever lấy candidate và
+            compressor rerank candidate
+    """
+    retrieval_mode = retrieval_mode or RETRIEVAL_MODE
+    timings = timings or Timings("retrieve")
+    with timings.span("vector_store_open"):
+        # Lấy handle của collection từ cache, không dùng chung self.vector_store
+        vector_stores = await asyncio.gather(*(
+            embedding_manager.aget_vector_store(collection_name=name)
+            for name in collection_names
+        ))
+        if retrieval_mode != "vector":
+            # Load chỉ mục BM25 từ disk (lần đầu) ngoài event loop
+            await asyncio.gather(*(
+                run_blocking(embedding_manager.get_lexical_index, name)
+                for name in collection_names
+            ))
+
+    mode = rerank_mode or llm_manager.rerank_mode
+    # Cross-encoder rẻ nên lấy nhiều candidate hơn rồi giữ top_n
+    k = RERANK_FETCH_K if mode == "cross_encoder" else 5
+    retrievers = {
+        name: embedding_manager.get_retriever(
+            k=k,
+            search_type=search_type or SEARCH_TYPE,
+            vector_store=vector_store,
+            retrieval_mode=retrieval_mode,
+            collection_name=name,
+            fetch_k=fetch_k or MMR_FETCH_K,
+            lambda_mult=MMR_LAMBDA if lambda_mult is None else lambda_mult,
+            score_threshold=(
+                SEARCH_SCORE_THRESHOLD if search_score_threshold is None
+                else search_score_threshold
+            )
+        )
+        for name, vector_store in zip(collection_names, vector_stores)
+    }
+    if len(retrievers) == 1:
+        base_retriever = retrievers[collection_names[0]]
+    else:
+        base_retriever = FanOutRetriever(
+            retrievers=retrievers,
+            k=k,
+            embeddings=embedding_manager.embeddings if retrieval_mode != "bm25" else None
+        )
+    # Compressor được dựng một lần cho mỗi cấu hình rerank và dùng chung
+    compressor = llm_manager.get_compressor(
+        mode=mode,
+        top_n=rerank_top_n,
+        score_threshold=rerank_score_threshold
+    )
+    return base_retriever, compressor
+
+
+async def _retrieve_documents(
+    question: str,
+    collection_name: Optional[str] = None,
+    timings: Optional[Timings] = None,
+    collection_names: Optional[List[str]] = None,
+    query_embedded: bool = False,
+    **kwargs
+) -> List[Document]:
+    """
+    Truy vấn vector store và rerank để lấy các document liên quan.
+
+    Args:
+        question: Câu hỏi
+        collection_name: Tên collection trong ChromaDB
+        timings: Nơi ghi thời gian các stage "vector_store_open", "embed_query",
+            "search" và "rerank"
+        collection_names: Các collection cần truy vấn, thay cho collection_name
+        query_embedded: Câu hỏi đã được embed (vector nằm trong embedding cache)
+        **kwargs: Tham số rerank và tìm kiếm của _setup_retrieval
+
+    Returns:
+        List[Document]: Danh sách document liên quan
+    """
+    collection_names = collection_names or [collection_name or "default_collection"]
+    timings = timings or Timings("retrieve")
+    base_retriever, compressor = await _setup_retrieval(collection_names, timings=timings, **kwargs)
+
+    if (kwargs.get("retrieval_mode") or RETRIEVAL_MODE) != "bm25" and not query_embedded:
+        # Embed câu hỏi trong stage riêng; retriever lấy lại vector từ embedding cache
+        with timings.span("embed_query"):
+            await embedding_manager.aembed_query(question)
+    # Lấy relevant documents: tìm kiếm và rerank được đo riêng
+    # (tương đương reranker.ainvoke)
+    with timings.span("search"):
+        candidates = await llm_manager.aget_relevant_documents(base_retriever, question)
+    with timings.span("rerank"):
+        return list(await compressor.acompress_documents(candidates, question))
+
+
+async def _retrieve_documents_batch(
+    questions: List[str],
+    collection_names: List[str],
+    timings: Optional[Timings] = None,
+    query_embedded: bool = False,
+    **kwargs
+) -> List[Union[List[Document], Exception]]:
+    """
+    Phiên bản batch của _retrieve_documents.
+
+    Các câu hỏi được tìm kiếm cùng nhau (retriever.abatch: một truy vấn vector
+    store cho cả batch), sau đó rerank song song từng câu hỏi.
+
+    Args:
+        questions: Các câu hỏi
+        collection_names: Các collection cần truy vấn
+        timings: Nơi ghi thời gian các stage "vector_store_open", "embed_query",
+            "search" và "rerank"
+        query_embedded: Các câu hỏi đã được embed (vector nằm trong embedding cache)
+        **kwargs: Tham số rerank và tìm kiếm của _setup_retrieval
+
+    Returns:
+        List[Union[List[Document], Exception]]: Document của từng câu hỏi, hoặc
+            lỗi khi rerank câu hỏi đó thất bại
+    """
+    timings = timings or Timings("retrieve")
+    base_retriever, compressor = await _setup_retrieval(collection_names, timings=timings, **kwargs)
+    if (kwargs.get("retrieval_mode") or RETRIEVAL_MODE) != "bm25" and not query_embedded:
+        # Một request embedding cho cả batch, retriever lấy lại vector từ embedding cache
+        with timings.span("embed_query"):
+            await embedding_manager.aembed_queries(questions)
+    with timings.span("search"):
+        candidates = await base_retriever.abatch(questions)
+    with timings.span("rerank"):
+        results = await asyncio.gather(
+            *(
+                compressor.acompress_documents(docs, question)
+                for docs, question in zip(candidates, questions)
+            ),
+            return_exceptions=True
+        )
+    return [result if isinstance(result, Exception) else list(result) for result in results]
+
+
+async def _condense_question(question: str, history: List[Dict[str, str]]) -> str:
+    """
+    Viết lại câu hỏi nối tiếp thành câu hỏi độc lập để retrieval theo QUERY_CONDENSE_MODE.
+
+    Args:
+        question: Câu hỏi hiện tại
+        history: Các tin nhắn trước câu hỏi
+
+    Returns:
+        str: Câu hỏi dùng để retrieval
+    """
+    if not history or QUERY_CONDENSE_MODE == "off":
+        return question
+    if QUERY_CONDENSE_MODE == "concat":
+        previous = [message["content"] for message in history if message["role"] == "user"]
+        return f"{previous[-1]} {question}" if previous else question
+    return await llm_manager.acondense_question(
+        question,
+        context_builder.format_history(history)
+    )
+
+
+async def _resolve_collections(
+    collection_name: Optional[str],
+    collection_names: Optional[List[str]]
+) -> List[str]:
+    """
+    Xác định các collection cần truy vấn.
+
+    Args:
+        collection_name: Collection đơn, mặc định "default_collection"
+        collection_names: Danh sách collection, "*" để truy vấn tất cả
+
+    Returns:
+        List[str]: Tên các collection
+
+    Raises:
+        HTTPException: 404 nếu có collection không tồn tại
+    """
+    if not collection_names:
+        return [collection_name or "default_collection"]
+
+    existing = await embedding_manager.alist_collections()
+    if "*" in collection_names:
+        if not existing:
+            raise HTTPException(status_code=404, detail="Chưa có collection nào")
+        return existing
+    names = list(dict.fromkeys(collection_names))
+    missing = [name for name in names if name not in existing]
+    if missing:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Không tìm thấy collection: {', '.join(missing)}"
+        )
+    return names
+
+
+def _cache_namespace(**params) -> str:
+    """Khóa của prompt và tham số sinh, hai request chỉ dùng chung cache khi khóa trùng nhau."""
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class AnswerOptions:
+    """Tham số query chung của các endpoint hỏi đáp và các giá trị suy ra từ chúng."""
+    collections: List[str]
+    retrieval_mode: str
+    custom_prompt: Optional[str] = None
+    max_tokens: Optional[int] = None
+    rerank_mode: Optional[str] = None
+    rerank_top_n: Optional[int] = None
+    rerank_score_threshold: Optional[float] = None
+    search_type: Optional[str] = None
+    fetch_k: Optional[int] = None
+    lambda_mult: Optional[float] = None
+    search_score_threshold: Optional[float] = None
+    no_cache: bool = False
+    # Khóa cache của một tập collection đổi khi bất kỳ collection nào được ghi lại
+    version: int = 0
+    namespace: str = ""
+
+    @property
+    def collection(self) -> str:
+        """Tên tập collection dùng làm khóa answer cache."""
+        return "+".join(self.collections)
+
+    def retrieval_params(self) -> Dict:
+        """Tham số rerank và tìm kiếm truyền cho _setup_retrieval."""
+        return dict(
+            rerank_mode=self.rerank_mode,
+            rerank_top_n=self.rerank_top_n,
+            rerank_score_threshold=self.rerank_score_threshold,
+            retrieval_mode=self.retrieval_mode,
+            search_type=self.search_type,
+            fetch_k=self.fetch_k,
+            lambda_mult=self.lambda_mult,
+            search_score_threshold=self.search_score_threshold
+        )
+
+    def generation_params(self) -> Dict:
+        """Tham số sinh truyền cho LLM."""
+        return {"max_output_tokens": self.max_tokens} if self.max_tokens else {}
+
+
+async def answer_options(
+    custom_prompt: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+    collection_name: Optional[str] = None,
+    rerank_mode: Optional[str] = None,
+    rerank_top_n: Optional[int] = None,
+    rerank_score_threshold: Optional[float] = None,
+    retrieval_mode: Optional[str] = None,
+    search_type: Optional[str] = None,
+    fetch_k: Optional[int] = None,
+    lambda_mult: Optional[float] = None,
+    search_score_threshold: Optional[float] = None,
+    collection_names: Optional[List[str]] = Query(None),
+    no_cache: bool = False
+) -> AnswerOptions:
+    """
+    Dependency đọc tham số query chung, xác định collection và khóa cache.
+
+    Args:
+        custom_prompt: Prompt tùy chỉnh cho LLM
+        max_tokens: Số token tối đa cho output
+        collection_name: Tên collection trong ChromaDB
+        rerank_mode: Chế độ rerank ("cross_encoder" hoặc "llm")
+        rerank_top_n: Số document giữ lại sau rerank
+        rerank_score_threshold: Điểm tối thiểu để giữ document
+        retrieval_mode: "hybrid", "vector" hoặc "bm25" (không gọi API embedding)
+        search_type: Tìm kiếm vector "mmr" hoặc "similarity"
+        fetch_k: Số candidate lấy một lần cho MMR
+        lambda_mult: Hệ số MMR (1 chỉ xét độ liên quan, 0 chỉ xét độ đa dạng)
+        search_score_threshold: Cosine similarity tối thiểu giữa chunk và câu hỏi
+        collection_names: Truy vấn song song nhiều collection (lặp lại tham số,
+            "*" để truy vấn tất cả) thay cho collection_name
+        no_cache: Không dùng câu trả lời có sẵn trong cache (câu trả lời mới vẫn được lưu)
+
+    Returns:
+        AnswerOptions: Tham số đã chuẩn hóa cùng collection và khóa cache
+
+    Raises:
+        HTTPException: 404 nếu có collection không tồn tại
+    """
+    try:
+        collections = await _resolve_collections(collection_name, collection_names)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    options = AnswerOptions(
+        collections=collections,
+        retrieval_mode=retrieval_mode or RETRIEVAL_MODE,
+        custom_prompt=custom_prompt,
+        max_tokens=max_tokens,
+        rerank_mode=rerank_mode,
+        rerank_top_n=rerank_top_n,
+        rerank_score_threshold=rerank_score_threshold,
+        search_type=search_type,
+        fetch_k=fetch_k,
+        lambda_mult=lambda_mult,
+        search_score_threshold=search_score_threshold,
+        no_cache=no_cache,
+        version=sum(embedding_manager.collection_version(name) for name in collections)
+    )
+    options.namespace = _cache_namespace(
+        custom_prompt=custom_prompt,
+        max_tokens=max_tokens,
+        **options.retrieval_params()
+    )
+    return options
+
+
+def _sse(event: str, data: Dict) -> str:
+    """Định dạng một sự kiện Server-Sent Events."""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
 
 
 @router.post("/message-generator", response_model=MessageResponse)
 async def generate_message(
     request: MessageRequest,
-    custom_prompt: Optional[str] = None,
-    max_tokens: Optional[int] = None,
-    collection_name: Optional[str] = None
+    options: AnswerOptions = Depends(answer_options),
+    include_timings: bool = False
 ) -> Dict:
     """
     Endpoint tạo message dựa trên câu hỏi và dữ liệu từ ChromaDB.
 
     Args:
         request: Request chứa câu hỏi
-        custom_prompt: Prompt tùy chỉnh cho LLM
-        max_tokens: Số token tối đa cho output
-        collection_name: Tên collection trong ChromaDB
+        options: Tham số truy vấn và sinh chung (xem answer_options)
+        include_timings: Trả kèm thời gian (ms) của từng stage
 
     Returns:
         MessageResponse: Response chứa câu trả lời và context
     """
+    timings = Timings("message")
     try:
-        print("Bắt đầu xử lý request:", request)
         # Tạo session mới nếu chưa có
         if not request.session_id:
-            request.session_id = chat_history_manager.create_session()
+            request.session_id = await chat_history_manager.acreate_session()
 
-        # Lưu câu hỏi vào chat history
-        chat_history_manager.add_message(
-            session_id=request.session_id,
-            role="user",
-            content=request.question
-        )
+        # Đọc các lượt hội thoại trước câu hỏi hiện tại
+        with timings.span("history_read"):
+            history = await chat_history_manager.aget_chat_history(
+                session_id=request.session_id,
+                limit=context_builder.history_limit
+            ) or []
 
-        print("Đã thêm message vào history")
-        # Load vector store từ ChromaDB
-        if collection_name:
-            embedding_manager.load_vector_store(
-                collection_name=collection_name)
-        else:
-            embedding_manager.load_vector_store(collection_name="default_collection")
-
-        print("Đã load vector store")
-        # Lấy retriever và thực hiện reranking
-        base_retriever = embedding_manager.get_retriever(
-            k=5,
-            search_type="mmr"  # Sử dụng MMR để đa dạng kết quả
-        )
-        reranker = llm_manager.setup_reranker(base_retriever)
+        # Lưu câu hỏi vào chat history
+        with timings.span("history_write"):
+            await chat_history_manager.aadd_message(
+                session_id=request.session_id,
+                role="user",
+                content=request.question
+            )
 
-        # Lấy relevant documents
-        relevant_docs = reranker.get_relevant_documents(request.question)
-        context = "\n".join([doc.page_content for doc in relevant_docs])
+        # Câu hỏi nối tiếp được viết lại thành câu hỏi độc lập trước khi retrieval
+        with timings.span("condense_query"):
+            query = await _condense_question(request.question, history)
+        # Tìm câu trả lời của câu hỏi tương tự trong cache
+        question_vector = None
+        cached = None
+        # Cache theo ngữ nghĩa chỉ dùng cho câu hỏi đầu tiên của session vì câu trả
+        # lời của câu hỏi nối tiếp phụ thuộc lịch sử; chế độ bm25 không gọi API embedding
+        if options.retrieval_mode != "bm25" and not history:
+            with timings.span("embed_query"):
+                question_vector = await embedding_manager.aembed_query(request.question)
+            if not options.no_cache:
+                with timings.span("answer_cache"):
+                    cached = answer_cache.lookup(
+                        options.collection, options.version, options.namespace, question_vector
+                    )
 
-        # Tạo câu trả lời
-        kwargs = {}
-        if max_tokens:
-            kwargs["max_output_tokens"] = max_tokens
+        if cached:
+            answer = cached["answer"]
+            context = cached["context"]
+        else:
+            relevant_docs = await _retrieve_documents(
+                question=query,
+                collection_names=options.collections,
+                timings=timings,
+                query_embedded=question_vector is not None and query == request.question,
+                **options.retrieval_params()
+            )
+            # Loại chunk trùng lặp, sắp theo điểm và ghép cùng lịch sử trong giới hạn token
+            with timings.span("context_build"):
+                built = context_builder.build(relevant_docs, history)
+            context = built.context
+            CONTEXT_TOKENS.observe(built.tokens)
 
-        answer = llm_manager.generate_response(
-            question=request.question,
-            context=context,
-            custom_prompt=custom_prompt,
-            **kwargs
-        )
+            # Tạo câu trả lời
+            with timings.span("generate"):
+                answer = await llm_manager.agenerate_response(
+                    question=request.question,
+                    context=context,
+                    custom_prompt=options.custom_prompt,
+                    bypass_cache=options.no_cache,
+                    **options.generation_params()
+                )
+            if question_vector is not None:
+                answer_cache.store(
+                    options.collection, options.version, options.namespace, question_vector,
+                    question=request.question,
+                    answer=answer,
+                    context=context,
+                    sources=[doc.metadata for doc in built.documents]
+                )
 
         # Lưu câu trả lời vào chat history
-        chat_history_manager.add_message(
-            session_id=request.session_id,
-            role="assistant",
-            content=answer
-        )
+        with timings.span("persist"):
+            await chat_history_manager.aadd_message(
+                session_id=request.session_id,
+                role="assistant",
+                content=answer
+            )
 
+        REQUEST_LATENCY.labels("message-generator").observe(timings.total())
         return MessageResponse(
             answer=answer,
             context=context,
-            session_id=request.session_id
+            session_id=request.session_id,
+            timings=timings.as_dict() if include_timings else None
         )
 
+    except HTTPException:
+        raise
+    except EmbeddingModelMismatchError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/message-generator/stream")
+async def stream_message(
+    request: MessageRequest,
+    options: AnswerOptions = Depends(answer_options),
+    include_timings: bool = False
+) -> StreamingResponse:
+    """
+    Endpoint tạo message dạng stream (Server-Sent Events).
+
+    Gửi sự kiện "context" chứa context và nguồn trước, sau đó mỗi đoạn câu
+    trả lời là một sự kiện "token", cuối cùng là "done" (hoặc "error").
+    Câu trả lời hoàn chỉnh được lưu vào chat history khi stream kết thúc.
+
+    Args:
+        request: Request chứa câu hỏi
+        options: Tham số truy vấn và sinh chung (xem answer_options)
+        include_timings: Gửi kèm thời gian (ms) của từng stage trong sự kiện "done"
+
+    Returns:
+        StreamingResponse: Stream text/event-stream
+    """
+    timings = Timings("message_stream")
+    try:
+        if not request.session_id:
+            request.session_id = await chat_history_manager.acreate_session()
+
+        with timings.span("history_read"):
+            history = await chat_history_manager.aget_chat_history(
+                session_id=request.session_id,
+                limit=context_builder.history_limit
+            ) or []
+
+        with timings.span("history_write"):
+            await chat_history_manager.aadd_message(
+                session_id=request.session_id,
+                role="user",
+                content=request.question
+            )
+
+        with timings.span("condense_query"):
+            query = await _condense_question(request.question, history)
+
+        question_vector = None
+        cached = None
+        # Cache theo ngữ nghĩa chỉ dùng cho câu hỏi đầu tiên của session vì câu trả
+        # lời của câu hỏi nối tiếp phụ thuộc lịch sử; chế độ bm25 không gọi API embedding
+        if options.retrieval_mode != "bm25" and not history:
+            with timings.span("embed_query"):
+                question_vector = await embedding_manager.aembed_query(request.question)
+            if not options.no_cache:
+                with timings.span("answer_cache"):
+                    cached = answer_cache.lookup(
+                        options.collection, options.version, options.namespace, question_vector
+                    )
+
+        if cached:
+            context = cached["context"]
+            sources = cached["sources"]
+        else:
+            relevant_docs = await _retrieve_documents(
+                question=query,
+                collection_names=options.collections,
+                timings=timings,
+                query_embedded=question_vector is not None and query == request.question,
+                **options.retrieval_params()
+            )
+            with timings.span("context_build"):
+                built = context_builder.build(relevant_docs, history)
+            context = built.context
+            sources = [doc.metadata for doc in built.documents]
+            CONTEXT_TOKENS.observe(built.tokens)
+
+    except HTTPException:
+        raise
+    except EmbeddingModelMismatchError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    async def event_stream():
+        yield _sse("context", {
+            "session_id": request.session_id,
+            "context": context,
+            "sources": sources,
+            "cached": bool(cached)
+        })
+
+        if cached:
+            # Câu trả lời đã có sẵn, gửi một lần
+            answer = cached["answer"]
+            yield _sse("token", {"text": answer})
+        else:
+            parts = []
+            try:
+                # Thời gian tới token đầu tiên và thời gian sinh toàn bộ câu trả lời
+                with timings.span("generate"):
+                    async for token in llm_manager.astream_response(
+                        question=request.question,
+                        context=context,
+                        custom_prompt=options.custom_prompt,
+                        bypass_cache=options.no_cache,
+                        **options.generation_params()
+                    ):
+                        if not parts:
+                            timings.stages["first_token"] = timings.total()
+                        parts.append(token)
+                        yield _sse("token", {"text": token})
+            except Exception as e:
+                yield _sse("error", {"detail": str(e)})
+                return
+
+            answer = "".join(parts)
+            if question_vector is not None:
+                answer_cache.store(
+                    options.collection, options.version, options.namespace, question_vector,
+                    question=request.question,
+                    answer=answer,
+                    context=context,
+                    sources=sources
+                )
+
+        with timings.span("persist"):
+            await chat_history_manager.aadd_message(
+                session_id=request.session_id,
+                role="assistant",
+                content=answer
+            )
+        REQUEST_LATENCY.labels("message-generator/stream").observe(timings.total())
+        done = {"session_id": request.session_id}
+        if include_timings:
+            done["timings"] = timings.as_dict()
+        yield _sse("done", done)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Tắt buffering của nginx để token tới client ngay
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+@router.post("/message-generator/batch")
+async def generate_messages_batch(
+    request: BatchMessageRequest,
+    options: AnswerOptions = Depends(answer_options),
+    max_concurrency: Optional[int] = None,
+    include_context: bool = False
+) -> StreamingResponse:
+    """
+    Endpoint hỏi đáp theo batch cho các job offline (đánh giá, sinh sẵn FAQ).
+
+    Mỗi lượt BATCH_RETRIEVAL_SIZE câu hỏi được embed trong một request batch và
+    tìm kiếm cùng nhau; lượt tiếp theo được retrieval trong lúc lượt hiện tại
+    đang sinh câu trả lời với tối đa max_concurrency request LLM đồng thời.
+    Kết quả trả về dạng NDJSON (mỗi dòng một BatchMessageResult) theo thứ tự
+    hoàn thành; lỗi của một câu hỏi nằm trong trường "error" của dòng đó.
+    Batch không ghi chat history.
+
+    Args:
+        request: Request chứa danh sách câu hỏi
+        options: Tham số truy vấn và sinh chung (xem answer_options)
+        max_concurrency: Số request LLM đồng thời, mặc định BATCH_MAX_CONCURRENCY
+        include_context: Trả kèm context của từng câu hỏi
+
+    Returns:
+        StreamingResponse: Stream application/x-ndjson
+    """
+    questions = request.questions
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Tối đa {BATCH_MAX_QUESTIONS} câu hỏi mỗi request"
+        )
+    timings = Timings("message_batch")
+
+    def line(index: int, **fields) -> str:
+        result = BatchMessageResult(
+            index=index,
+            id=questions[index].id,
+            question=questions[index].question,
+            **fields
+        )
+        return result.model_dump_json(exclude_none=True) + "\n"
+
+    async def retrieve(start: int) -> Dict:
+        """Embed, tra cache và retrieval cho một lượt câu hỏi bắt đầu từ start."""
+        indexes = list(range(start, min(start + BATCH_RETRIEVAL_SIZE, len(questions))))
+        texts = [questions[index].question for index in indexes]
+        vectors: List[Optional[List[float]]] = [None] * len(indexes)
+        cached: Dict[int, Dict] = {}
+        if options.retrieval_mode != "bm25":
+            # Một request embedding cho cả lượt, các retriever sau đó dùng cache
+            try:
+                with timings.span("embed_query"):
+                    vectors = await embedding_manager.aembed_queries(texts)
+            except Exception as e:
+                return {
+                    "indexes": indexes,
+                    "vectors": {},
+                    "cached": {},
+                    "documents": {index: e for index in indexes}
+                }
+            for index, vector in zip(indexes, vectors):
+                hit = None if options.no_cache else answer_cache.lookup(
+                    options.collection, options.version, options.namespace, vector
+                )
+                if hit:
+                    cached[index] = hit
+
+        pending = [i for i, index in enumerate(indexes) if index not in cached]
+        documents: Dict[int, Union[List[Document], Exception]] = {}
+        if pending:
+            try:
+                results = await _retrieve_documents_batch(
+                    [texts[i] for i in pending],
+                    options.collections,
+                    timings=timings,
+                    # Cả lượt đã được embed ở trên (trừ chế độ bm25)
+                    query_embedded=True,
+                    **options.retrieval_params()
+                )
+            except Exception as e:
+                results = [e] * len(pending)
+            documents = {indexes[i]: result for i, result in zip(pending, results)}
+        return {
+            "indexes": indexes,
+            "vectors": dict(zip(indexes, vectors)),
+            "cached": cached,
+            "documents": documents
+        }
+
+    async def result_stream():
+        next_round = asyncio.create_task(retrieve(0)) if questions else None
+        start = 0
+        try:
+            while next_round is not None:
+                current = await next_round
+                start += BATCH_RETRIEVAL_SIZE
+                # Retrieval lượt sau chạy trong lúc sinh câu trả lời cho lượt này
+                next_round = asyncio.create_task(retrieve(start)) if start < len(questions) else None
+
+                for index, hit in current["cached"].items():
+                    yield line(
+                        index,
+                        answer=hit["answer"],
+                        context=hit["context"] if include_context else None,
+                        sources=hit["sources"],
+                        cached=True
+                    )
+
+                items = []
+                built_by_index = {}
+                for index, docs in current["documents"].items():
+                    if isinstance(docs, Exception):
+                        yield line(index, error=str(docs))
+                        continue
+                    built = context_builder.build(docs, [])
+                    CONTEXT_TOKENS.observe(built.tokens)
+                    built_by_index[index] = built
+                    items.append(index)
+
+                async for position, answer in llm_manager.agenerate_responses(
+                    [(questions[index].question, built_by_index[index].context) for index in items],
+                    custom_prompt=options.custom_prompt,
+                    max_concurrency=max_concurrency or BATCH_MAX_CONCURRENCY,
+                    bypass_cache=options.no_cache,
+                    **options.generation_params()
+                ):
+                    index = items[position]
+                    built = built_by_index[index]
+                    sources = [doc.metadata for doc in built.documents]
+                    if isinstance(answer, Exception):
+                        yield line(index, error=str(answer), sources=sources)
+                        continue
+                    vector = current["vectors"].get(index)
+                    if vector is not None:
+                        answer_cache.store(
+                            options.collection, options.version, options.namespace, vector,
+                            question=questions[index].question,
+                            answer=answer,
+                            context=built.context,
+                            sources=sources
+                        )
+                    yield line(
+                        index,
+                        answer=answer,
+                        context=built.context if include_context else None,
+                        sources=sources
+                    )
+        finally:
+            if next_round is not None:
+                next_round.cancel()
+            REQUEST_LATENCY.labels("message-generator/batch").observe(timings.total())
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
 
 @router.get("/chat-history/{session_id}", response_model=ChatHistoryResponse)
 async def get_chat_history(
@@ -136,23 +839,24 @@ async def get_chat_history(
         ChatHistoryResponse: Lịch sử chat
     """
     try:
-        session = chat_history_manager.get_session(session_id)
+        # Chỉ đọc metadata và limit tin nhắn cuối, không load cả session
+        session = await chat_history_manager.aget_session_info(session_id)
         if not session:
             raise HTTPException(
                 status_code=404,
                 detail="Session not found"
             )
 
-        messages = chat_history_manager.get_chat_history(
+        messages = await chat_history_manager.aget_chat_history(
             session_id=session_id,
             limit=limit
         )
 
         return ChatHistoryResponse(
             session_id=session_id,
-            messages=messages,
-            created_at=session.created_at,
-            updated_at=session.updated_at
+            messages=messages or [],
+            created_at=session["created_at"],
+            updated_at=session["updated_at"]
         )
 
     except Exception as e:
@@ -171,7 +875,7 @@ async def delete_chat_history(session_id: str) -> Dict:
         Dict: Thông báo kết quả
     """
     try:
-        success = chat_history_manager.delete_session(session_id)
+        success = await chat_history_manager.adelete_session(session_id)
         if not success:
             raise HTTPException(
                 status_code=404,
@@ -184,42 +888,39 @@ async def delete_chat_history(session_id: str) -> Dict:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/upload")
+@router.post("/upload", status_code=202)
 async def upload_file(
     file: UploadFile = File(...),
     collection_name: Optional[str] = None
 ) -> Dict:
     """
-    Upload và xử lý file.
+    Upload file và đưa việc xử lý vào hàng đợi chạy nền.
 
     Args:
         file: File cần upload
         collection_name: Tên collection cho vector store
 
     Returns:
-        Dict: Thông tin về file đã upload
+        Dict: Thông tin về file đã upload và ID của job xử lý
     """
     try:
         # Lưu file
         file_path = UPLOAD_DIR / file.filename
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        with span("ingest", "save_file"), file_path.open("wb") as buffer:
+            await run_blocking(shutil.copyfileobj, file.file, buffer)
 
-        # Xử lý document
-        documents = document_processor.load_document(str(file_path))
-
-        # Tạo vector store
+        # Đọc, embed và index được làm ở background
         collection = collection_name or Path(file.filename).stem
-        embedding_manager.create_vector_store(
-            documents,
-            collection_name=collection
+        job_id = ingestion_job_manager.create_job(
+            filename=file.filename,
+            file_path=str(file_path),
+            collection=collection
         )
-
-        # Lưu vector store
-        embedding_manager.persist()
+        ingestion_job_manager.submit(job_id)
 
         return {
-            "message": "File uploaded and processed successfully",
+            "message": "File uploaded, processing in background",
+            "job_id": job_id,
             "filename": file.filename,
             "collection": collection
         }
@@ -228,26 +929,132 @@ async def upload_file(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/upload/{job_id}", response_model=IngestionJobResponse)
+async def get_upload_status(job_id: str) -> Dict:
+    """
+    Lấy trạng thái xử lý của một file upload.
+
+    Args:
+        job_id: ID của job trả về từ /upload
+
+    Returns:
+        IngestionJobResponse: Trạng thái và tiến độ từng stage của job
+    """
+    job = ingestion_job_manager.get_job(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=404,
+            detail="Job not found"
+        )
+    return job
+
+
+@router.get("/metrics")
+async def get_metrics() -> Response:
+    """
+    Xuất metrics (thời gian từng stage, số token, tỉ lệ hit của cache) cho Prometheus.
+
+    Returns:
+        Response: Metrics theo định dạng text của Prometheus
+    """
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+@router.get("/health/live")
+async def liveness() -> Dict:
+    """
+    Liveness probe: process còn chạy và event loop còn phản hồi.
+
+    Returns:
+        Dict: {"status": "ok"}
+    """
+    return {"status": "ok"}
+
+
+@router.get("/health/ready")
+async def readiness() -> JSONResponse:
+    """
+    Readiness probe: trả 200 khi warm-up (model, client, collection) đã xong,
+    503 trong lúc đang khởi động.
+
+    Returns:
+        JSONResponse: Trạng thái, thời gian và lỗi (nếu có) của từng bước warm-up
+    """
+    return JSONResponse(
+        content=startup_state.as_dict(),
+        status_code=200 if startup_state.ready else 503
+    )
+
+
+@router.get("/cache-stats")
+async def get_cache_stats() -> Dict:
+    """
+    Lấy thống kê hit/miss của các cache.
+
+    Returns:
+        Dict: Thống kê của cache embedding, cache câu trả lời theo ngữ nghĩa và
+            cache câu trả lời của LLM
+    """
+    return {
+        "embedding_cache": embedding_manager.cache_stats(),
+        "answer_cache": answer_cache.stats(),
+        "llm_response_cache": llm_manager.response_cache.stats()
+    }
+
+
 @router.post("/summarize")
 async def summarize_text(
-    text: str = Form(...),
-    max_length: int = Form(200)
+    text: Optional[str] = Form(None),
+    max_length: int = Form(200),
+    collection_name: Optional[str] = Form(None),
+    file_name: Optional[str] = Form(None),
+    no_cache: bool = Form(False)
 ) -> Dict:
     """
-    Tạo tóm tắt cho văn bản.
+    Tạo tóm tắt cho văn bản, hoặc cho một collection/file đã ingest.
+
+    Văn bản dài được split và tóm tắt theo map-reduce: các phần được tóm tắt
+    song song rồi gộp dần thành một bản tóm tắt.
 
     Args:
         text: Văn bản cần tóm tắt
         max_length: Độ dài tối đa của tóm tắt
+        collection_name: Tóm tắt toàn bộ collection này (khi không gửi text)
+        file_name: Chỉ tóm tắt file này trong collection
+        no_cache: Không dùng bản tóm tắt có sẵn trong cache (kết quả mới vẫn được lưu)
 
     Returns:
-        Dict: Tóm tắt được tạo ra
+        Dict: Tóm tắt được tạo ra, số chunk và số tầng reduce
     """
-    try:
-        summary = llm_manager.generate_summary(
-            text=text,
-            max_length=max_length
+    if not text and not collection_name and not file_name:
+        raise HTTPException(
+            status_code=400,
+            detail="Cần text hoặc collection_name/file_name"
         )
-        return {"summary": summary}
+
+    try:
+        if text:
+            result = await summarization_engine.asummarize_text(
+                text,
+                max_length=max_length,
+                bypass_cache=no_cache
+            )
+        else:
+            documents = await run_blocking(
+                embedding_manager.get_documents,
+                collection_name or "default_collection",
+                source=file_name
+            )
+            if not documents:
+                raise HTTPException(status_code=404, detail="Không tìm thấy tài liệu")
+            result = await summarization_engine.asummarize_documents(
+                documents,
+                max_length=max_length,
+                bypass_cache=no_cache
+            )
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
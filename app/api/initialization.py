@@ -1,48 +1,204 @@
 # file: app/api/initialization.py
 
+import asyncio
+import hashlib
+import json
 import os
+import time
 from pathlib import Path
-from ..models.document import DocumentProcessor
-from ..models.embeddings import EmbeddingManager
-from dotenv import load_dotenv
-
-load_dotenv()
-
-api_key = os.getenv("GOOGLE_API_KEY")
-document_processor = DocumentProcessor()
-embedding_manager = EmbeddingManager(
-    api_key=api_key,
-    persist_directory=str(Path("uploads") / "vector_store")
-)
+from typing import Callable, Dict, List, Optional
+from ..models.concurrency import run_blocking
+from ..config import RETRIEVAL_MODE, STARTUP_SYNC_DATA, WARMUP_COLLECTIONS
+from .services import document_processor, embedding_manager, llm_manager
 
 DATA_DIR = Path("data")
 DEFAULT_COLLECTION_NAME = "default_collection"
 
-def initialize_vector_store():
+
+def _file_sha256(file_path: Path) -> str:
+    """Tính hash nội dung file theo từng khối để không đọc cả file vào RAM."""
+    digest = hashlib.sha256()
+    with file_path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _manifest_path(collection_name: str) -> Path:
+    return Path(embedding_manager.persist_directory) / f"{collection_name}.manifest.json"
+
+
+def _load_manifest(path: Path) -> Dict:
+    if not path.exists():
+        return {}
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(path: Path, manifest: Dict):
+    # Ghi ra file tạm rồi đổi tên để manifest không bị hỏng khi dừng giữa chừng
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def initialize_vector_store(
+    data_dir: Path = DATA_DIR,
+    collection_name: str = DEFAULT_COLLECTION_NAME
+):
+    """
+    Đồng bộ các file trong data/ vào vector store.
+
+    Chỉ embed file mới hoặc đã thay đổi và xóa vector của file đã bị xóa,
+    dựa trên manifest lưu hash và mtime của từng file.
+
+    Args:
+        data_dir: Thư mục chứa tài liệu
+        collection_name: Tên collection đích
+    """
     print("🔹 Initializing Vector Store from data/ ...")
 
-    # Lặp qua tất cả các file trong data/
-for file_path in DATA_DIR.glob("*.*"):
-    print(f"🔸 Processing file: {file_path.name}")
+    manifest_path = _manifest_path(collection_name)
+    if not manifest_path.exists():
+        # Collection cũ được tạo trước khi có manifest chứa vector trùng lặp,
+        # xóa một lần để dựng lại với ID ổn định
+        print(f"🔸 No manifest found, rebuilding collection: {collection_name}")
+        embedding_manager.reset_collection(collection_name)
 
-    documents = document_processor.load_document(str(file_path))
-    print(f"👉 Loaded {len(documents)} documents")
-    for doc in documents:
-        print(f"--- Content preview: {doc.page_content[:100]}")  # in 100 ký tự đầu tiên
+    manifest = _load_manifest(manifest_path)
+    files = manifest.setdefault("files", {})
+    current = {
+        file_path.name: file_path
+        for file_path in sorted(data_dir.glob("*.*"))
+        if file_path.is_file()
+    }
 
-    # Check documents không rỗng
-    if not documents or all(doc.page_content.strip() == "" for doc in documents):
-        print(f"⚠️ Skipping {file_path.name} because it's empty or unreadable.")
-        continue
+    # Xóa vector của các file không còn trong data/
+    for name in sorted(set(files) - set(current)):
+        print(f"🗑️ Removing file: {name}")
+        embedding_manager.delete_documents(
+            files[name]["chunk_ids"],
+            collection_name=collection_name
+        )
+        del files[name]
+        _save_manifest(manifest_path, manifest)
 
-    # Tạo vector store
-    embedding_manager.create_vector_store(
-        documents,
-        collection_name=DEFAULT_COLLECTION_NAME
-    )
+    for name, file_path in current.items():
+        stat = file_path.stat()
+        entry = files.get(name)
+        if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            continue
+
+        digest = _file_sha256(file_path)
+        if entry and entry["sha256"] == digest:
+            # Chỉ mtime thay đổi, nội dung giữ nguyên
+            entry["mtime"] = stat.st_mtime
+            entry["size"] = stat.st_size
+            _save_manifest(manifest_path, manifest)
+            continue
+
+        print(f"🔸 Processing file: {name}")
+        ids = []
+
+        def chunk_id(index, doc):
+            ids.append(document_processor.make_chunk_id(name, index, doc.page_content))
+            return ids[-1]
 
+        # Đọc, split và embed dạng stream để bộ nhớ không tăng theo kích thước file
+        embedding_manager.add_documents(
+            document_processor.iter_document(str(file_path), parallel=True),
+            collection_name=collection_name,
+            ids=chunk_id,
+            save_index=False
+        )
+        print(f"👉 Loaded {len(ids)} documents")
 
-    # Persist vector store
-    embedding_manager.persist()
+        # Check documents không rỗng
+        if not ids:
+            print(f"⚠️ {name} is empty or unreadable.")
 
-    print(f"✅ Vector store initialized under collection: {DEFAULT_COLLECTION_NAME}")
+        # Xóa các chunk cũ không còn trong phiên bản mới của file
+        old_ids = set(entry["chunk_ids"]) if entry else set()
+        embedding_manager.delete_documents(
+            sorted(old_ids - set(ids)),
+            collection_name=collection_name,
+            save_index=False
+        )
+        embedding_manager.save_lexical_index(collection_name)
+
+        files[name] = {
+            "sha256": digest,
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "chunk_ids": ids
+        }
+        _save_manifest(manifest_path, manifest)
+
+    print(f"✅ Vector store initialized under collection: {collection_name}")
+
+
+class StartupState:
+    """Trạng thái warm-up của worker, dùng cho endpoint readiness."""
+
+    def __init__(self):
+        self.ready = False
+        self.started_at = time.monotonic()
+        # Thời gian (ms) của từng bước warm-up và lỗi nếu bước đó thất bại
+        self.stages: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+
+    def as_dict(self) -> Dict:
+        return {
+            "status": "ready" if self.ready else "starting",
+            "uptime_seconds": round(time.monotonic() - self.started_at, 3),
+            "stages": dict(self.stages),
+            "errors": dict(self.errors)
+        }
+
+
+startup_state = StartupState()
+
+
+async def _warm_up_step(name: str, func: Callable, *args):
+    """Chạy một bước warm-up trong thread pool, ghi lại thời gian và lỗi."""
+    start = time.perf_counter()
+    try:
+        await run_blocking(func, *args)
+    except Exception as e:
+        startup_state.errors[name] = str(e)
+        print(f"⚠️ Warm-up step {name} failed: {e}")
+    finally:
+        startup_state.stages[name] = round((time.perf_counter() - start) * 1000, 2)
+
+
+def _open_collections(collection_names: List[str]):
+    """Đồng bộ data/ (nếu bật) rồi mở sẵn các collection và chỉ mục BM25 của chúng."""
+    if STARTUP_SYNC_DATA:
+        initialize_vector_store()
+    for name in collection_names:
+        embedding_manager.get_vector_store(name)
+        if RETRIEVAL_MODE != "vector":
+            embedding_manager.get_lexical_index(name)
+
+
+async def warm_up(collection_names: Optional[List[str]] = None):
+    """
+    Chuẩn bị worker trước khi nhận traffic: khởi tạo backend embedding, client
+    LLM và cross-encoder, đồng bộ data/ và mở các collection. Các bước độc lập
+    chạy đồng thời; bước lỗi không chặn các bước khác, request đầu tiên sẽ khởi
+    tạo lại phần còn thiếu.
+
+    Args:
+        collection_names: Các collection cần mở sẵn, mặc định WARMUP_COLLECTIONS
+    """
+    collection_names = WARMUP_COLLECTIONS if collection_names is None else collection_names
+    start = time.perf_counter()
+    await asyncio.gather(
+        _warm_up_step("embedding_model", embedding_manager.load_model),
+        _warm_up_step("llm", llm_manager.load),
+        _warm_up_step("collections", _open_collections, collection_names)
+    )
+    startup_state.ready = True
+    print(f"✅ Warm-up done in {(time.perf_counter() - start) * 1000:.0f} ms")
@@ -19,6 +19,32 @@ class MessageResponse(BaseModel):
     answer: str
     context: Optional[str] = None
     session_id: Optional[str] = None
+    # Thời gian (ms) của từng stage, chỉ có khi include_timings=true
+    timings: Optional[Dict[str, float]] = None
+
+
+class BatchQuestion(BaseModel):
+    """Một câu hỏi trong request batch."""
+    question: str
+    # ID do client đặt, được trả lại trong kết quả để ghép với câu hỏi
+    id: Optional[str] = None
+
+
+class BatchMessageRequest(BaseModel):
+    """Schema cho request hỏi đáp theo batch."""
+    questions: List[BatchQuestion]
+
+
+class BatchMessageResult(BaseModel):
+    """Kết quả của một câu hỏi trong batch, mỗi dòng NDJSON là một kết quả."""
+    index: int
+    id: Optional[str] = None
+    question: str
+    answer: Optional[str] = None
+    context: Optional[str] = None
+    sources: List[Dict] = []
+    cached: bool = False
+    error: Optional[str] = None
 
 
 class ChatMessage(BaseModel):
@@ -42,3 +68,17 @@ class ChatHistoryResponse(BaseModel):
     messages: List[Dict[str, str]]
     created_at: datetime
     updated_at: datetime
+
+
+class IngestionJobResponse(BaseModel):
+    """Schema cho trạng thái của một job ingestion."""
+    job_id: str
+    filename: str
+    collection: str
+    status: str  # "queued", "running", "completed" hoặc "failed"
+    stage: str  # "saved", "pages_loaded", "chunks_embedded" hoặc "indexed"
+    pages_loaded: int
+    chunks_embedded: int
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
@@ -0,0 +1,78 @@
+"""
+Các manager dùng chung của ứng dụng: endpoints và bước khởi động dùng cùng
+một instance. Khởi tạo ở đây chỉ tạo object, không import backend nặng (Chroma,
+Google, sentence-transformers) và không đọc/ghi vector store; việc đó diễn ra
+lúc warm-up (xem initialization.warm_up) hoặc ở request đầu tiên.
+"""
+
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+from ..models.document import DocumentProcessor
+from ..models.embeddings import EmbeddingManager
+from ..models.llm import LLMManager
+from ..models.chat_history import ChatHistoryManager
+from ..models.chat_store import create_chat_backend
+from ..models.jobs import IngestionJobManager
+from ..models.answer_cache import SemanticAnswerCache
+from ..models.context_builder import ContextBuilder
+from ..models.summarizer import SummarizationEngine
+from ..models.response_cache import LLMResponseCache
+from ..models.metrics import register_cache
+from ..config import (
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL,
+    ANSWER_CACHE_SIZE,
+    CHAT_HISTORY_BACKEND,
+    CHAT_HISTORY_DB,
+    LLM_CACHE_SIZE,
+    LLM_CACHE_TTL,
+    LLM_CACHE_DISK
+)
+
+# Load environment variables
+load_dotenv()
+
+api_key = os.getenv("GOOGLE_API_KEY")
+
+# Tạo thư mục lưu trữ
+UPLOAD_DIR = Path("uploads")
+UPLOAD_DIR.mkdir(exist_ok=True)
+
+# Khởi tạo các managers
+document_processor = DocumentProcessor()
+embedding_manager = EmbeddingManager(
+    api_key=api_key,
+    persist_directory=str(UPLOAD_DIR / "vector_store")
+)
+llm_manager = LLMManager(
+    api_key,
+    response_cache=LLMResponseCache(
+        db_path=str(UPLOAD_DIR / "llm_cache.sqlite3") if LLM_CACHE_DISK else None,
+        max_memory_items=LLM_CACHE_SIZE,
+        ttl_seconds=LLM_CACHE_TTL
+    )
+)
+chat_history_manager = ChatHistoryManager(
+    backend=create_chat_backend(CHAT_HISTORY_BACKEND, CHAT_HISTORY_DB)
+)
+ingestion_job_manager = IngestionJobManager(
+    document_processor,
+    embedding_manager,
+    db_path=str(UPLOAD_DIR / "jobs.sqlite3")
+)
+context_builder = ContextBuilder()
+summarization_engine = SummarizationEngine(
+    llm_manager,
+    document_processor.text_splitter
+)
+answer_cache = SemanticAnswerCache(
+    similarity_threshold=ANSWER_CACHE_THRESHOLD,
+    ttl_seconds=ANSWER_CACHE_TTL,
+    max_entries=ANSWER_CACHE_SIZE
+)
+register_cache("embedding", embedding_manager.cache_stats)
+register_cache("answer", answer_cache.stats)
+register_cache("llm_response", llm_manager.response_cache.stats)
+register_cache("prompt_registry", llm_manager.compiled.stats)
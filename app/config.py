@@ -4,3 +4,132 @@ import dotenv
 dotenv.load_dotenv()
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+
+# Số collection Chroma được giữ mở đồng thời trong EmbeddingManager
+VECTOR_STORE_CACHE_SIZE = int(os.getenv("VECTOR_STORE_CACHE_SIZE", "8"))
+
+# Số embedding giữ trong tầng LRU bộ nhớ của EmbeddingCache
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+
+# Cấu hình pipeline ingestion: số chunk mỗi batch, số request embedding song song
+# và số lần thử lại khi bị giới hạn tốc độ
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+INGEST_MAX_CONCURRENCY = int(os.getenv("INGEST_MAX_CONCURRENCY", "4"))
+INGEST_MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", "5"))
+
+# Cấu hình rerank: "cross_encoder" (mặc định, chạy cục bộ) hoặc "llm" (LLMChainExtractor)
+RERANK_MODE = os.getenv("RERANK_MODE", "cross_encoder")
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "5"))
+RERANK_SCORE_THRESHOLD = (
+    float(os.getenv("RERANK_SCORE_THRESHOLD"))
+    if os.getenv("RERANK_SCORE_THRESHOLD") else None
+)
+# Số candidate lấy từ vector store trước khi đưa qua cross-encoder
+RERANK_FETCH_K = int(os.getenv("RERANK_FETCH_K", "20"))
+
+# Số thread tối đa dùng để chạy code blocking (Chroma, PDF, cross-encoder) từ các endpoint async
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", "16"))
+
+# Số job ingestion (upload) được xử lý song song ở background
+INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "2"))
+
+# Số process dùng để parse PDF song song theo dải trang (mặc định bằng số core)
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(os.cpu_count() or 1)))
+
+# Cache câu trả lời theo ngữ nghĩa: ngưỡng cosine similarity, TTL (giây) và số entry
+# tối đa (0 để tắt)
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+
+# Retrieval: "hybrid" (BM25 + vector, gộp bằng RRF), "vector" hoặc "bm25" (không cần
+# gọi API embedding); tham số BM25 và hằng số k của reciprocal rank fusion
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+BM25_K1 = float(os.getenv("BM25_K1", "1.5"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Lịch sử chat: backend ("sqlite" hoặc "memory"), TTL của session (giây, 0 để không
+# hết hạn), cache LRU (số session và số tin nhắn cuối mỗi session) và ghi theo batch
+CHAT_HISTORY_BACKEND = os.getenv("CHAT_HISTORY_BACKEND", "sqlite")
+CHAT_HISTORY_DB = os.getenv("CHAT_HISTORY_DB", os.path.join("uploads", "chat_history.sqlite3"))
+CHAT_SESSION_TTL = float(os.getenv("CHAT_SESSION_TTL", str(7 * 24 * 3600)))
+CHAT_HISTORY_CACHE_SIZE = int(os.getenv("CHAT_HISTORY_CACHE_SIZE", "1000"))
+CHAT_HISTORY_CACHE_MESSAGES = int(os.getenv("CHAT_HISTORY_CACHE_MESSAGES", "50"))
+CHAT_HISTORY_BATCH_SIZE = int(os.getenv("CHAT_HISTORY_BATCH_SIZE", "100"))
+CHAT_HISTORY_FLUSH_INTERVAL = float(os.getenv("CHAT_HISTORY_FLUSH_INTERVAL", "0.2"))
+
+# Ghép context: tổng số token (lịch sử + chunk), số lượt hội thoại gần nhất và số token
+# dành cho lịch sử, tỉ lệ ký tự/token để ước lượng, số ký tự trùng tối thiểu giữa hai
+# chunk chồng lấn
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_HISTORY_TURNS = int(os.getenv("CONTEXT_HISTORY_TURNS", "3"))
+CONTEXT_HISTORY_TOKEN_BUDGET = int(os.getenv("CONTEXT_HISTORY_TOKEN_BUDGET", "600"))
+CONTEXT_CHARS_PER_TOKEN = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "3"))
+CONTEXT_MIN_OVERLAP = int(os.getenv("CONTEXT_MIN_OVERLAP", "30"))
+# Viết lại câu hỏi nối tiếp trước khi retrieval: "llm", "concat" (ghép với câu hỏi
+# trước, không gọi LLM) hoặc "off"
+QUERY_CONDENSE_MODE = os.getenv("QUERY_CONDENSE_MODE", "llm")
+
+# Tóm tắt map-reduce: số request LLM đồng thời, độ dài (số từ) của tóm tắt trung gian
+# và số ký tự tối đa của một nhóm ở bước reduce
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "8"))
+SUMMARY_MAP_LENGTH = int(os.getenv("SUMMARY_MAP_LENGTH", "80"))
+SUMMARY_REDUCE_MAX_CHARS = int(os.getenv("SUMMARY_REDUCE_MAX_CHARS", "6000"))
+
+# Embedding: backend ("google" gọi API, "local" chạy sentence-transformers trên máy),
+# tên model (mặc định theo backend), thiết bị, lượng tử hóa int8, kích thước batch và
+# thời gian (ms) chờ gom các request đồng thời, tiền tố câu hỏi/chunk (vd. model e5)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "google")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL") or None
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu")
+EMBEDDING_QUANTIZE = os.getenv("EMBEDDING_QUANTIZE", "0").lower() in ("1", "true", "yes")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+EMBEDDING_QUERY_PREFIX = os.getenv("EMBEDDING_QUERY_PREFIX", "")
+EMBEDDING_DOCUMENT_PREFIX = os.getenv("EMBEDDING_DOCUMENT_PREFIX", "")
+
+# Vector store: "chroma" hoặc "numpy" (ma trận memory-mapped, tìm kiếm chính xác bằng
+# một phép nhân ma trận); kiểu lưu vector của store numpy ("float32" hoặc "float16"),
+# số vector tối thiểu để dựng chỉ mục IVF (0 để tắt) và số cụm được quét mỗi truy vấn
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "chroma")
+NUMPY_STORE_DTYPE = os.getenv("NUMPY_STORE_DTYPE", "float32")
+NUMPY_IVF_MIN_VECTORS = int(os.getenv("NUMPY_IVF_MIN_VECTORS", "50000"))
+NUMPY_IVF_NPROBE = int(os.getenv("NUMPY_IVF_NPROBE", "8"))
+
+# Tìm kiếm vector: "mmr" (đa dạng hóa kết quả) hoặc "similarity"; số candidate lấy
+# một lần cho MMR, hệ số lambda (1 chỉ xét độ liên quan, 0 chỉ xét độ đa dạng) và
+# ngưỡng cosine similarity tối thiểu với câu hỏi (không đặt để tắt)
+SEARCH_TYPE = os.getenv("SEARCH_TYPE", "mmr")
+MMR_FETCH_K = int(os.getenv("MMR_FETCH_K", "50"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.5"))
+SEARCH_SCORE_THRESHOLD = (
+    float(os.getenv("SEARCH_SCORE_THRESHOLD"))
+    if os.getenv("SEARCH_SCORE_THRESHOLD") else None
+)
+
+# Khởi động: đồng bộ thư mục data/ vào vector store và các collection được mở sẵn
+# (kèm chỉ mục BM25) trong bước warm-up, phân tách bằng dấu phẩy
+STARTUP_SYNC_DATA = os.getenv("STARTUP_SYNC_DATA", "true").lower() in ("1", "true", "yes")
+WARMUP_COLLECTIONS = [
+    name.strip()
+    for name in os.getenv("WARMUP_COLLECTIONS", "default_collection").split(",")
+    if name.strip()
+]
+
+# Cache câu trả lời của LLM theo prompt đã render (khớp chính xác): số entry trong bộ
+# nhớ, TTL (giây, 0 để không hết hạn) và có lưu thêm vào SQLite hay không
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1000"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_DISK = os.getenv("LLM_CACHE_DISK", "false").lower() in ("1", "true", "yes")
+
+# Số prompt tùy chỉnh, chain và compressor (rerank) đã dựng được giữ lại để dùng lại
+# giữa các request
+PROMPT_REGISTRY_SIZE = int(os.getenv("PROMPT_REGISTRY_SIZE", "256"))
+
+# Hỏi đáp theo batch: số câu hỏi tối đa của một request, số câu hỏi được embed và
+# tìm kiếm cùng nhau trong một lượt, số request LLM đồng thời
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "5000"))
+BATCH_RETRIEVAL_SIZE = int(os.getenv("BATCH_RETRIEVAL_SIZE", "64"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
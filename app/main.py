@@ -2,17 +2,34 @@
 Main application file cho FastAPI.
 """
 
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.initialization import initialize_vector_store
 
 from .api.endpoints import router
+from .api.initialization import warm_up
+from .api.services import chat_history_manager, ingestion_job_manager
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Chạy lại các job upload chưa xong từ lần chạy trước
+    ingestion_job_manager.resume_pending()
+    # Warm-up chạy nền để liveness trả lời ngay; readiness báo sẵn sàng khi xong
+    warm_up_task = asyncio.create_task(warm_up())
+    yield
+    warm_up_task.cancel()
+    chat_history_manager.close()
+
 
 app = FastAPI(
     title="RAG Pipeline API",
     description="API cho RAG Pipeline sử dụng Langchain và Google Gemini",
     version="1.0.0",
-    debug= True
+    debug= True,
+    lifespan=lifespan
 )
 
 # Cấu hình CORS
@@ -26,4 +43,3 @@ app.add_middleware(
 
 # Thêm router
 app.include_router(router, prefix="/api/v1")
-initialize_vector_store()
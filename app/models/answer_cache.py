@@ -0,0 +1,204 @@
+"""
+Module cache câu trả lời theo độ tương đồng ngữ nghĩa của câu hỏi.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+@dataclass
+class _Entry:
+    collection: str
+    namespace: str
+    vector: np.ndarray
+    question: str
+    answer: str
+    context: str
+    sources: List[Dict]
+    created_at: float
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        similarity_threshold: float = 0.95,
+        ttl_seconds: float = 3600,
+        max_entries: int = 1000
+    ):
+        """
+        Khởi tạo SemanticAnswerCache.
+
+        Một câu hỏi mới dùng lại câu trả lời đã cache nếu cosine similarity
+        giữa embedding của hai câu hỏi không nhỏ hơn similarity_threshold,
+        cùng collection (và phiên bản collection) và cùng namespace prompt.
+
+        Args:
+            similarity_threshold: Ngưỡng cosine similarity để coi là trùng câu hỏi
+            ttl_seconds: Thời gian sống của một entry (giây)
+            max_entries: Số entry tối đa, vượt quá sẽ loại entry ít dùng nhất
+        """
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(0, max_entries)
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        # collection -> phiên bản đang được cache
+        self._versions: Dict[str, int] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def _sync_version(self, collection: str, version: int) -> bool:
+        """
+        Xóa entry của collection nếu collection đã được ingest lại.
+
+        Returns:
+            bool: False nếu version đã cũ (request bắt đầu trước khi ingest lại)
+        """
+        current = self._versions.get(collection)
+        if current is not None and version <= current:
+            return version == current
+        self._versions[collection] = version
+        stale = [
+            entry_id for entry_id, entry in self._entries.items()
+            if entry.collection == collection
+        ]
+        for entry_id in stale:
+            del self._entries[entry_id]
+        return True
+
+    def _expire(self, now: float):
+        expired = [
+            entry_id for entry_id, entry in self._entries.items()
+            if now - entry.created_at > self.ttl_seconds
+        ]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        self.evictions += len(expired)
+
+    def lookup(
+        self,
+        collection: str,
+        version: int,
+        namespace: str,
+        vector: List[float]
+    ) -> Optional[Dict]:
+        """
+        Tìm câu trả lời đã cache cho câu hỏi tương tự.
+
+        Args:
+            collection: Tên collection
+            version: Phiên bản hiện tại của collection
+            namespace: Khóa của prompt và tham số sinh
+            vector: Embedding của câu hỏi
+
+        Returns:
+            Optional[Dict]: answer, context, sources, question gốc và similarity;
+                None nếu miss
+        """
+        if not self.max_entries:
+            return None
+
+        query = self._normalize(vector)
+        with self._lock:
+            if not self._sync_version(collection, version):
+                self.misses += 1
+                return None
+            self._expire(time.time())
+
+            candidates: List[Tuple[int, _Entry]] = [
+                (entry_id, entry) for entry_id, entry in self._entries.items()
+                if entry.collection == collection and entry.namespace == namespace
+            ]
+            if candidates:
+                matrix = np.stack([entry.vector for _, entry in candidates])
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    entry_id, entry = candidates[best]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return {
+                        "answer": entry.answer,
+                        "context": entry.context,
+                        "sources": entry.sources,
+                        "question": entry.question,
+                        "similarity": float(scores[best])
+                    }
+
+            self.misses += 1
+            return None
+
+    def store(
+        self,
+        collection: str,
+        version: int,
+        namespace: str,
+        vector: List[float],
+        question: str,
+        answer: str,
+        context: str,
+        sources: Optional[List[Dict]] = None
+    ):
+        """
+        Lưu câu trả lời vào cache.
+
+        Args:
+            collection: Tên collection
+            version: Phiên bản của collection khi tạo câu trả lời
+            namespace: Khóa của prompt và tham số sinh
+            vector: Embedding của câu hỏi
+            question: Câu hỏi
+            answer: Câu trả lời
+            context: Context đã dùng để trả lời
+            sources: Metadata của các document trong context
+        """
+        if not self.max_entries:
+            return
+
+        with self._lock:
+            if not self._sync_version(collection, version):
+                return
+            self._entries[self._next_id] = _Entry(
+                collection=collection,
+                namespace=namespace,
+                vector=self._normalize(vector),
+                question=question,
+                answer=answer,
+                context=context,
+                sources=sources or [],
+                created_at=time.time()
+            )
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Lấy thống kê hit/miss của cache.
+
+        Returns:
+            Dict[str, float]: Số lần hit, miss, tỉ lệ hit, số entry và số lần loại bỏ
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "evictions": self.evictions
+            }
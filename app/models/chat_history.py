@@ -2,16 +2,165 @@
 Module quản lý lịch sử chat.
 """
 
+import atexit
+import threading
+import time
 import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Deque, List, Dict, Optional, Tuple
+
+from app.config import (
+    CHAT_SESSION_TTL,
+    CHAT_HISTORY_CACHE_SIZE,
+    CHAT_HISTORY_CACHE_MESSAGES,
+    CHAT_HISTORY_BATCH_SIZE,
+    CHAT_HISTORY_FLUSH_INTERVAL
+)
 from ..api.schemas import ChatMessage, ChatSession
+from .concurrency import run_blocking
+from .chat_store import ChatHistoryBackend, InMemoryChatBackend, MessageRow
+
+
+@dataclass
+class _CachedSession:
+    created_at: float
+    updated_at: float
+    # Các tin nhắn cuối của session (role, content, timestamp)
+    messages: Deque[Tuple[str, str, float]]
+    # True nếu messages chứa toàn bộ lịch sử của session
+    complete: bool = field(default=True)
 
 
 class ChatHistoryManager:
-    def __init__(self):
-        """Khởi tạo ChatHistoryManager."""
-        self.sessions: Dict[str, ChatSession] = {}
+    def __init__(
+        self,
+        backend: Optional[ChatHistoryBackend] = None,
+        ttl_seconds: float = CHAT_SESSION_TTL,
+        cache_size: int = CHAT_HISTORY_CACHE_SIZE,
+        cache_messages: int = CHAT_HISTORY_CACHE_MESSAGES,
+        batch_size: int = CHAT_HISTORY_BATCH_SIZE,
+        flush_interval: float = CHAT_HISTORY_FLUSH_INTERVAL
+    ):
+        """
+        Khởi tạo ChatHistoryManager.
+
+        Session được lưu trong backend; các session dùng gần đây được giữ trong
+        cache LRU cùng các tin nhắn cuối để đọc lịch sử không cần truy vấn backend.
+        Tin nhắn mới được gom lại và ghi theo batch bởi một thread nền.
+
+        Args:
+            backend: Nơi lưu session, mặc định lưu trong bộ nhớ
+            ttl_seconds: Session không có tin nhắn mới trong khoảng này sẽ hết hạn
+            cache_size: Số session tối đa trong cache LRU
+            cache_messages: Số tin nhắn cuối giữ trong cache cho mỗi session
+            batch_size: Số tin nhắn chờ tối đa trước khi ghi ngay
+            flush_interval: Thời gian (giây) tối đa một tin nhắn nằm chờ ghi
+        """
+        self.backend = backend or InMemoryChatBackend()
+        self.ttl_seconds = ttl_seconds
+        self.cache_size = max(1, cache_size)
+        self.cache_messages = max(1, cache_messages)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+
+        self._cache: "OrderedDict[str, _CachedSession]" = OrderedDict()
+        self._pending: List[MessageRow] = []
+        self._lock = threading.Lock()
+        # Giữ trong suốt một lần ghi để người đọc chờ batch đang ghi dở
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._last_purge = time.time()
+        self._flusher = threading.Thread(
+            target=self._flush_loop,
+            name="chat-history-flusher",
+            daemon=True
+        )
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def _expired(self, updated_at: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and now - updated_at > self.ttl_seconds
+
+    def _cache_put(self, session_id: str, entry: _CachedSession):
+        # Gọi khi đang giữ self._lock
+        self._cache[session_id] = entry
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                self._purge_expired()
+            except Exception as e:
+                print(f"⚠️ Chat history flush failed: {e}")
+
+    def _purge_expired(self):
+        if not self.ttl_seconds:
+            return
+        now = time.time()
+        # Dọn session hết hạn khỏi backend tối đa mỗi phút một lần
+        if now - self._last_purge < min(self.ttl_seconds, 60):
+            return
+        self._last_purge = now
+        self.backend.delete_expired(now - self.ttl_seconds)
+        with self._lock:
+            for session_id in [
+                session_id for session_id, entry in self._cache.items()
+                if self._expired(entry.updated_at, now)
+            ]:
+                del self._cache[session_id]
+
+    def _load(self, session_id: str) -> Optional[_CachedSession]:
+        """
+        Lấy session từ cache, kiểm tra với backend để phát hiện tin nhắn do
+        worker khác ghi.
+        """
+        info = self.backend.get_session(session_id)
+        with self._lock:
+            entry = self._cache.get(session_id)
+            if info is None:
+                # Session được ghi ngay khi tạo nên không có trong backend nghĩa là
+                # đã bị xóa (có thể bởi worker khác) hoặc đã hết hạn
+                self._cache.pop(session_id, None)
+                return None
+            created_at, updated_at = info
+            if entry is not None and entry.updated_at >= updated_at:
+                self._cache.move_to_end(session_id)
+                return entry
+            # Chưa có trong cache hoặc backend mới hơn: chỉ lưu metadata,
+            # tin nhắn sẽ được đọc lại từ backend
+            entry = _CachedSession(
+                created_at=created_at,
+                updated_at=updated_at,
+                messages=deque(maxlen=self.cache_messages),
+                complete=False
+            )
+            self._cache_put(session_id, entry)
+            return entry
+
+    def flush(self):
+        """Ghi các tin nhắn đang chờ xuống backend."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if pending:
+                self.backend.append_messages(pending)
+
+    def close(self):
+        """Ghi nốt các tin nhắn đang chờ và dừng thread nền."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._flusher.join(timeout=5)
+        self.flush()
 
     def create_session(self) -> str:
         """
@@ -21,45 +170,98 @@ class ChatHistoryManager:
             str: ID của session mới
         """
         session_id = str(uuid.uuid4())
-        self.sessions[session_id] = ChatSession(
-            session_id=session_id,
-            messages=[]
-        )
+        now = time.time()
+        self.backend.create_session(session_id, now)
+        with self._lock:
+            self._cache_put(session_id, _CachedSession(
+                created_at=now,
+                updated_at=now,
+                messages=deque(maxlen=self.cache_messages)
+            ))
         return session_id
 
+    async def acreate_session(self) -> str:
+        """Phiên bản async của create_session, ghi backend trong thread pool."""
+        return await run_blocking(self.create_session)
+
     def add_message(
         self,
         session_id: str,
         role: str,
         content: str
-    ) -> Optional[ChatSession]:
+    ) -> bool:
         """
         Thêm tin nhắn vào session.
 
+        Tin nhắn có ngay trong cache; việc ghi xuống backend được gom theo batch.
+
         Args:
             session_id: ID của session
             role: Vai trò ("user" hoặc "assistant")
             content: Nội dung tin nhắn
 
         Returns:
-            Optional[ChatSession]: Session đã được cập nhật
+            bool: False nếu session không tồn tại hoặc đã hết hạn
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._cache.get(session_id)
+        if entry is None:
+            entry = self._load(session_id)
+        if entry is None or self._expired(entry.updated_at, now):
+            return False
+
+        with self._lock:
+            # Deque đã đầy: tin nhắn cũ nhất sắp bị bỏ nên cache không còn đủ lịch sử
+            if len(entry.messages) == entry.messages.maxlen:
+                entry.complete = False
+            entry.messages.append((role, content, now))
+            entry.updated_at = max(entry.updated_at, now)
+            self._pending.append((session_id, role, content, now))
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup.set()
+        return True
+
+    async def aadd_message(self, session_id: str, role: str, content: str) -> bool:
+        """
+        Phiên bản async của add_message.
+
+        Session đã có trong cache được ghi ngay; session phải đọc từ backend
+        được load trong thread pool.
+        """
+        with self._lock:
+            cached = session_id in self._cache
+        if cached:
+            return self.add_message(session_id, role, content)
+        return await run_blocking(self.add_message, session_id, role, content)
+
+    def get_session_info(self, session_id: str) -> Optional[Dict[str, datetime]]:
+        """
+        Lấy thời điểm tạo và cập nhật của session mà không đọc tin nhắn.
+
+        Args:
+            session_id: ID của session
+
+        Returns:
+            Optional[Dict[str, datetime]]: created_at và updated_at, None nếu
+                session không tồn tại hoặc đã hết hạn
         """
-        if session_id not in self.sessions:
+        entry = self._load(session_id)
+        if entry is None or self._expired(entry.updated_at, time.time()):
             return None
+        return {
+            "created_at": datetime.fromtimestamp(entry.created_at),
+            "updated_at": datetime.fromtimestamp(entry.updated_at)
+        }
 
-        session = self.sessions[session_id]
-        message = ChatMessage(
-            role=role,
-            content=content,
-            timestamp=datetime.now()
-        )
-        session.messages.append(message)
-        session.updated_at = datetime.now()
-        return session
+    async def aget_session_info(self, session_id: str) -> Optional[Dict[str, datetime]]:
+        """Phiên bản async của get_session_info, đọc backend trong thread pool."""
+        return await run_blocking(self.get_session_info, session_id)
 
     def get_session(self, session_id: str) -> Optional[ChatSession]:
         """
-        Lấy thông tin session.
+        Lấy thông tin session kèm toàn bộ tin nhắn.
 
         Args:
             session_id: ID của session
@@ -67,7 +269,45 @@ class ChatHistoryManager:
         Returns:
             Optional[ChatSession]: Thông tin session
         """
-        return self.sessions.get(session_id)
+        entry = self._load(session_id)
+        if entry is None or self._expired(entry.updated_at, time.time()):
+            return None
+        return ChatSession(
+            session_id=session_id,
+            messages=[
+                ChatMessage(
+                    role=role,
+                    content=content,
+                    timestamp=datetime.fromtimestamp(timestamp)
+                )
+                for role, content, timestamp in self._get_messages(session_id, entry)
+            ],
+            created_at=datetime.fromtimestamp(entry.created_at),
+            updated_at=datetime.fromtimestamp(entry.updated_at)
+        )
+
+    def _get_messages(
+        self,
+        session_id: str,
+        entry: _CachedSession,
+        limit: Optional[int] = None
+    ) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            # Cache đủ để trả lời: có toàn bộ lịch sử hoặc đủ limit tin nhắn cuối
+            if entry.complete or (limit and limit <= len(entry.messages)):
+                messages = list(entry.messages)
+                return messages[-limit:] if limit else messages
+
+        self.flush()
+        messages = self.backend.get_messages(session_id, limit)
+        with self._lock:
+            if limit is None or len(messages) < limit:
+                # Đã đọc toàn bộ session
+                entry.messages = deque(messages, maxlen=self.cache_messages)
+                entry.complete = len(messages) <= self.cache_messages
+            elif len(messages) > len(entry.messages):
+                entry.messages = deque(messages, maxlen=self.cache_messages)
+        return messages
 
     def get_chat_history(
         self,
@@ -77,6 +317,8 @@ class ChatHistoryManager:
         """
         Lấy lịch sử chat của session.
 
+        Chỉ đọc limit tin nhắn cuối, từ cache nếu có hoặc qua chỉ mục của backend.
+
         Args:
             session_id: ID của session
             limit: Số lượng tin nhắn tối đa
@@ -84,23 +326,27 @@ class ChatHistoryManager:
         Returns:
             Optional[List[Dict[str, str]]]: Lịch sử chat
         """
-        session = self.get_session(session_id)
-        if not session:
+        entry = self._load(session_id)
+        if entry is None or self._expired(entry.updated_at, time.time()):
             return None
 
-        messages = session.messages
-        if limit:
-            messages = messages[-limit:]
-
         return [
             {
-                "role": msg.role,
-                "content": msg.content,
-                "timestamp": msg.timestamp.isoformat()
+                "role": role,
+                "content": content,
+                "timestamp": datetime.fromtimestamp(timestamp).isoformat()
             }
-            for msg in messages
+            for role, content, timestamp in self._get_messages(session_id, entry, limit)
         ]
 
+    async def aget_chat_history(
+        self,
+        session_id: str,
+        limit: Optional[int] = None
+    ) -> Optional[List[Dict[str, str]]]:
+        """Phiên bản async của get_chat_history, đọc backend trong thread pool."""
+        return await run_blocking(self.get_chat_history, session_id, limit)
+
     def delete_session(self, session_id: str) -> bool:
         """
         Xóa session.
@@ -111,7 +357,11 @@ class ChatHistoryManager:
         Returns:
             bool: True nếu xóa thành công
         """
-        if session_id in self.sessions:
-            del self.sessions[session_id]
-            return True
-        return False
+        self.flush()
+        with self._lock:
+            cached = self._cache.pop(session_id, None) is not None
+        return self.backend.delete_session(session_id) or cached
+
+    async def adelete_session(self, session_id: str) -> bool:
+        """Phiên bản async của delete_session, chạy trong thread pool."""
+        return await run_blocking(self.delete_session, session_id)
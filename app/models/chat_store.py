@@ -0,0 +1,251 @@
+"""
+Module backend lưu trữ lịch sử chat (SQLite hoặc bộ nhớ).
+"""
+
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+# (session_id, role, content, timestamp)
+MessageRow = Tuple[str, str, str, float]
+
+
+class ChatHistoryBackend(ABC):
+    """
+    Interface của nơi lưu session và tin nhắn.
+
+    Thời gian được lưu dạng epoch (giây) để so sánh TTL rẻ và không phụ thuộc
+    định dạng chuỗi.
+    """
+
+    @abstractmethod
+    def create_session(self, session_id: str, created_at: float):
+        """Tạo session rỗng."""
+
+    @abstractmethod
+    def get_session(self, session_id: str) -> Optional[Tuple[float, float]]:
+        """Lấy (created_at, updated_at) của session, None nếu không tồn tại."""
+
+    @abstractmethod
+    def append_messages(self, messages: List[MessageRow]):
+        """Ghi một batch tin nhắn (có thể thuộc nhiều session) và cập nhật updated_at."""
+
+    @abstractmethod
+    def get_messages(
+        self,
+        session_id: str,
+        limit: Optional[int] = None
+    ) -> List[Tuple[str, str, float]]:
+        """Lấy limit tin nhắn cuối (role, content, timestamp) theo thứ tự thời gian."""
+
+    @abstractmethod
+    def delete_session(self, session_id: str) -> bool:
+        """Xóa session và tin nhắn của nó."""
+
+    @abstractmethod
+    def delete_expired(self, before: float) -> int:
+        """Xóa các session không được cập nhật từ trước thời điểm before."""
+
+    def close(self):
+        """Giải phóng tài nguyên của backend."""
+
+
+class InMemoryChatBackend(ChatHistoryBackend):
+    """Backend trong bộ nhớ của process, mất dữ liệu khi restart."""
+
+    def __init__(self):
+        self._sessions: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def create_session(self, session_id: str, created_at: float):
+        with self._lock:
+            self._sessions[session_id] = {
+                "created_at": created_at,
+                "updated_at": created_at,
+                "messages": []
+            }
+
+    def get_session(self, session_id: str) -> Optional[Tuple[float, float]]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            return session["created_at"], session["updated_at"]
+
+    def append_messages(self, messages: List[MessageRow]):
+        with self._lock:
+            for session_id, role, content, timestamp in messages:
+                session = self._sessions.get(session_id)
+                if session is None:
+                    continue
+                session["messages"].append((role, content, timestamp))
+                session["updated_at"] = max(session["updated_at"], timestamp)
+
+    def get_messages(
+        self,
+        session_id: str,
+        limit: Optional[int] = None
+    ) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            messages = session["messages"]
+            return list(messages[-limit:] if limit else messages)
+
+    def delete_session(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def delete_expired(self, before: float) -> int:
+        with self._lock:
+            expired = [
+                session_id for session_id, session in self._sessions.items()
+                if session["updated_at"] < before
+            ]
+            for session_id in expired:
+                del self._sessions[session_id]
+            return len(expired)
+
+
+class SQLiteChatBackend(ChatHistoryBackend):
+    """
+    Backend SQLite ở chế độ WAL, dùng chung được giữa nhiều worker uvicorn.
+
+    Tin nhắn được đánh chỉ mục theo (session_id, timestamp) nên đọc N tin nhắn
+    cuối chỉ quét N dòng, không phụ thuộc độ dài của session. Sắp theo timestamp
+    thay vì thứ tự ghi vì các worker ghi batch của mình vào những thời điểm khác nhau.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Khởi tạo SQLiteChatBackend.
+
+        Args:
+            db_path: File SQLite lưu lịch sử chat
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """CREATE TABLE IF NOT EXISTS chat_sessions (
+                session_id TEXT PRIMARY KEY,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_chat_sessions_updated_at
+                ON chat_sessions (updated_at);
+            CREATE TABLE IF NOT EXISTS chat_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                timestamp REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_chat_messages_session
+                ON chat_messages (session_id, timestamp, id);"""
+        )
+        self._conn.commit()
+
+    def create_session(self, session_id: str, created_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO chat_sessions (session_id, created_at, updated_at) "
+                "VALUES (?, ?, ?)",
+                (session_id, created_at, created_at)
+            )
+            self._conn.commit()
+
+    def get_session(self, session_id: str) -> Optional[Tuple[float, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT created_at, updated_at FROM chat_sessions WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def append_messages(self, messages: List[MessageRow]):
+        if not messages:
+            return
+        with self._lock:
+            # Một transaction cho cả batch
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO chat_messages (session_id, role, content, timestamp) "
+                    "SELECT ?, ?, ?, ? WHERE EXISTS "
+                    "(SELECT 1 FROM chat_sessions WHERE session_id = ?)",
+                    [(*message, message[0]) for message in messages]
+                )
+                self._conn.executemany(
+                    "UPDATE chat_sessions SET updated_at = MAX(updated_at, ?) "
+                    "WHERE session_id = ?",
+                    [(timestamp, session_id) for session_id, _, _, timestamp in messages]
+                )
+
+    def get_messages(
+        self,
+        session_id: str,
+        limit: Optional[int] = None
+    ) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content, timestamp FROM chat_messages "
+                "WHERE session_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?",
+                (session_id, limit if limit else -1)
+            ).fetchall()
+        rows.reverse()
+        return [tuple(row) for row in rows]
+
+    def delete_session(self, session_id: str) -> bool:
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM chat_messages WHERE session_id = ?",
+                    (session_id,)
+                )
+                deleted = self._conn.execute(
+                    "DELETE FROM chat_sessions WHERE session_id = ?",
+                    (session_id,)
+                ).rowcount
+        return deleted > 0
+
+    def delete_expired(self, before: float) -> int:
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM chat_messages WHERE session_id IN "
+                    "(SELECT session_id FROM chat_sessions WHERE updated_at < ?)",
+                    (before,)
+                )
+                return self._conn.execute(
+                    "DELETE FROM chat_sessions WHERE updated_at < ?",
+                    (before,)
+                ).rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_chat_backend(kind: str, db_path: Optional[str] = None) -> ChatHistoryBackend:
+    """
+    Tạo backend lịch sử chat theo tên.
+
+    Args:
+        kind: "sqlite" hoặc "memory"
+        db_path: File SQLite (bắt buộc với "sqlite")
+
+    Returns:
+        ChatHistoryBackend: Backend đã khởi tạo
+    """
+    if kind == "sqlite":
+        if not db_path:
+            raise ValueError("Cần db_path cho backend sqlite")
+        return SQLiteChatBackend(db_path)
+    if kind == "memory":
+        return InMemoryChatBackend()
+    raise ValueError(f"Backend lịch sử chat không hợp lệ: {kind}")
@@ -0,0 +1,50 @@
+"""
+Module tiện ích chạy code blocking từ event loop qua thread pool có giới hạn.
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from app.config import BLOCKING_POOL_SIZE
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Lấy thread pool dùng chung cho các tác vụ blocking.
+
+    Returns:
+        ThreadPoolExecutor: Thread pool với tối đa BLOCKING_POOL_SIZE thread
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=BLOCKING_POOL_SIZE,
+                thread_name_prefix="rag-blocking"
+            )
+        return _executor
+
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Chạy hàm blocking trong thread pool mà không chặn event loop.
+
+    Args:
+        func: Hàm cần chạy
+        *args: Tham số vị trí của hàm
+        **kwargs: Tham số keyword của hàm
+
+    Returns:
+        Any: Kết quả trả về của hàm
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_executor(),
+        functools.partial(func, *args, **kwargs)
+    )
@@ -0,0 +1,206 @@
+"""
+Module ghép context cho LLM: lịch sử hội thoại và các chunk trong giới hạn token.
+"""
+
+import math
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence
+
+from langchain_core.documents import Document
+
+from app.config import (
+    CONTEXT_TOKEN_BUDGET,
+    CONTEXT_HISTORY_TURNS,
+    CONTEXT_HISTORY_TOKEN_BUDGET,
+    CONTEXT_CHARS_PER_TOKEN,
+    CONTEXT_MIN_OVERLAP
+)
+
+# Các khóa điểm trong metadata theo thứ tự ưu tiên (cross-encoder, điểm gộp nhiều
+# collection, RRF, BM25, cosine)
+_SCORE_KEYS = ("relevance_score", "merged_score", "fusion_score", "bm25_score", "similarity_score")
+
+_ROLE_LABELS = {"user": "Người dùng", "assistant": "Trợ lý"}
+
+
+def estimate_tokens(text: str, chars_per_token: float = CONTEXT_CHARS_PER_TOKEN) -> int:
+    """
+    Ước lượng số token của văn bản theo số ký tự.
+
+    Đếm chính xác với Gemini cần gọi API nên dùng tỉ lệ ký tự/token cố định.
+
+    Args:
+        text: Văn bản
+        chars_per_token: Số ký tự trung bình của một token
+
+    Returns:
+        int: Số token ước lượng
+    """
+    return math.ceil(len(text) / chars_per_token) if text else 0
+
+
+def _overlap(first: str, second: str, min_overlap: int) -> int:
+    """Độ dài đoạn cuối của first trùng với đoạn đầu của second (0 nếu ngắn hơn min_overlap)."""
+    for size in range(min(len(first), len(second)), min_overlap - 1, -1):
+        if first.endswith(second[:size]):
+            return size
+    return 0
+
+
+@dataclass
+class BuiltContext:
+    """Kết quả của ContextBuilder.build."""
+    context: str
+    documents: List[Document] = field(default_factory=list)
+    history: str = ""
+    tokens: int = 0
+
+
+class ContextBuilder:
+    def __init__(
+        self,
+        token_budget: int = CONTEXT_TOKEN_BUDGET,
+        history_turns: int = CONTEXT_HISTORY_TURNS,
+        history_token_budget: int = CONTEXT_HISTORY_TOKEN_BUDGET,
+        min_overlap: int = CONTEXT_MIN_OVERLAP,
+        token_counter: Optional[Callable[[str], int]] = None
+    ):
+        """
+        Khởi tạo ContextBuilder.
+
+        Args:
+            token_budget: Tổng số token tối đa của context (lịch sử + chunk)
+            history_turns: Số lượt hỏi-đáp gần nhất được đưa vào context
+            history_token_budget: Số token tối đa dành cho lịch sử
+            min_overlap: Số ký tự trùng tối thiểu để coi hai chunk là chồng lấn
+            token_counter: Hàm đếm token, mặc định ước lượng theo số ký tự
+        """
+        self.token_budget = token_budget
+        self.history_turns = max(0, history_turns)
+        self.history_token_budget = min(history_token_budget, token_budget)
+        self.min_overlap = max(1, min_overlap)
+        self.count_tokens = token_counter or estimate_tokens
+
+    @property
+    def history_limit(self) -> int:
+        """Số tin nhắn cần đọc từ lịch sử chat."""
+        return self.history_turns * 2
+
+    @staticmethod
+    def score(doc: Document, rank: int) -> float:
+        """
+        Lấy điểm liên quan của chunk, dùng thứ hạng khi retriever không trả điểm.
+
+        Args:
+            doc: Chunk
+            rank: Thứ hạng của chunk trong kết quả retrieval
+
+        Returns:
+            float: Điểm, càng lớn càng liên quan
+        """
+        for key in _SCORE_KEYS:
+            if key in doc.metadata:
+                return float(doc.metadata[key])
+        return -float(rank)
+
+    def deduplicate(self, documents: Sequence[Document]) -> List[Document]:
+        """
+        Sắp xếp chunk theo điểm và bỏ phần trùng lặp giữa các chunk.
+
+        Các chunk liền kề của cùng một file chồng lấn nhau chunk_overlap ký tự;
+        phần chồng lấn được cắt khỏi chunk có điểm thấp hơn, chunk nằm trọn
+        trong chunk khác bị bỏ.
+
+        Args:
+            documents: Chunk theo thứ tự retrieval
+
+        Returns:
+            List[Document]: Chunk đã loại trùng, giảm dần theo điểm
+        """
+        ranked = sorted(
+            enumerate(documents),
+            key=lambda item: self.score(item[1], item[0]),
+            reverse=True
+        )
+        selected: List[Document] = []
+        for _, doc in ranked:
+            content = doc.page_content.strip()
+            source = doc.metadata.get("source")
+            for kept in selected:
+                if not content:
+                    break
+                if kept.metadata.get("source") != source:
+                    continue
+                if content in kept.page_content:
+                    content = ""
+                    break
+                head = _overlap(kept.page_content, content, self.min_overlap)
+                if head:
+                    content = content[head:].strip()
+                tail = _overlap(content, kept.page_content, self.min_overlap)
+                if tail:
+                    content = content[:-tail].strip()
+            if content:
+                selected.append(Document(page_content=content, metadata=doc.metadata))
+        return selected
+
+    def format_history(self, messages: Sequence[Dict[str, str]]) -> str:
+        """
+        Định dạng các tin nhắn gần nhất trong giới hạn token dành cho lịch sử.
+
+        Args:
+            messages: Tin nhắn theo thứ tự thời gian (role, content)
+
+        Returns:
+            str: Lịch sử hội thoại, bỏ bớt các tin nhắn cũ nhất nếu vượt giới hạn
+        """
+        lines: List[str] = []
+        used = 0
+        for message in reversed(messages[-self.history_limit:] if self.history_limit else []):
+            label = _ROLE_LABELS.get(message["role"], message["role"])
+            line = f"{label}: {message['content']}"
+            tokens = self.count_tokens(line)
+            if used + tokens > self.history_token_budget:
+                break
+            lines.append(line)
+            used += tokens
+        return "\n".join(reversed(lines))
+
+    def build(
+        self,
+        documents: Sequence[Document],
+        history: Optional[Sequence[Dict[str, str]]] = None
+    ) -> BuiltContext:
+        """
+        Ghép lịch sử và các chunk liên quan nhất vào context trong giới hạn token.
+
+        Args:
+            documents: Chunk theo thứ tự retrieval
+            history: Tin nhắn trước câu hỏi hiện tại
+
+        Returns:
+            BuiltContext: Context đã ghép và các chunk được dùng
+        """
+        history_text = self.format_history(history or [])
+        used = self.count_tokens(history_text)
+
+        packed: List[Document] = []
+        for doc in self.deduplicate(documents):
+            tokens = self.count_tokens(doc.page_content)
+            # Bỏ qua chunk không vừa nhưng vẫn thử các chunk ngắn hơn phía sau
+            if used + tokens > self.token_budget:
+                continue
+            packed.append(doc)
+            used += tokens
+
+        chunks_text = "\n\n".join(doc.page_content for doc in packed)
+        if history_text:
+            context = f"Lịch sử hội thoại:\n{history_text}\n\nTài liệu:\n{chunks_text}"
+        else:
+            context = chunks_text
+        return BuiltContext(
+            context=context,
+            documents=packed,
+            history=history_text,
+            tokens=used
+        )
@@ -1,11 +1,76 @@
 """
 Module xử lý document từ các file PDF và TXT.
 """
+import hashlib
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader, TextLoader, UnstructuredFileLoader
-from langchain_community.document_loaders.base import BaseLoader
-from typing import List, Optional
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.config import PDF_PARSE_WORKERS
+from .concurrency import run_blocking
+
+if TYPE_CHECKING:
+    from langchain_community.document_loaders.base import BaseLoader
+
+
+def _pdf_page_count(file_path: str) -> int:
+    from pypdf import PdfReader
+
+    return len(PdfReader(file_path).pages)
+
+
+def _extract_pdf_pages(
+    file_path: str,
+    start: int,
+    end: int,
+    base_metadata: Dict[str, Any]
+) -> List[Document]:
+    """
+    Trích text của các trang [start, end) trong một process worker.
+
+    Text và metadata giống với PyPDFLoader: base_metadata lấy từ trang đầu do
+    PyPDFLoader sinh ra, chỉ thay "page" và "page_label" theo từng trang.
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(file_path)
+    labels = reader.page_labels
+    pages = []
+    for page_number in range(start, end):
+        text = reader.pages[page_number].extract_text(extraction_mode="plain")
+        pages.append(Document(
+            page_content=text.strip(),
+            metadata={
+                **base_metadata,
+                "page": page_number,
+                "page_label": labels[page_number]
+            }
+        ))
+    return pages
+
+
+def _load_pdf_chunks(
+    file_path: str,
+    start: int,
+    end: int,
+    base_metadata: Dict[str, Any],
+    splitter_kwargs: Dict[str, Any]
+) -> List[Document]:
+    """Trích và split các trang [start, end) trong một process worker."""
+    pages = _extract_pdf_pages(file_path, start, end, base_metadata)
+    return DocumentProcessor(**splitter_kwargs).split_documents(pages)
+
+
+def _load_file_chunks(
+    file_path: str,
+    splitter_kwargs: Dict[str, Any]
+) -> List[Document]:
+    """Đọc và split toàn bộ một file (không phải PDF) trong một process worker."""
+    return DocumentProcessor(**splitter_kwargs).load_document(file_path)
 
 
 class DocumentProcessor:
@@ -13,7 +78,9 @@ class DocumentProcessor:
         self,
         chunk_size: int = 1000,
         chunk_overlap: int = 200,
-        separators: Optional[List[str]] = None
+        separators: Optional[List[str]] = None,
+        max_workers: int = PDF_PARSE_WORKERS,
+        pages_per_task: int = 16
     ):
         """
         Khởi tạo DocumentProcessor.
@@ -22,6 +89,8 @@ class DocumentProcessor:
             chunk_size: Kích thước mỗi chunk
             chunk_overlap: Độ chồng lấp giữa các chunk
             separators: Danh sách các ký tự phân tách
+            max_workers: Số process tối đa cho chế độ parse song song
+            pages_per_task: Số trang PDF mỗi process xử lý trong một task
         """
         if separators is None:
             separators = ["\n\n", "\n", " ", ""]
@@ -33,8 +102,59 @@ class DocumentProcessor:
             length_function=len,
             is_separator_regex=False
         )
+        # Tham số để dựng lại splitter giống hệt trong process worker
+        self._splitter_kwargs = {
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "separators": separators,
+            "max_workers": 1
+        }
+        self.max_workers = max(1, max_workers)
+        self.pages_per_task = max(1, pages_per_task)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # Dùng "spawn" vì fork một process đang có nhiều thread không an toàn
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
 
-    def _get_loader(self, file_path: str) -> BaseLoader:
+    def shutdown(self):
+        """Dừng process pool của chế độ parse song song (nếu đã được tạo)."""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def _pdf_tasks(self, file_path: str) -> List[Tuple[str, int, int, Dict[str, Any]]]:
+        """
+        Chia một PDF thành các dải trang cho process worker.
+
+        Returns:
+            List[Tuple]: (file_path, start, end, base_metadata) cho từng dải trang
+        """
+        page_count = _pdf_page_count(file_path)
+        if page_count == 0:
+            return []
+        from langchain_community.document_loaders import PyPDFLoader
+
+        # PyPDFLoader là generator nên chỉ trang đầu được trích ở đây
+        first_page = next(PyPDFLoader(file_path).lazy_load())
+        base_metadata = {
+            key: value for key, value in first_page.metadata.items()
+            if key not in ("page", "page_label")
+        }
+        return [
+            (file_path, start, min(start + self.pages_per_task, page_count), base_metadata)
+            for start in range(0, page_count, self.pages_per_task)
+        ]
+
+    def _get_loader(self, file_path: str) -> "BaseLoader":
         """
         Lấy loader phù hợp cho file.
 
@@ -44,6 +164,9 @@ class DocumentProcessor:
         Returns:
             BaseLoader: Loader phù hợp cho file
         """
+        # Import trễ vì langchain_community load khá chậm khi khởi động
+        from langchain_community.document_loaders import PyPDFLoader, TextLoader, UnstructuredFileLoader
+
         if file_path.endswith('.pdf'):
             return PyPDFLoader(file_path)
         elif file_path.endswith('.txt'):
@@ -52,35 +175,253 @@ class DocumentProcessor:
             # Sử dụng UnstructuredFileLoader cho các định dạng khác
             return UnstructuredFileLoader(file_path)
 
-    def load_document(self, file_path: str) -> List[Document]:
+    def load_document(self, file_path: str, parallel: bool = False) -> List[Document]:
         """
         Đọc và xử lý tài liệu từ file.
 
         Args:
             file_path: Đường dẫn đến file cần đọc
+            parallel: Parse và split các dải trang PDF trên nhiều process
 
         Returns:
             List[Document]: Danh sách các document đã được xử lý
         """
+        return list(self.iter_document(file_path, parallel=parallel))
+
+    def load_pages(self, file_path: str, parallel: bool = False) -> List[Document]:
+        """
+        Đọc file thành các trang (chưa split thành chunk).
+
+        Args:
+            file_path: Đường dẫn đến file cần đọc
+            parallel: Trích text các dải trang PDF trên nhiều process
+
+        Returns:
+            List[Document]: Mỗi document là một trang (hoặc cả file với TXT)
+        """
         try:
+            if parallel and file_path.endswith('.pdf') and self.max_workers > 1:
+                tasks = self._pdf_tasks(file_path)
+                if len(tasks) > 1:
+                    pages = []
+                    # map giữ nguyên thứ tự task nên thứ tự trang là xác định
+                    for result in self._get_pool().map(_extract_pdf_pages, *zip(*tasks)):
+                        pages.extend(result)
+                    return pages
+
             loader = self._get_loader(file_path)
-            documents = loader.load()
-            return self.text_splitter.split_documents(documents)
+            return loader.load()
+        except Exception as e:
+            raise ValueError(f"Lỗi khi đọc file {file_path}: {str(e)}")
+
+    def iter_pages(self, file_path: str) -> Iterator[Document]:
+        """
+        Đọc lần lượt từng trang của file bằng lazy_load của loader.
+
+        Args:
+            file_path: Đường dẫn đến file cần đọc
+
+        Yields:
+            Document: Từng trang (hoặc cả file với TXT)
+        """
+        try:
+            yield from self._get_loader(file_path).lazy_load()
         except Exception as e:
             raise ValueError(f"Lỗi khi đọc file {file_path}: {str(e)}")
 
-    def load_documents(self, file_paths: List[str]) -> List[Document]:
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        """
+        Split các trang thành chunk.
+
+        Args:
+            documents: Danh sách trang
+
+        Returns:
+            List[Document]: Danh sách chunk
+        """
+        return self.text_splitter.split_documents(documents)
+
+    def load_documents(
+        self,
+        file_paths: List[str],
+        parallel: bool = False
+    ) -> List[Document]:
         """
         Đọc và xử lý nhiều tài liệu.
 
         Args:
             file_paths: Danh sách đường dẫn đến các file
+            parallel: Chia các file và các dải trang PDF cho nhiều process;
+                thứ tự kết quả vẫn theo thứ tự file và trang
 
         Returns:
             List[Document]: Danh sách các document đã được xử lý
         """
-        all_documents = []
+        return list(self.iter_documents(file_paths, parallel=parallel))
+
+    def iter_document(
+        self,
+        file_path: str,
+        parallel: bool = False,
+        on_pages: Optional[Callable[[int], None]] = None
+    ) -> Iterator[Document]:
+        """
+        Đọc và split tài liệu dạng stream, trả về từng chunk theo từng trang.
+
+        Args:
+            file_path: Đường dẫn đến file cần đọc
+            parallel: Parse và split các dải trang PDF trên nhiều process
+            on_pages: Callback nhận số trang vừa được đọc
+
+        Yields:
+            Document: Từng chunk theo thứ tự trang
+        """
+        return self.iter_documents([file_path], parallel=parallel, on_pages=on_pages)
+
+    def iter_documents(
+        self,
+        file_paths: Iterable[str],
+        parallel: bool = False,
+        on_pages: Optional[Callable[[int], None]] = None
+    ) -> Iterator[Document]:
+        """
+        Đọc và split nhiều tài liệu dạng stream.
+
+        Chỉ các trang/dải trang đang được xử lý nằm trong bộ nhớ nên bộ nhớ
+        không tăng theo kích thước corpus khi đầu ra được tiêu thụ dần
+        (vd. bởi IngestionEngine).
+
+        Args:
+            file_paths: Các đường dẫn file
+            parallel: Chia các file và các dải trang PDF cho nhiều process,
+                thứ tự kết quả vẫn theo thứ tự file và trang
+            on_pages: Callback nhận số trang vừa được đọc
+
+        Yields:
+            Document: Từng chunk theo thứ tự file và trang, metadata["chunk_index"]
+                là thứ tự của chunk trong file
+        """
+        counters: Dict[str, int] = {}
+        for chunk in self._iter_chunks(file_paths, parallel, on_pages):
+            source = str(chunk.metadata.get("source", ""))
+            chunk.metadata["chunk_index"] = counters.get(source, 0)
+            counters[source] = chunk.metadata["chunk_index"] + 1
+            yield chunk
+
+    def _iter_chunks(
+        self,
+        file_paths: Iterable[str],
+        parallel: bool,
+        on_pages: Optional[Callable[[int], None]]
+    ) -> Iterator[Document]:
+        if not parallel or self.max_workers == 1:
+            for file_path in file_paths:
+                for page in self.iter_pages(file_path):
+                    if on_pages:
+                        on_pages(1)
+                    yield from self.text_splitter.split_documents([page])
+            return
+
+        pool = self._get_pool()
+        # Chỉ giữ tối đa 2 * max_workers task đang chờ để giới hạn bộ nhớ
+        window: Deque[Tuple[str, int, Future]] = deque()
+
+        def drain_one() -> List[Document]:
+            file_path, page_count, future = window.popleft()
+            try:
+                chunks = future.result()
+            except ValueError:
+                raise
+            except Exception as e:
+                raise ValueError(f"Lỗi khi đọc file {file_path}: {str(e)}")
+            if on_pages:
+                on_pages(page_count)
+            return chunks
+
         for file_path in file_paths:
-            documents = self.load_document(file_path)
-            all_documents.extend(documents)
-        return all_documents
+            if file_path.endswith('.pdf'):
+                try:
+                    tasks = self._pdf_tasks(file_path)
+                except Exception as e:
+                    raise ValueError(f"Lỗi khi đọc file {file_path}: {str(e)}")
+                submitted = [
+                    (file_path, end - start, pool.submit(
+                        _load_pdf_chunks, path, start, end, metadata,
+                        self._splitter_kwargs
+                    ))
+                    for path, start, end, metadata in tasks
+                ]
+            else:
+                # Không biết trước số trang của file không phải PDF
+                submitted = [(file_path, 0, pool.submit(
+                    _load_file_chunks, file_path, self._splitter_kwargs
+                ))]
+
+            for item in submitted:
+                window.append(item)
+                if len(window) >= 2 * self.max_workers:
+                    yield from drain_one()
+
+        while window:
+            yield from drain_one()
+
+    async def aload_document(self, file_path: str) -> List[Document]:
+        """
+        Phiên bản async của load_document, đọc và split trong thread pool.
+
+        Args:
+            file_path: Đường dẫn đến file cần đọc
+
+        Returns:
+            List[Document]: Danh sách các document đã được xử lý
+        """
+        return await run_blocking(self.load_document, file_path)
+
+    async def aload_documents(self, file_paths: List[str]) -> List[Document]:
+        """
+        Phiên bản async của load_documents.
+
+        Args:
+            file_paths: Danh sách đường dẫn đến các file
+
+        Returns:
+            List[Document]: Danh sách các document đã được xử lý
+        """
+        return await run_blocking(self.load_documents, file_paths)
+
+    @staticmethod
+    def make_chunk_id(source: str, index: int, content: str) -> str:
+        """
+        Sinh ID ổn định cho một chunk từ (file, thứ tự chunk, hash nội dung).
+
+        Args:
+            source: Tên file nguồn
+            index: Thứ tự của chunk trong file
+            content: Nội dung chunk
+
+        Returns:
+            str: ID của chunk
+        """
+        content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        key = f"{source}:{index}:{content_hash}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def make_chunk_ids(source: str, documents: List[Document]) -> List[str]:
+        """
+        Sinh ID ổn định cho các chunk từ (file, thứ tự chunk, hash nội dung).
+
+        Cùng một file với cùng nội dung luôn cho ra cùng danh sách ID, nhờ đó
+        việc ghi lại vào vector store là idempotent.
+
+        Args:
+            source: Tên file nguồn
+            documents: Danh sách chunk của file
+
+        Returns:
+            List[str]: ID tương ứng với từng chunk
+        """
+        return [
+            DocumentProcessor.make_chunk_id(source, index, doc.page_content)
+            for index, doc in enumerate(documents)
+        ]
@@ -0,0 +1,388 @@
+"""
+Module các backend embedding: Google Generative AI (qua API) và sentence-transformers
+chạy cục bộ trên CPU.
+"""
+
+import asyncio
+import inspect
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.config import (
+    GOOGLE_API_KEY,
+    EMBEDDING_DEVICE,
+    EMBEDDING_QUANTIZE,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_BATCH_WAIT_MS,
+    EMBEDDING_QUERY_PREFIX,
+    EMBEDDING_DOCUMENT_PREFIX
+)
+
+# Model mặc định của từng backend
+DEFAULT_MODELS = {
+    "google": "models/embedding-001",
+    "local": "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+}
+
+_models: Dict[Tuple[str, str, bool], Any] = {}
+_models_lock = threading.Lock()
+
+
+def load_sentence_transformer(model_name: str, device: str = "cpu", quantize: bool = False):
+    """
+    Load model sentence-transformers một lần cho mỗi cấu hình và dùng chung.
+
+    Args:
+        model_name: Tên model trên HuggingFace Hub hoặc đường dẫn cục bộ
+        device: Thiết bị chạy model
+        quantize: Lượng tử hóa động các lớp Linear sang int8 (chỉ trên CPU)
+
+    Returns:
+        SentenceTransformer: Model đã được load
+    """
+    key = (model_name, device, quantize)
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            # Import trễ vì sentence_transformers/torch load khá chậm
+            from sentence_transformers import SentenceTransformer
+
+            model = SentenceTransformer(model_name, device=device)
+            if quantize:
+                import torch
+
+                model = torch.quantization.quantize_dynamic(
+                    model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+            model.eval()
+            _models[key] = model
+        return model
+
+
+class DynamicBatcher:
+    """
+    Gom các lời gọi encode đồng thời thành một batch cho một thread worker.
+
+    Lời gọi đầu tiên chờ tối đa max_wait giây để các request khác nhập batch,
+    hoặc tới khi đủ max_batch_size văn bản.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[List[str]], np.ndarray],
+        max_batch_size: int = 64,
+        max_wait: float = 0.005
+    ):
+        """
+        Khởi tạo DynamicBatcher.
+
+        Args:
+            encode: Hàm encode một danh sách văn bản thành ma trận vector
+            max_batch_size: Số văn bản tối đa của một batch
+            max_wait: Thời gian (giây) tối đa chờ gom batch
+        """
+        self.encode = encode
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait)
+        self._queue: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            # Khởi động lại worker nếu thread trước đã dừng bất thường
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._loop,
+                    name="embedding-batcher",
+                    daemon=True
+                )
+                self._worker.start()
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+            try:
+                self._run_batch(batch)
+            except Exception:
+                # Lỗi của một batch không được làm dừng thread worker
+                continue
+
+    def _run_batch(self, batch: List[Tuple[List[str], Future]]):
+        # Bỏ các lời gọi đã bị hủy (vd. client ngắt kết nối); future còn lại
+        # chuyển sang running nên không thể bị hủy giữa chừng nữa
+        batch = [(texts, future) for texts, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        texts = [text for texts, _ in batch for text in texts]
+        try:
+            vectors = self.encode(texts)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        offset = 0
+        for texts, future in batch:
+            future.set_result(vectors[offset:offset + len(texts)])
+            offset += len(texts)
+
+    def submit(self, texts: List[str]) -> Future:
+        """
+        Đưa văn bản vào hàng đợi encode.
+
+        Args:
+            texts: Các văn bản cần encode
+
+        Returns:
+            Future: Kết quả là ma trận vector theo thứ tự của texts
+        """
+        future: Future = Future()
+        if not texts:
+            future.set_result(np.zeros((0, 0), dtype=np.float32))
+            return future
+        self._ensure_worker()
+        self._queue.put((list(texts), future))
+        return future
+
+
+class LocalEmbeddings(Embeddings):
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODELS["local"],
+        device: str = EMBEDDING_DEVICE,
+        quantize: bool = EMBEDDING_QUANTIZE,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        batch_wait_ms: float = EMBEDDING_BATCH_WAIT_MS,
+        query_prefix: str = EMBEDDING_QUERY_PREFIX,
+        document_prefix: str = EMBEDDING_DOCUMENT_PREFIX
+    ):
+        """
+        Embedding bằng sentence-transformers chạy cục bộ.
+
+        Các request đồng thời (câu hỏi từ nhiều endpoint, batch ingestion) được
+        gom thành batch chung; vector trả về là float32 đã chuẩn hóa L2.
+
+        Args:
+            model_name: Tên model trên HuggingFace Hub hoặc đường dẫn cục bộ
+            device: Thiết bị chạy model
+            quantize: Lượng tử hóa động int8 để tăng tốc trên CPU
+            batch_size: Số văn bản tối đa của một batch
+            batch_wait_ms: Thời gian (ms) chờ gom batch
+            query_prefix: Tiền tố thêm vào câu hỏi (vd. "query: " với model e5)
+            document_prefix: Tiền tố thêm vào chunk (vd. "passage: " với model e5)
+        """
+        self.model_name = model_name
+        self.device = device
+        self.quantize = quantize
+        self.batch_size = batch_size
+        self.query_prefix = query_prefix
+        self.document_prefix = document_prefix
+        self._batcher = DynamicBatcher(
+            self._encode,
+            max_batch_size=batch_size,
+            max_wait=batch_wait_ms / 1000
+        )
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        model = load_sentence_transformer(self.model_name, self.device, self.quantize)
+        vectors = model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return np.asarray(vectors, dtype=np.float32)
+
+    def load(self):
+        """Load model ngay thay vì ở lần embed đầu tiên."""
+        load_sentence_transformer(self.model_name, self.device, self.quantize)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = [self.document_prefix + text for text in texts]
+        return self._batcher.submit(texts).result().tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._batcher.submit([self.query_prefix + text]).result()[0].tolist()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = [self.document_prefix + text for text in texts]
+        vectors = await asyncio.wrap_future(self._batcher.submit(texts))
+        return vectors.tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vectors = await asyncio.wrap_future(self._batcher.submit([self.query_prefix + text]))
+        return vectors[0].tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        texts = [self.query_prefix + text for text in texts]
+        return self._batcher.submit(texts).result().tolist()
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        texts = [self.query_prefix + text for text in texts]
+        vectors = await asyncio.wrap_future(self._batcher.submit(texts))
+        return vectors.tolist()
+
+
+class LazyEmbeddings(Embeddings):
+    def __init__(self, factory: Callable[[], Embeddings]):
+        """
+        Tạo Embeddings thật ở lần dùng đầu tiên, để việc import client (vd.
+        langchain_google_genai) không làm chậm lúc khởi động.
+
+        Args:
+            factory: Hàm tạo Embeddings thật
+        """
+        self._factory = factory
+        self._embeddings: Optional[Embeddings] = None
+        self._lock = threading.Lock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    self._embeddings = self._factory()
+        return self._embeddings
+
+    def load(self):
+        """Tạo Embeddings thật ngay thay vì ở lần embed đầu tiên."""
+        self.embeddings  # Tạo client
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.embeddings.aembed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return embed_queries(self.embeddings, texts)
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        return await aembed_queries(self.embeddings, texts)
+
+
+def _accepts_task_type(method: Callable) -> bool:
+    try:
+        return "task_type" in inspect.signature(method).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """
+    Embed nhiều câu hỏi trong một lời gọi batch.
+
+    Backend có embed_queries (LocalEmbeddings, CachedEmbeddings) được gọi trực
+    tiếp; backend nhận task_type như Google embed cả batch với task
+    "RETRIEVAL_QUERY"; backend khác embed từng câu hỏi.
+
+    Args:
+        embeddings: Backend embedding
+        texts: Các câu hỏi
+
+    Returns:
+        List[List[float]]: Vector của từng câu hỏi
+    """
+    if not texts:
+        return []
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    if _accepts_task_type(embeddings.embed_documents):
+        return embeddings.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+    return [embeddings.embed_query(text) for text in texts]
+
+
+async def aembed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """
+    Phiên bản async của embed_queries.
+
+    Args:
+        embeddings: Backend embedding
+        texts: Các câu hỏi
+
+    Returns:
+        List[List[float]]: Vector của từng câu hỏi
+    """
+    if not texts:
+        return []
+    if hasattr(embeddings, "aembed_queries"):
+        return await embeddings.aembed_queries(texts)
+    if _accepts_task_type(embeddings.aembed_documents):
+        return await embeddings.aembed_documents(texts, task_type="RETRIEVAL_QUERY")
+    return list(await asyncio.gather(*(embeddings.aembed_query(text) for text in texts)))
+
+
+def embedding_model_id(backend: str, model_name: str, quantize: bool = False) -> str:
+    """
+    Định danh của model embedding, ghi vào metadata của collection.
+
+    Model Google giữ nguyên tên để khớp với các collection và cache đã có.
+
+    Args:
+        backend: "google" hoặc "local"
+        model_name: Tên model
+        quantize: Model cục bộ có được lượng tử hóa int8 không
+
+    Returns:
+        str: Định danh của model
+    """
+    if backend == "google":
+        return model_name
+    return f"{backend}:{model_name}" + ("#int8" if quantize else "")
+
+
+def create_embeddings(
+    backend: str,
+    model_name: Optional[str] = None,
+    api_key: Optional[str] = GOOGLE_API_KEY
+) -> Embeddings:
+    """
+    Tạo backend embedding theo tên.
+
+    Args:
+        backend: "google" (Google Generative AI) hoặc "local" (sentence-transformers)
+        model_name: Tên model, mặc định theo backend
+        api_key: Google API key (backend "google")
+
+    Returns:
+        Embeddings: Backend đã khởi tạo
+    """
+    if backend not in DEFAULT_MODELS:
+        raise ValueError(f"Embedding backend không hợp lệ: {backend}")
+    model_name = model_name or DEFAULT_MODELS[backend]
+    if backend == "google":
+        def factory() -> Embeddings:
+            from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+            return GoogleGenerativeAIEmbeddings(
+                model=model_name,
+                google_api_key=api_key
+            )
+
+        return LazyEmbeddings(factory)
+    return LocalEmbeddings(model_name=model_name)
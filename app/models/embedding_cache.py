@@ -0,0 +1,321 @@
+"""
+Module cache embeddings theo nội dung (model, hash của văn bản).
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from .concurrency import run_blocking
+from .embedding_backends import aembed_queries, embed_queries
+
+
+def _vector_to_blob(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _blob_to_vector(blob: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class EmbeddingCache:
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        max_memory_items: int = 10000
+    ):
+        """
+        Khởi tạo EmbeddingCache gồm tầng LRU trong bộ nhớ và tầng SQLite trên disk.
+
+        Args:
+            db_path: Đường dẫn file SQLite, None để chỉ dùng cache trong bộ nhớ
+            max_memory_items: Số vector tối đa giữ trong bộ nhớ
+        """
+        self.db_path = db_path
+        self.max_memory_items = max(0, max_memory_items)
+        self._memory: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._conn = None
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    PRIMARY KEY (model, text_hash)
+                ) WITHOUT ROWID"""
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """Hash nội dung văn bản làm khóa cache."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: Tuple[str, str], vector: List[float]):
+        if not self.max_memory_items:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(
+        self,
+        model: str,
+        texts: List[str]
+    ) -> List[Optional[List[float]]]:
+        """
+        Tra cứu embeddings của nhiều văn bản.
+
+        Args:
+            model: Tên model embedding
+            texts: Danh sách văn bản
+
+        Returns:
+            List[Optional[List[float]]]: Vector cho từng văn bản, None nếu chưa có
+        """
+        keys = [(model, self.hash_text(text)) for text in texts]
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+                    self.memory_hits += 1
+                else:
+                    missing.setdefault(key[1], []).append(i)
+
+            if missing and self._conn is not None:
+                hashes = list(missing)
+                # Giới hạn số tham số của một câu lệnh SQLite
+                for start in range(0, len(hashes), 500):
+                    batch = hashes[start:start + 500]
+                    rows = self._conn.execute(
+                        "SELECT text_hash, vector FROM embeddings "
+                        f"WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                        [model, *batch]
+                    ).fetchall()
+                    for text_hash, blob in rows:
+                        vector = _blob_to_vector(blob)
+                        self._remember((model, text_hash), vector)
+                        for i in missing.pop(text_hash):
+                            results[i] = vector
+                            self.disk_hits += 1
+
+            self.misses += sum(len(indices) for indices in missing.values())
+        return results
+
+    def set_many(
+        self,
+        model: str,
+        texts: List[str],
+        vectors: List[List[float]]
+    ):
+        """
+        Lưu embeddings của nhiều văn bản vào cache.
+
+        Args:
+            model: Tên model embedding
+            texts: Danh sách văn bản
+            vectors: Vector tương ứng với từng văn bản
+        """
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                vector = list(vector)
+                text_hash = self.hash_text(text)
+                self._remember((model, text_hash), vector)
+                rows.append((model, text_hash, _vector_to_blob(vector)))
+
+            if rows and self._conn is not None:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) "
+                    "VALUES (?, ?, ?)",
+                    rows
+                )
+                self._conn.commit()
+
+    async def aget_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Phiên bản async của get_many, đọc tầng SQLite trong thread pool."""
+        if self._conn is None:
+            return self.get_many(model, texts)
+        return await run_blocking(self.get_many, model, texts)
+
+    async def aset_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """Phiên bản async của set_many, ghi tầng SQLite trong thread pool."""
+        if self._conn is None:
+            self.set_many(model, texts, vectors)
+        else:
+            await run_blocking(self.set_many, model, texts, vectors)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Lấy thống kê hit/miss của cache.
+
+        Returns:
+            Dict[str, float]: Số lần hit, miss và tỉ lệ hit
+        """
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                "memory_items": len(self._memory)
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        cache: EmbeddingCache,
+        model_name: str
+    ):
+        """
+        Bọc một Embeddings và ghi nhớ kết quả qua EmbeddingCache.
+
+        Embedding của câu hỏi và của tài liệu được lưu ở hai namespace riêng
+        vì một số model (như Google) dùng task_type khác nhau cho hai loại này.
+
+        Args:
+            embeddings: Embeddings gốc
+            cache: Cache dùng chung
+            model_name: Tên model, dùng làm một phần khóa cache
+        """
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name
+
+    @property
+    def _document_namespace(self) -> str:
+        return f"{self.model_name}#document"
+
+    @property
+    def _query_namespace(self) -> str:
+        return f"{self.model_name}#query"
+
+    def _split_misses(
+        self,
+        namespace: str,
+        texts: List[str]
+    ) -> Tuple[List[Optional[List[float]]], List[str]]:
+        results = self.cache.get_many(namespace, texts)
+        # Loại trùng để mỗi văn bản chỉ được embed một lần
+        missing = list(dict.fromkeys(
+            text for text, vector in zip(texts, results) if vector is None
+        ))
+        return results, missing
+
+    async def _asplit_misses(
+        self,
+        namespace: str,
+        texts: List[str]
+    ) -> Tuple[List[Optional[List[float]]], List[str]]:
+        results = await self.cache.aget_many(namespace, texts)
+        missing = list(dict.fromkeys(
+            text for text, vector in zip(texts, results) if vector is None
+        ))
+        return results, missing
+
+    @staticmethod
+    def _fill(
+        texts: List[str],
+        results: List[Optional[List[float]]],
+        missing: List[str],
+        vectors: List[List[float]]
+    ) -> List[List[float]]:
+        computed = dict(zip(missing, vectors))
+        return [
+            vector if vector is not None else list(computed[text])
+            for text, vector in zip(texts, results)
+        ]
+
+    def _merge(
+        self,
+        namespace: str,
+        texts: List[str],
+        results: List[Optional[List[float]]],
+        missing: List[str],
+        vectors: List[List[float]]
+    ) -> List[List[float]]:
+        self.cache.set_many(namespace, missing, vectors)
+        return self._fill(texts, results, missing, vectors)
+
+    async def _amerge(
+        self,
+        namespace: str,
+        texts: List[str],
+        results: List[Optional[List[float]]],
+        missing: List[str],
+        vectors: List[List[float]]
+    ) -> List[List[float]]:
+        await self.cache.aset_many(namespace, missing, vectors)
+        return self._fill(texts, results, missing, vectors)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        namespace = self._document_namespace
+        results, missing = self._split_misses(namespace, texts)
+        vectors = self.embeddings.embed_documents(missing) if missing else []
+        return self._merge(namespace, texts, results, missing, vectors)
+
+    def embed_query(self, text: str) -> List[float]:
+        namespace = self._query_namespace
+        cached = self.cache.get_many(namespace, [text])[0]
+        if cached is not None:
+            return cached
+        vector = list(self.embeddings.embed_query(text))
+        self.cache.set_many(namespace, [text], [vector])
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        namespace = self._document_namespace
+        results, missing = await self._asplit_misses(namespace, texts)
+        vectors = await self.embeddings.aembed_documents(missing) if missing else []
+        return await self._amerge(namespace, texts, results, missing, vectors)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        namespace = self._query_namespace
+        cached = (await self.cache.aget_many(namespace, [text]))[0]
+        if cached is not None:
+            return cached
+        vector = list(await self.embeddings.aembed_query(text))
+        await self.cache.aset_many(namespace, [text], [vector])
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed nhiều câu hỏi, các câu chưa có trong cache được embed trong một batch."""
+        namespace = self._query_namespace
+        results, missing = self._split_misses(namespace, texts)
+        vectors = embed_queries(self.embeddings, missing) if missing else []
+        return self._merge(namespace, texts, results, missing, vectors)
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Phiên bản async của embed_queries."""
+        namespace = self._query_namespace
+        results, missing = await self._asplit_misses(namespace, texts)
+        vectors = await aembed_queries(self.embeddings, missing) if missing else []
+        return await self._amerge(namespace, texts, results, missing, vectors)
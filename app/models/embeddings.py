@@ -2,64 +2,585 @@
 Module xử lý embeddings và vector store.
 """
 
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterable, Callable, Union
+from collections import OrderedDict
 import os
+import threading
 from langchain_core.documents import Document
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import Chroma
 from langchain_core.vectorstores import VectorStore
-from app.config import GOOGLE_API_KEY
+from app.config import (
+    GOOGLE_API_KEY,
+    EMBEDDING_BACKEND,
+    EMBEDDING_MODEL,
+    VECTOR_STORE_BACKEND,
+    VECTOR_STORE_CACHE_SIZE,
+    EMBEDDING_CACHE_SIZE,
+    INGEST_BATCH_SIZE,
+    INGEST_MAX_CONCURRENCY,
+    INGEST_MAX_RETRIES,
+    BM25_K1,
+    BM25_B,
+    RRF_K,
+    MMR_FETCH_K,
+    MMR_LAMBDA
+)
+from .embedding_cache import EmbeddingCache, CachedEmbeddings
+from .embedding_backends import DEFAULT_MODELS, create_embeddings, embedding_model_id
+from .ingestion import IngestionEngine, IdFunction
+from .lexical_index import BM25Index
+from .numpy_store import NumpyVectorStore
+from .hybrid_retriever import HybridRetriever, LexicalRetriever
+from .mmr import MMRRetriever
+from .concurrency import run_blocking
+
+
+# Các collection được tạo trước khi metadata ghi lại model đều dùng model Google mặc định
+_LEGACY_EMBEDDING_MODEL = DEFAULT_MODELS["google"]
+
+
+class EmbeddingModelMismatchError(ValueError):
+    """Collection được tạo bằng model embedding khác với model đang dùng."""
 
 
 class EmbeddingManager:
     def __init__(
         self,
         api_key: str = GOOGLE_API_KEY,
-        model_name: str = "models/embedding-001",
-        persist_directory: Optional[str] = None
+        model_name: Optional[str] = EMBEDDING_MODEL,
+        persist_directory: Optional[str] = None,
+        max_cached_stores: int = VECTOR_STORE_CACHE_SIZE,
+        cache_path: Optional[str] = None,
+        backend: str = EMBEDDING_BACKEND,
+        store_backend: str = VECTOR_STORE_BACKEND
     ):
         """
         Khởi tạo EmbeddingManager.
 
         Args:
             api_key: Google API key
-            model_name: Tên model embedding
+            model_name: Tên model embedding, mặc định theo backend
             persist_directory: Thư mục lưu trữ vector store
+            max_cached_stores: Số collection tối đa được giữ mở trong cache
+            cache_path: File SQLite của cache embedding, mặc định nằm trong
+                persist_directory
+            backend: "google" (Google Generative AI) hoặc "local"
+                (sentence-transformers chạy cục bộ)
+            store_backend: "chroma" hoặc "numpy" (NumpyVectorStore memory-mapped)
         """
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model=model_name,
-            google_api_key=api_key
+        if store_backend not in ("chroma", "numpy"):
+            raise ValueError(f"Vector store backend không hợp lệ: {store_backend}")
+        self.store_backend = store_backend
+        if cache_path is None and persist_directory:
+            cache_path = os.path.join(persist_directory, "embedding_cache.sqlite3")
+        self.embedding_cache = EmbeddingCache(
+            db_path=cache_path,
+            max_memory_items=EMBEDDING_CACHE_SIZE
+        )
+        self.backend = backend
+        self.model_name = model_name or DEFAULT_MODELS.get(backend)
+        base_embeddings = create_embeddings(backend, self.model_name, api_key=api_key)
+        # Định danh model dùng làm khóa cache và ghi vào metadata của collection
+        self.model_id = embedding_model_id(
+            backend,
+            self.model_name,
+            quantize=getattr(base_embeddings, "quantize", False)
+        )
+        self.embeddings = CachedEmbeddings(
+            base_embeddings,
+            cache=self.embedding_cache,
+            model_name=self.model_id
+        )
+        self.ingestion_engine = IngestionEngine(
+            self.embeddings,
+            batch_size=INGEST_BATCH_SIZE,
+            max_concurrency=INGEST_MAX_CONCURRENCY,
+            max_retries=INGEST_MAX_RETRIES
         )
         self.persist_directory = persist_directory
         self.vector_store = None
+        self.max_cached_stores = max(1, max_cached_stores)
+        # Cache LRU: collection_name -> handle Chroma đã mở
+        self._stores: "OrderedDict[str, VectorStore]" = OrderedDict()
+        self._stores_lock = threading.Lock()
+        # Chroma tạo client dùng chung theo persist_directory không an toàn khi
+        # nhiều thread mở collection lần đầu cùng lúc
+        self._open_lock = threading.Lock()
+        # Phiên bản của từng collection, tăng mỗi khi collection được ghi lại; lưu
+        # trên disk để mọi worker cùng thấy, chỉ giữ trong bộ nhớ khi không có persist_directory
+        self._versions: Dict[str, int] = {}
+        # Chỉ mục BM25 của từng collection, load từ disk khi cần
+        self._lexical_indexes: Dict[str, BM25Index] = {}
+        self._lexical_lock = threading.Lock()
+
+    def load_model(self):
+        """Khởi tạo backend embedding (client Google hoặc model cục bộ) ngay thay vì ở lần embed đầu tiên."""
+        load = getattr(self.embeddings.embeddings, "load", None)
+        if load is not None:
+            load()
 
     def create_vector_store(
         self,
-        documents: List[Document],
-        collection_name: str = "documents"
+        documents: Iterable[Document],
+        collection_name: str = "documents",
+        ids: Optional[Iterable[str]] = None
     ) -> VectorStore:
         """
         Tạo vector store từ documents.
 
+        Documents được embed theo batch song song và ghi vào collection ngay
+        khi từng batch hoàn thành (xem IngestionEngine).
+
         Args:
-            documents: Danh sách các document cần lưu trữ
+            documents: Danh sách (hoặc iterator) các document cần lưu trữ
             collection_name: Tên collection trong vector store
+            ids: ID của từng document, mặc định sinh ngẫu nhiên
 
         Returns:
             VectorStore: Vector store đã được tạo
         """
         # Kiểm tra documents có hợp lệ không
-        if not documents or all(doc.page_content.strip() == "" for doc in documents):
+        if isinstance(documents, list) and all(doc.page_content.strip() == "" for doc in documents):
             print(f"⚠️ Skipping create_vector_store for collection '{collection_name}' because documents are empty.")
-    
-        self.vector_store = Chroma.from_documents(
-            documents=documents,
-            embedding=self.embeddings,
-            persist_directory=self.persist_directory,
-            collection_name=collection_name
+
+        # Collection sắp được ghi lại, bỏ handle cũ trong cache
+        self.invalidate(collection_name)
+        self.vector_store = self.get_vector_store(collection_name)
+        index = self.get_lexical_index(collection_name)
+        self.ingestion_engine.ingest(
+            self.vector_store,
+            documents,
+            ids=ids,
+            on_write=index.add
         )
+        index.save()
         return self.vector_store
 
+    def add_documents(
+        self,
+        documents: Iterable[Document],
+        collection_name: str = "documents",
+        ids: Optional[Union[Iterable[str], IdFunction]] = None,
+        on_batch: Optional[Callable[[int], None]] = None,
+        save_index: bool = True
+    ) -> VectorStore:
+        """
+        Thêm (hoặc ghi đè theo ID) documents vào một collection có sẵn.
+
+        Args:
+            documents: Danh sách các document cần thêm
+            collection_name: Tên collection trong vector store
+            ids: ID của từng document (hoặc hàm (thứ tự, document) -> ID),
+                trùng ID sẽ ghi đè bản cũ
+            on_batch: Callback nhận số chunk vừa được ghi sau mỗi batch
+            save_index: Lưu chỉ mục BM25 xuống disk ngay; False khi người gọi
+                còn ghi tiếp và sẽ gọi save_lexical_index một lần ở cuối
+
+        Returns:
+            VectorStore: Vector store của collection
+        """
+        store = self.get_vector_store(collection_name)
+        index = self.get_lexical_index(collection_name)
+        self.ingestion_engine.ingest(
+            store,
+            documents,
+            ids=ids,
+            on_batch=on_batch,
+            on_write=index.add
+        )
+        if save_index:
+            index.save()
+        return store
+
+    def delete_documents(
+        self,
+        ids: List[str],
+        collection_name: str = "documents",
+        save_index: bool = True
+    ):
+        """
+        Xóa documents khỏi collection theo ID.
+
+        Args:
+            ids: Danh sách ID cần xóa
+            collection_name: Tên collection trong vector store
+            save_index: Lưu chỉ mục BM25 xuống disk ngay (xem add_documents)
+        """
+        if ids:
+            self.get_vector_store(collection_name).delete(ids=ids)
+            index = self.get_lexical_index(collection_name)
+            index.delete(ids)
+            if save_index:
+                index.save()
+
+    def save_lexical_index(self, collection_name: str = "documents"):
+        """
+        Lưu chỉ mục BM25 của collection xuống disk nếu có thay đổi chưa lưu.
+
+        Mỗi lần lưu ghi lại toàn bộ file nên chỉ gọi một lần sau mỗi file/job.
+
+        Args:
+            collection_name: Tên collection
+        """
+        with self._lexical_lock:
+            index = self._lexical_indexes.get(collection_name)
+        if index is not None and index.dirty:
+            index.save()
+
+    def reset_collection(self, collection_name: str):
+        """
+        Xóa toàn bộ collection khỏi disk.
+
+        Args:
+            collection_name: Tên collection cần xóa
+        """
+        # Không kiểm tra model: collection bị xóa để dựng lại bằng model hiện tại
+        self._open_vector_store(collection_name, check_model=False).delete_collection()
+        self.invalidate(collection_name)
+        with self._lexical_lock:
+            self._lexical_indexes.pop(collection_name, None)
+        path = self._lexical_index_path(collection_name)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def _check_embedding_model(self, store: VectorStore, collection_name: str):
+        """
+        Kiểm tra collection được tạo bằng cùng model embedding, ghi model vào
+        metadata nếu collection chưa có.
+
+        Raises:
+            EmbeddingModelMismatchError: Collection dùng model khác
+        """
+        if isinstance(store, NumpyVectorStore):
+            # Model được ghi lại khi store được tạo
+            model_id = store.embedding_model
+            if model_id and model_id != self.model_id:
+                raise EmbeddingModelMismatchError(
+                    f"Collection '{collection_name}' được tạo bằng model embedding "
+                    f"'{model_id}', không dùng được với '{self.model_id}'"
+                )
+            return
+        collection = getattr(store, "_collection", None)
+        if collection is None:
+            return
+        metadata = dict(collection.metadata or {})
+        model_id = metadata.get("embedding_model")
+        if model_id is None:
+            # Collection rỗng nhận model hiện tại; collection cũ có dữ liệu
+            # được tạo bằng model Google mặc định
+            model_id = self.model_id if collection.count() == 0 else _LEGACY_EMBEDDING_MODEL
+            if model_id == self.model_id:
+                collection.modify(metadata={**metadata, "embedding_model": model_id})
+        if model_id != self.model_id:
+            raise EmbeddingModelMismatchError(
+                f"Collection '{collection_name}' được tạo bằng model embedding "
+                f"'{model_id}', không dùng được với '{self.model_id}'"
+            )
+
+    def _open_vector_store(self, collection_name: str, check_model: bool = True) -> VectorStore:
+        """
+        Mở handle mới tới một collection trên disk.
+
+        Args:
+            collection_name: Tên collection cần mở
+            check_model: Kiểm tra model embedding của collection
+
+        Returns:
+            VectorStore: Handle Chroma của collection
+
+        Raises:
+            EmbeddingModelMismatchError: Collection dùng model embedding khác
+        """
+        if not self.persist_directory:
+            raise ValueError("persist_directory chưa được cấu hình")
+
+        if self.store_backend == "numpy":
+            store = NumpyVectorStore(
+                os.path.join(self.persist_directory, "numpy", collection_name),
+                embedding=self.embeddings,
+                collection_name=collection_name,
+                embedding_model=self.model_id
+            )
+            if check_model:
+                self._check_embedding_model(store, collection_name)
+            return store
+
+        # Import trễ vì chromadb load khá chậm khi khởi động
+        from langchain_community.vectorstores import Chroma
+
+        with self._open_lock:
+            store = Chroma(
+                persist_directory=self.persist_directory,
+                embedding_function=self.embeddings,
+                collection_name=collection_name,
+                # Chỉ áp dụng khi collection được tạo mới
+                collection_metadata={"embedding_model": self.model_id}
+            )
+            if check_model:
+                self._check_embedding_model(store, collection_name)
+            return store
+
+    def get_vector_store(self, collection_name: str = "documents") -> VectorStore:
+        """
+        Lấy handle của collection từ cache, mở mới nếu chưa có.
+
+        Khác với load_vector_store, hàm này không thay đổi self.vector_store
+        nên an toàn khi nhiều request dùng các collection khác nhau cùng lúc.
+
+        Args:
+            collection_name: Tên collection cần lấy
+
+        Returns:
+            VectorStore: Handle của collection
+        """
+        with self._stores_lock:
+            store = self._stores.get(collection_name)
+            if store is not None:
+                self._stores.move_to_end(collection_name)
+                return store
+
+        store = self._open_vector_store(collection_name)
+
+        with self._stores_lock:
+            # Request khác có thể đã mở cùng collection trong lúc chờ
+            cached = self._stores.get(collection_name)
+            if cached is not None:
+                self._stores.move_to_end(collection_name)
+                return cached
+            self._stores[collection_name] = store
+            while len(self._stores) > self.max_cached_stores:
+                self._stores.popitem(last=False)
+        return store
+
+    def _lexical_index_path(self, collection_name: str) -> Optional[str]:
+        if not self.persist_directory:
+            return None
+        return os.path.join(self.persist_directory, f"{collection_name}.bm25.json.gz")
+
+    def _build_lexical_index(self, collection_name: str, page_size: int = 1000) -> BM25Index:
+        """
+        Dựng chỉ mục BM25 từ nội dung đã có trong collection Chroma.
+
+        Dùng cho các collection được tạo trước khi có chỉ mục BM25.
+
+        Args:
+            collection_name: Tên collection
+            page_size: Số chunk đọc từ Chroma mỗi lần
+
+        Returns:
+            BM25Index: Chỉ mục đã dựng
+        """
+        index = BM25Index(
+            self._lexical_index_path(collection_name),
+            k1=BM25_K1,
+            b=BM25_B
+        )
+        store = self.get_vector_store(collection_name)
+        if isinstance(store, NumpyVectorStore):
+            for ids, texts, metadatas in store.iter_records(page_size):
+                index.add(ids, texts, metadatas)
+            if len(index):
+                index.save()
+            return index
+
+        collection = getattr(store, "_collection", None)
+        if collection is None:
+            return index
+
+        offset = 0
+        while True:
+            page = collection.get(
+                include=["documents", "metadatas"],
+                limit=page_size,
+                offset=offset
+            )
+            if not page["ids"]:
+                break
+            index.add(page["ids"], page["documents"], page["metadatas"])
+            offset += len(page["ids"])
+        if len(index):
+            index.save()
+        return index
+
+    def get_lexical_index(self, collection_name: str = "documents") -> BM25Index:
+        """
+        Lấy chỉ mục BM25 của collection, load từ disk hoặc dựng lại nếu chưa có.
+
+        Args:
+            collection_name: Tên collection
+
+        Returns:
+            BM25Index: Chỉ mục của collection
+        """
+        with self._lexical_lock:
+            index = self._lexical_indexes.get(collection_name)
+        if index is not None:
+            # Process khác có thể đã ghi lại chỉ mục sau khi ingest
+            index.refresh()
+            return index
+
+        with self._lexical_lock:
+            index = self._lexical_indexes.get(collection_name)
+            if index is not None:
+                return index
+
+            path = self._lexical_index_path(collection_name)
+            if path and os.path.exists(path):
+                index = BM25Index.load(path)
+            elif self.persist_directory:
+                index = self._build_lexical_index(collection_name)
+            else:
+                index = BM25Index(k1=BM25_K1, b=BM25_B)
+            self._lexical_indexes[collection_name] = index
+            return index
+
+    async def aget_vector_store(self, collection_name: str = "documents") -> VectorStore:
+        """
+        Phiên bản async của get_vector_store.
+
+        Cache hit trả về ngay, chỉ việc mở collection mới chạy trong thread pool.
+
+        Args:
+            collection_name: Tên collection cần lấy
+
+        Returns:
+            VectorStore: Handle của collection
+        """
+        with self._stores_lock:
+            store = self._stores.get(collection_name)
+            if store is not None:
+                self._stores.move_to_end(collection_name)
+                return store
+        return await run_blocking(self.get_vector_store, collection_name)
+
+    async def acreate_vector_store(
+        self,
+        documents: Iterable[Document],
+        collection_name: str = "documents",
+        ids: Optional[Iterable[str]] = None
+    ) -> VectorStore:
+        """
+        Phiên bản async của create_vector_store, chạy trong thread pool.
+
+        Args:
+            documents: Danh sách (hoặc iterator) các document cần lưu trữ
+            collection_name: Tên collection trong vector store
+            ids: ID của từng document, mặc định sinh ngẫu nhiên
+
+        Returns:
+            VectorStore: Vector store đã được tạo
+        """
+        return await run_blocking(
+            self.create_vector_store,
+            documents,
+            collection_name=collection_name,
+            ids=ids
+        )
+
+    async def apersist(self):
+        """Phiên bản async của persist."""
+        await run_blocking(self.persist)
+
+    def _version_path(self, collection_name: str) -> Optional[str]:
+        if not self.persist_directory:
+            return None
+        return os.path.join(self.persist_directory, "collection_versions", collection_name)
+
+    @staticmethod
+    def _read_version(path: str) -> int:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _bump_version(self, collection_name: str):
+        path = self._version_path(collection_name)
+        if path is None:
+            self._versions[collection_name] = self._versions.get(collection_name, 0) + 1
+            return
+        # Hai worker cùng tăng có thể ghi cùng một giá trị, phiên bản vẫn lớn hơn giá trị cũ
+        version = self._read_version(path) + 1
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(str(version))
+        os.replace(tmp_path, path)
+
+    def invalidate(self, collection_name: Optional[str] = None):
+        """
+        Xóa handle khỏi cache để lần truy cập sau mở lại từ disk và tăng phiên bản collection.
+
+        Args:
+            collection_name: Tên collection cần xóa, None để xóa toàn bộ cache
+        """
+        with self._stores_lock:
+            if collection_name is None:
+                self._stores.clear()
+                names = set(self._versions)
+                if self.persist_directory:
+                    root = os.path.join(self.persist_directory, "collection_versions")
+                    if os.path.isdir(root):
+                        names.update(
+                            name for name in os.listdir(root) if not name.endswith(".tmp")
+                        )
+            else:
+                self._stores.pop(collection_name, None)
+                names = {collection_name}
+            for name in names:
+                self._bump_version(name)
+
+    def list_collections(self) -> List[str]:
+        """
+        Liệt kê các collection đang có trong vector store.
+
+        Returns:
+            List[str]: Tên các collection, theo thứ tự chữ cái
+        """
+        if not self.persist_directory:
+            return []
+        if self.store_backend == "numpy":
+            root = os.path.join(self.persist_directory, "numpy")
+            if not os.path.isdir(root):
+                return []
+            return sorted(
+                name for name in os.listdir(root)
+                if os.path.isdir(os.path.join(root, name))
+            )
+
+        import chromadb
+
+        # Cùng settings với client mà langchain Chroma tạo nên dùng chung một client
+        settings = chromadb.config.Settings(is_persistent=True)
+        settings.persist_directory = self.persist_directory
+        with self._open_lock:
+            collections = chromadb.Client(settings).list_collections()
+        # chromadb >= 0.6 trả về tên, bản cũ trả về object Collection
+        return sorted(getattr(collection, "name", collection) for collection in collections)
+
+    async def alist_collections(self) -> List[str]:
+        """Phiên bản async của list_collections, chạy trong thread pool."""
+        return await run_blocking(self.list_collections)
+
+    def collection_version(self, collection_name: str) -> int:
+        """
+        Lấy phiên bản hiện tại của collection.
+
+        Phiên bản tăng mỗi lần collection bị invalidate (vd. sau khi upload),
+        dùng để loại bỏ các cache phụ thuộc vào nội dung collection. Phiên bản
+        được đọc từ disk nên thay đổi do worker khác ghi cũng được thấy ngay.
+
+        Args:
+            collection_name: Tên collection
+
+        Returns:
+            int: Phiên bản của collection
+        """
+        path = self._version_path(collection_name)
+        if path is not None:
+            return self._read_version(path)
+        with self._stores_lock:
+            return self._versions.get(collection_name, 0)
+
     def load_vector_store(
         self,
         collection_name: str = "documents"
@@ -73,44 +594,186 @@ class EmbeddingManager:
         Returns:
             VectorStore: Vector store đã được load
         """
-        if not self.persist_directory:
-            raise ValueError("persist_directory chưa được cấu hình")
+        self.vector_store = self.get_vector_store(collection_name)
+        return self.vector_store
+
+    def get_documents(
+        self,
+        collection_name: str = "documents",
+        source: Optional[str] = None
+    ) -> List[Document]:
+        """
+        Lấy các chunk đã ingest của collection theo thứ tự file, trang và chunk.
+
+        Đọc từ chỉ mục BM25 cục bộ nên không cần truy vấn vector store.
 
-        self.vector_store = Chroma(
-            persist_directory=self.persist_directory,
-            embedding_function=self.embeddings,
-            collection_name=collection_name
+        Args:
+            collection_name: Tên collection
+            source: Chỉ lấy chunk của file này (so theo tên file hoặc đường dẫn)
+
+        Returns:
+            List[Document]: Các chunk của collection
+        """
+        documents = self.get_lexical_index(collection_name).documents()
+        if source:
+            documents = [
+                doc for doc in documents
+                if doc.metadata.get("source") == source
+                or os.path.basename(str(doc.metadata.get("source", ""))) == source
+            ]
+        # Thứ tự slot trong chỉ mục BM25 không phải thứ tự ingest (slot trống được
+        # dùng lại), sắp theo thứ tự chunk trong file được ghi lúc split
+        return sorted(
+            documents,
+            key=lambda doc: (
+                str(doc.metadata.get("source", "")),
+                doc.metadata.get("page", 0),
+                doc.metadata.get("chunk_index", 0)
+            )
         )
-        return self.vector_store
 
     def get_retriever(
         self,
         k: int = 5,
         filter: Optional[Dict[str, Any]] = None,
-        search_type: str = "similarity"
+        search_type: str = "similarity",
+        vector_store: Optional[VectorStore] = None,
+        retrieval_mode: str = "vector",
+        collection_name: Optional[str] = None,
+        fetch_k: int = MMR_FETCH_K,
+        lambda_mult: float = MMR_LAMBDA,
+        score_threshold: Optional[float] = None
     ):
         """
-        Lấy retriever từ vector store.
+        Lấy retriever từ vector store và/hoặc chỉ mục BM25.
 
         Args:
             k: Số lượng kết quả trả về
             filter: Bộ lọc cho kết quả
-            search_type: Loại tìm kiếm ("similarity" hoặc "mmr")
+            search_type: Loại tìm kiếm vector ("similarity" hoặc "mmr")
+            vector_store: Vector store cần dùng, mặc định là self.vector_store
+            retrieval_mode: "vector", "bm25" (chỉ tra chỉ mục, không gọi API
+                embedding) hoặc "hybrid" (gộp BM25 và vector bằng RRF)
+            collection_name: Collection của chỉ mục BM25, mặc định lấy theo
+                vector store
+            fetch_k: Số candidate lấy một lần cho MMR
+            lambda_mult: Hệ số MMR, 1 chỉ xét độ liên quan, 0 chỉ xét độ đa dạng
+            score_threshold: Cosine similarity tối thiểu giữa chunk và câu hỏi
 
         Returns:
-            Retriever từ vector store
+            Retriever theo retrieval_mode
         """
-        if not self.vector_store:
+        if retrieval_mode not in ("vector", "bm25", "hybrid"):
+            raise ValueError(f"retrieval_mode không hợp lệ: {retrieval_mode}")
+
+        vector_store = vector_store or self.vector_store
+        if retrieval_mode != "vector":
+            if collection_name is None and isinstance(vector_store, NumpyVectorStore):
+                collection_name = vector_store.collection_name
+            if collection_name is None:
+                collection = getattr(vector_store, "_collection", None)
+                if collection is None:
+                    raise ValueError("Cần collection_name để dùng chỉ mục BM25")
+                collection_name = collection.name
+            lexical_retriever = LexicalRetriever(
+                index=self.get_lexical_index(collection_name),
+                k=k,
+                filter=filter
+            )
+            if retrieval_mode == "bm25":
+                return lexical_retriever
+
+        if not vector_store:
             raise ValueError("Vector store chưa được khởi tạo")
 
-        return self.vector_store.as_retriever(
-            search_kwargs={
-                "k": k,
-                "filter": filter
-            },
-            search_type=search_type
+        if search_type not in ("similarity", "mmr"):
+            raise ValueError(f"search_type không hợp lệ: {search_type}")
+        if search_type == "mmr" or score_threshold is not None:
+            # Lấy candidate cùng vector của chúng trong một truy vấn rồi chọn bằng
+            # MMR vector hóa; similarity có ngưỡng điểm là MMR với lambda_mult=1
+            vector_retriever = MMRRetriever(
+                vector_store=vector_store,
+                embeddings=self.embeddings,
+                k=k,
+                fetch_k=fetch_k if search_type == "mmr" else k,
+                lambda_mult=lambda_mult if search_type == "mmr" else 1.0,
+                score_threshold=score_threshold,
+                filter=filter
+            )
+        else:
+            vector_retriever = vector_store.as_retriever(
+                search_kwargs={
+                    "k": k,
+                    "filter": filter
+                },
+                search_type=search_type
+            )
+        if retrieval_mode == "vector":
+            return vector_retriever
+        return HybridRetriever(
+            lexical_retriever=lexical_retriever,
+            vector_retriever=vector_retriever,
+            k=k,
+            rrf_k=RRF_K
         )
 
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embed một câu hỏi (qua cache embedding).
+
+        Args:
+            text: Câu hỏi
+
+        Returns:
+            List[float]: Vector của câu hỏi
+        """
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """
+        Phiên bản async của embed_query.
+
+        Args:
+            text: Câu hỏi
+
+        Returns:
+            List[float]: Vector của câu hỏi
+        """
+        return await self.embeddings.aembed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed nhiều câu hỏi; các câu chưa có trong cache được gửi trong một request batch.
+
+        Args:
+            texts: Các câu hỏi
+
+        Returns:
+            List[List[float]]: Vector của từng câu hỏi
+        """
+        return self.embeddings.embed_queries(texts)
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Phiên bản async của embed_queries.
+
+        Args:
+            texts: Các câu hỏi
+
+        Returns:
+            List[List[float]]: Vector của từng câu hỏi
+        """
+        return await self.embeddings.aembed_queries(texts)
+
+    def cache_stats(self) -> Dict[str, float]:
+        """
+        Lấy thống kê hit/miss của cache embedding.
+
+        Returns:
+            Dict[str, float]: Thống kê của cache
+        """
+        return self.embedding_cache.stats()
+
     def persist(self):
         """Lưu vector store xuống disk."""
         if self.vector_store and self.persist_directory:
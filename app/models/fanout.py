@@ -0,0 +1,152 @@
+"""
+Module truy vấn nhiều collection song song và gộp kết quả thành một bảng xếp hạng chung.
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun
+)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from app.config import RRF_K
+from .embedding_backends import aembed_queries, embed_queries
+
+
+def _content_key(doc: Document) -> str:
+    # Cùng một file có thể được ingest vào nhiều collection
+    return " ".join(doc.page_content.split())
+
+
+def merge_rankings(
+    rankings: Dict[str, Sequence[Document]],
+    k: Optional[int] = None,
+    rrf_k: int = RRF_K
+) -> List[Document]:
+    """
+    Gộp kết quả của nhiều collection thành top-k chung và loại chunk trùng nội dung.
+
+    Khi mọi kết quả đều có cosine similarity (cùng model embedding nên cùng
+    thang đo), điểm chung là cosine similarity. Điểm BM25 và RRF phụ thuộc
+    thống kê của từng collection nên không so sánh trực tiếp được; khi đó các
+    collection được gộp bằng reciprocal rank fusion theo thứ hạng trong từng
+    collection, chunk xuất hiện ở nhiều collection được cộng điểm.
+
+    Args:
+        rankings: collection -> kết quả của collection đó, giảm dần theo độ liên quan
+        k: Số document giữ lại, None để giữ tất cả
+        rrf_k: Hằng số làm mượt của RRF
+
+    Returns:
+        List[Document]: Documents giảm dần theo điểm chung, điểm nằm trong
+            metadata["merged_score"] và collection nguồn trong metadata["collection"]
+    """
+    cosine = all(
+        "similarity_score" in doc.metadata
+        for documents in rankings.values()
+        for doc in documents
+    )
+    scores: Dict[str, float] = {}
+    best: Dict[str, Tuple[float, str, Document]] = {}
+    for collection, documents in rankings.items():
+        for rank, doc in enumerate(documents, start=1):
+            key = _content_key(doc)
+            if cosine:
+                score = float(doc.metadata["similarity_score"])
+                scores[key] = max(scores.get(key, score), score)
+            else:
+                score = 1.0 / (rrf_k + rank)
+                scores[key] = scores.get(key, 0.0) + score
+            # Giữ metadata của collection xếp chunk cao nhất
+            if key not in best or score > best[key][0]:
+                best[key] = (score, collection, doc)
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    if k is not None:
+        ranked = ranked[:k]
+    return [
+        Document(
+            page_content=best[key][2].page_content,
+            metadata={**best[key][2].metadata, "collection": best[key][1], "merged_score": score}
+        )
+        for key, score in ranked
+    ]
+
+
+class FanOutRetriever(BaseRetriever):
+    """Chạy retriever của từng collection song song rồi gộp bằng merge_rankings."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    retrievers: Dict[str, BaseRetriever]
+    k: int = 5
+    rrf_k: int = RRF_K
+    # Embed câu hỏi một lần trước khi chạy các retriever để chúng dùng chung
+    # cache embedding thay vì cùng gọi API cho một câu hỏi
+    embeddings: Optional[Embeddings] = None
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if self.embeddings is not None:
+            self.embeddings.embed_query(query)
+        rankings = {
+            collection: retriever.invoke(query)
+            for collection, retriever in self.retrievers.items()
+        }
+        return merge_rankings(rankings, k=self.k, rrf_k=self.rrf_k)
+
+    async def _aget_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if self.embeddings is not None:
+            await self.embeddings.aembed_query(query)
+        results = await asyncio.gather(
+            *(retriever.ainvoke(query) for retriever in self.retrievers.values())
+        )
+        return merge_rankings(dict(zip(self.retrievers, results)), k=self.k, rrf_k=self.rrf_k)
+
+    def batch(self, inputs: List[str], config: Any = None, **kwargs: Any) -> List[List[Document]]:
+        inputs = list(inputs)
+        if self.embeddings is not None:
+            embed_queries(self.embeddings, inputs)
+        rankings = {
+            collection: retriever.batch(inputs)
+            for collection, retriever in self.retrievers.items()
+        }
+        return [
+            merge_rankings(
+                {collection: results[i] for collection, results in rankings.items()},
+                k=self.k,
+                rrf_k=self.rrf_k
+            )
+            for i in range(len(inputs))
+        ]
+
+    async def abatch(self, inputs: List[str], config: Any = None, **kwargs: Any) -> List[List[Document]]:
+        inputs = list(inputs)
+        if self.embeddings is not None:
+            await aembed_queries(self.embeddings, inputs)
+        results = await asyncio.gather(
+            *(retriever.abatch(inputs) for retriever in self.retrievers.values())
+        )
+        rankings = dict(zip(self.retrievers, results))
+        return [
+            merge_rankings(
+                {collection: docs[i] for collection, docs in rankings.items()},
+                k=self.k,
+                rrf_k=self.rrf_k
+            )
+            for i in range(len(inputs))
+        ]
@@ -0,0 +1,131 @@
+"""
+Module retriever kết hợp BM25 và vector search bằng reciprocal rank fusion.
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from .concurrency import run_blocking
+from .lexical_index import BM25Index, document_key
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Document]],
+    k: int = 60,
+    top_k: Optional[int] = None
+) -> List[Document]:
+    """
+    Gộp nhiều danh sách kết quả đã xếp hạng bằng reciprocal rank fusion.
+
+    Điểm của một chunk là tổng 1 / (k + hạng) qua các danh sách có chứa nó, nên
+    không cần chuẩn hóa điểm BM25 và khoảng cách vector về cùng thang đo.
+
+    Args:
+        rankings: Các danh sách document, mỗi danh sách giảm dần theo độ liên quan
+        k: Hằng số làm mượt của RRF
+        top_k: Số document giữ lại, None để giữ tất cả
+
+    Returns:
+        List[Document]: Documents đã gộp, điểm nằm trong metadata["fusion_score"]
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = document_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(key, doc)
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    if top_k is not None:
+        ranked = ranked[:top_k]
+    return [
+        Document(
+            page_content=documents[key].page_content,
+            metadata={**documents[key].metadata, "fusion_score": score}
+        )
+        for key, score in ranked
+    ]
+
+
+class LexicalRetriever(BaseRetriever):
+    """Retriever chỉ dùng BM25, không cần gọi API embedding."""
+
+    index: BM25Index
+    k: int = 5
+    filter: Optional[Dict[str, Any]] = None
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return [
+            Document(
+                page_content=doc.page_content,
+                metadata={**doc.metadata, "bm25_score": score}
+            )
+            for doc, score in self.index.search(query, k=self.k, filter=self.filter)
+        ]
+
+
+class HybridRetriever(BaseRetriever):
+    """Chạy BM25 và vector retriever song song rồi gộp kết quả bằng RRF."""
+
+    lexical_retriever: LexicalRetriever
+    vector_retriever: BaseRetriever
+    k: int = 5
+    rrf_k: int = 60
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        lexical = self.lexical_retriever.invoke(query)
+        vector = self.vector_retriever.invoke(query)
+        return reciprocal_rank_fusion([lexical, vector], k=self.rrf_k, top_k=self.k)
+
+    async def _aget_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        # Tra cứu BM25 chạy trong thread pool trong lúc chờ embedding câu hỏi
+        lexical, vector = await asyncio.gather(
+            run_blocking(self.lexical_retriever.invoke, query),
+            self.vector_retriever.ainvoke(query)
+        )
+        return reciprocal_rank_fusion([lexical, vector], k=self.rrf_k, top_k=self.k)
+
+    def batch(self, inputs: List[str], config: Any = None, **kwargs: Any) -> List[List[Document]]:
+        lexical = [self.lexical_retriever.invoke(query) for query in inputs]
+        vector = self.vector_retriever.batch(list(inputs))
+        return [
+            reciprocal_rank_fusion([lexical_docs, vector_docs], k=self.rrf_k, top_k=self.k)
+            for lexical_docs, vector_docs in zip(lexical, vector)
+        ]
+
+    async def abatch(self, inputs: List[str], config: Any = None, **kwargs: Any) -> List[List[Document]]:
+        # Vector retriever tìm cả batch trong một truy vấn (xem MMRRetriever.abatch)
+        lexical, vector = await asyncio.gather(
+            run_blocking(lambda: [self.lexical_retriever.invoke(query) for query in inputs]),
+            self.vector_retriever.abatch(list(inputs))
+        )
+        return [
+            reciprocal_rank_fusion([lexical_docs, vector_docs], k=self.rrf_k, top_k=self.k)
+            for lexical_docs, vector_docs in zip(lexical, vector)
+        ]
@@ -0,0 +1,216 @@
+"""
+Module ingestion: embed documents theo batch song song và ghi dần vào vector store.
+"""
+
+import random
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from .metrics import INGESTED_CHUNKS, span
+
+Batch = List[Tuple[Document, str]]
+IdFunction = Callable[[int, Document], str]
+# Callback nhận (ids, texts, metadatas) của mỗi batch vừa được ghi
+WriteCallback = Callable[[List[str], List[str], List[dict]], None]
+
+_RATE_LIMIT_MARKERS = (
+    "429",
+    "resource has been exhausted",
+    "resourceexhausted",
+    "rate limit",
+    "quota",
+    "too many requests",
+    "503",
+    "unavailable",
+)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """
+    Kiểm tra lỗi có phải do giới hạn tốc độ/quota của API hay không.
+
+    Args:
+        error: Exception cần kiểm tra
+
+    Returns:
+        bool: True nếu nên thử lại sau một khoảng chờ
+    """
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in _RATE_LIMIT_MARKERS)
+
+
+def write_embeddings(
+    store: VectorStore,
+    texts: List[str],
+    embeddings: List[List[float]],
+    metadatas: List[dict],
+    ids: List[str]
+):
+    """
+    Ghi các vector đã tính sẵn vào vector store.
+
+    Args:
+        store: Vector store đích
+        texts: Nội dung các chunk
+        embeddings: Vector của từng chunk
+        metadatas: Metadata của từng chunk
+        ids: ID của từng chunk, trùng ID sẽ ghi đè
+    """
+    collection = getattr(store, "_collection", None)
+    if collection is not None:
+        # Chroma: upsert trực tiếp để không embed lại
+        collection.upsert(
+            ids=ids,
+            embeddings=embeddings,
+            documents=texts,
+            metadatas=[metadata or None for metadata in metadatas]
+        )
+    elif hasattr(store, "add_embeddings"):
+        store.add_embeddings(
+            text_embeddings=list(zip(texts, embeddings)),
+            metadatas=metadatas,
+            ids=ids
+        )
+    else:
+        # Vector store không nhận vector có sẵn, embedding sẽ lấy lại từ cache
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+
+
+class IngestionEngine:
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = 64,
+        max_concurrency: int = 4,
+        max_retries: int = 5,
+        initial_backoff: float = 1.0,
+        max_backoff: float = 30.0
+    ):
+        """
+        Khởi tạo IngestionEngine.
+
+        Args:
+            embeddings: Model embedding dùng để embed các chunk
+            batch_size: Số chunk trong một request embedding
+            max_concurrency: Số request embedding chạy đồng thời tối đa
+            max_retries: Số lần thử lại khi gặp lỗi giới hạn tốc độ
+            initial_backoff: Thời gian chờ (giây) trước lần thử lại đầu tiên
+            max_backoff: Thời gian chờ tối đa giữa hai lần thử
+        """
+        self.embeddings = embeddings
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(0, max_retries)
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+    def _batches(
+        self,
+        documents: Iterable[Document],
+        ids: Optional[Union[Iterable[str], IdFunction]]
+    ) -> Iterator[Batch]:
+        if ids is None:
+            pairs = ((doc, str(uuid.uuid4())) for doc in documents)
+        elif callable(ids):
+            pairs = ((doc, ids(index, doc)) for index, doc in enumerate(documents))
+        else:
+            pairs = zip(documents, ids)
+        while True:
+            batch = list(islice(pairs, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def _embed_with_retry(self, texts: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            try:
+                return self.embeddings.embed_documents(texts)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_rate_limit_error(e):
+                    raise
+                delay = min(self.max_backoff, self.initial_backoff * (2 ** attempt))
+                # Thêm jitter để các batch song song không thử lại cùng lúc
+                time.sleep(delay * (0.5 + random.random() / 2))
+                attempt += 1
+
+    def _embed_batch(self, batch: Batch) -> Tuple[Batch, List[List[float]]]:
+        texts = [doc.page_content for doc, _ in batch]
+        with span("ingest", "embed_batch"):
+            return batch, self._embed_with_retry(texts)
+
+    def ingest(
+        self,
+        store: VectorStore,
+        documents: Iterable[Document],
+        ids: Optional[Union[Iterable[str], IdFunction]] = None,
+        on_batch: Optional[Callable[[int], None]] = None,
+        on_write: Optional[WriteCallback] = None
+    ) -> int:
+        """
+        Embed documents theo batch và ghi vào store ngay khi mỗi batch xong.
+
+        Chỉ tối đa max_concurrency batch được giữ trong bộ nhớ cùng lúc nên
+        documents có thể là một iterator dài tùy ý.
+
+        Args:
+            store: Vector store đích
+            documents: Các chunk cần ghi
+            ids: ID tương ứng với từng chunk, hoặc hàm (thứ tự, chunk) -> ID
+                khi documents là stream; mặc định sinh uuid4
+            on_batch: Callback nhận số chunk vừa được ghi
+            on_write: Callback nhận ids, nội dung và metadata của batch vừa
+                được ghi (vd. để cập nhật chỉ mục BM25)
+
+        Returns:
+            int: Tổng số chunk đã ghi
+        """
+        total = 0
+
+        def write(future: Future):
+            nonlocal total
+            batch, vectors = future.result()
+            texts = [doc.page_content for doc, _ in batch]
+            metadatas = [doc.metadata for doc, _ in batch]
+            batch_ids = [doc_id for _, doc_id in batch]
+            with span("ingest", "write_batch"):
+                write_embeddings(
+                    store,
+                    texts=texts,
+                    embeddings=vectors,
+                    metadatas=metadatas,
+                    ids=batch_ids
+                )
+            if on_write:
+                with span("ingest", "index_batch"):
+                    on_write(batch_ids, texts, metadatas)
+            INGESTED_CHUNKS.inc(len(batch))
+            total += len(batch)
+            if on_batch:
+                on_batch(len(batch))
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            pending: Set[Future] = set()
+            try:
+                for batch in self._batches(documents, ids):
+                    if len(pending) >= self.max_concurrency:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            write(future)
+                    pending.add(pool.submit(self._embed_batch, batch))
+
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        write(future)
+            finally:
+                for future in pending:
+                    future.cancel()
+        return total
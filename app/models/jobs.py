@@ -0,0 +1,298 @@
+"""
+Module quản lý job ingestion chạy nền cho các file upload.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.config import INGEST_JOB_WORKERS
+from .document import DocumentProcessor
+from .embeddings import EmbeddingManager
+from .metrics import observe, timed_iter
+
+# Các stage của job theo thứ tự
+STAGES = ("saved", "pages_loaded", "chunks_embedded", "indexed")
+
+_COLUMNS = (
+    "job_id", "filename", "file_path", "collection", "status", "stage",
+    "pages_loaded", "chunks_embedded", "error",
+    "created_at", "updated_at"
+)
+
+
+class IngestionJobManager:
+    """
+    Hàng đợi job ingestion với worker pool giới hạn và bảng job trong SQLite.
+
+    Các stage của job theo thứ tự: saved -> pages_loaded -> chunks_embedded -> indexed.
+
+    Bảng ingested_files lưu chunk ID của phiên bản đã ingest của mỗi file trong
+    mỗi collection, để upload lại file đã thay đổi xóa được các chunk cũ.
+    """
+
+    def __init__(
+        self,
+        document_processor: DocumentProcessor,
+        embedding_manager: EmbeddingManager,
+        db_path: str,
+        max_workers: int = INGEST_JOB_WORKERS
+    ):
+        """
+        Khởi tạo IngestionJobManager.
+
+        Args:
+            document_processor: Processor dùng để đọc và split file
+            embedding_manager: Manager dùng để embed và ghi vector
+            db_path: File SQLite lưu bảng job
+            max_workers: Số job được xử lý song song tối đa
+        """
+        self.document_processor = document_processor
+        self.embedding_manager = embedding_manager
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                job_id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                collection TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                pages_loaded INTEGER NOT NULL DEFAULT 0,
+                chunks_total INTEGER NOT NULL DEFAULT 0,
+                chunks_embedded INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS ingested_files (
+                collection TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                chunk_ids TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (collection, filename)
+            )"""
+        )
+        self._conn.commit()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="rag-ingest"
+                )
+            return self._executor
+
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = datetime.now().isoformat()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE ingestion_jobs SET {assignments} WHERE job_id = ?",
+                [*fields.values(), job_id]
+            )
+            self._conn.commit()
+
+    def _previous_chunk_ids(self, collection: str, filename: str, file_path: str) -> List[str]:
+        """
+        Lấy chunk ID của phiên bản trước của file trong collection.
+
+        File được ingest trước khi có bảng ingested_files được tìm theo
+        metadata "source" trong chỉ mục BM25.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT chunk_ids FROM ingested_files WHERE collection = ? AND filename = ?",
+                (collection, filename)
+            ).fetchone()
+        if row is not None:
+            return json.loads(row["chunk_ids"])
+        index = self.embedding_manager.get_lexical_index(collection)
+        return index.find_ids({"source": file_path})
+
+    def _save_chunk_ids(self, collection: str, filename: str, chunk_ids: List[str]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ingested_files (collection, filename, chunk_ids, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (collection, filename, json.dumps(chunk_ids), datetime.now().isoformat())
+            )
+            self._conn.commit()
+
+    def create_job(self, filename: str, file_path: str, collection: str) -> str:
+        """
+        Tạo job cho một file đã được lưu xuống disk.
+
+        Args:
+            filename: Tên file upload
+            file_path: Đường dẫn file đã lưu
+            collection: Collection đích
+
+        Returns:
+            str: ID của job
+        """
+        job_id = str(uuid.uuid4())
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO ingestion_jobs (job_id, filename, file_path, collection, "
+                "status, stage, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, filename, file_path, collection, "queued", "saved", now, now)
+            )
+            self._conn.commit()
+        return job_id
+
+    def submit(self, job_id: str):
+        """
+        Đưa job vào worker pool.
+
+        Args:
+            job_id: ID của job
+        """
+        self._get_executor().submit(self._run, job_id)
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """
+        Lấy trạng thái của job.
+
+        Args:
+            job_id: ID của job
+
+        Returns:
+            Optional[Dict]: Thông tin job, None nếu không tồn tại
+        """
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM ingestion_jobs WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def resume_pending(self) -> List[str]:
+        """
+        Đưa lại vào hàng đợi các job chưa xong (vd. do server restart).
+
+        Chunk ID được sinh ổn định nên chạy lại một job là idempotent.
+
+        Returns:
+            List[str]: ID của các job được chạy lại
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id FROM ingestion_jobs WHERE status IN ('queued', 'running') "
+                "ORDER BY created_at"
+            ).fetchall()
+        job_ids = [row["job_id"] for row in rows]
+        for job_id in job_ids:
+            self.submit(job_id)
+        return job_ids
+
+    def _run(self, job_id: str):
+        job = self.get_job(job_id)
+        if job is None:
+            return
+
+        start = time.perf_counter()
+        try:
+            if not Path(job["file_path"]).exists():
+                raise FileNotFoundError(f"Không tìm thấy file {job['file_path']}")
+
+            self._update(
+                job_id,
+                status="running",
+                stage="saved",
+                pages_loaded=0,
+                chunks_embedded=0,
+                error=None
+            )
+
+            progress = {"stage": "saved", "pages_loaded": 0, "chunks_embedded": 0}
+
+            def advance(stage: str, counter: str, count: int):
+                progress[counter] += count
+                # Stage chỉ tiến lên, không lùi lại khi đọc trang và embed xen kẽ nhau
+                if STAGES.index(stage) > STAGES.index(progress["stage"]):
+                    progress["stage"] = stage
+                self._update(job_id, **progress)
+
+            # Đọc, split và embed dạng stream, các trang được đọc song song
+            chunks = timed_iter(
+                self.document_processor.iter_document(
+                    job["file_path"],
+                    parallel=True,
+                    on_pages=lambda count: advance("pages_loaded", "pages_loaded", count)
+                ),
+                "ingest",
+                "parse"
+            )
+            previous_ids = self._previous_chunk_ids(
+                job["collection"], job["filename"], job["file_path"]
+            )
+            ids: List[str] = []
+
+            def chunk_id(index, doc):
+                ids.append(self.document_processor.make_chunk_id(
+                    job["filename"], index, doc.page_content
+                ))
+                return ids[-1]
+
+            self.embedding_manager.add_documents(
+                chunks,
+                collection_name=job["collection"],
+                ids=chunk_id,
+                on_batch=lambda count: advance("chunks_embedded", "chunks_embedded", count),
+                save_index=False
+            )
+            # Xóa các chunk của phiên bản cũ không còn trong phiên bản mới của file
+            # (ghi phiên bản mới trước để truy vấn không thấy collection trống)
+            new_ids = set(ids)
+            self.embedding_manager.delete_documents(
+                [chunk for chunk in previous_ids if chunk not in new_ids],
+                collection_name=job["collection"],
+                save_index=False
+            )
+            # Chỉ mục BM25 được ghi xuống disk một lần cho cả job
+            self.embedding_manager.save_lexical_index(job["collection"])
+            self._save_chunk_ids(job["collection"], job["filename"], ids)
+            # Collection đã thay đổi, các lần truy vấn sau mở lại handle mới
+            self.embedding_manager.invalidate(job["collection"])
+
+            self._update(job_id, status="completed", stage="indexed")
+            observe("ingest", "job", time.perf_counter() - start)
+        except Exception as e:
+            try:
+                # Giữ chỉ mục BM25 khớp với các chunk đã kịp ghi vào vector store
+                self.embedding_manager.save_lexical_index(job["collection"])
+            except Exception:
+                pass
+            self._update(job_id, status="failed", error=str(e))
+            observe("ingest", "job_failed", time.perf_counter() - start)
+
+    def shutdown(self, wait: bool = True):
+        """
+        Dừng worker pool.
+
+        Args:
+            wait: Chờ các job đang chạy hoàn thành
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
@@ -0,0 +1,363 @@
+"""
+Module chỉ mục từ vựng (inverted index) với điểm BM25 cho từng collection.
+"""
+
+import gzip
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+# Số (kể cả số thập phân như 25.5 hoặc 25,5) được giữ nguyên một token
+_TOKEN_PATTERN = re.compile(r"\d+(?:[.,]\d+)*|\w+")
+
+
+def _strip_accents(token: str) -> str:
+    decomposed = unicodedata.normalize("NFD", token.replace("đ", "d"))
+    return "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tách văn bản tiếng Việt thành các term để đánh chỉ mục.
+
+    Tiếng Việt viết mỗi âm tiết cách nhau nên một từ ghép (vd. "học phí") gồm
+    nhiều token. Ngoài từng âm tiết, hàm sinh thêm cặp âm tiết liền kề
+    ("học_phí") để ưu tiên cụm từ đúng thứ tự, và dạng không dấu của cả hai
+    ("hoc", "hoc_phi") để câu hỏi gõ không dấu vẫn khớp.
+
+    Args:
+        text: Văn bản cần tách
+
+    Returns:
+        List[str]: Danh sách term
+    """
+    syllables = _TOKEN_PATTERN.findall(unicodedata.normalize("NFC", text.lower()))
+    folded = [_strip_accents(syllable) for syllable in syllables]
+    terms = list(syllables)
+    terms.extend(f for s, f in zip(syllables, folded) if f != s)
+    for i in range(len(syllables) - 1):
+        bigram = f"{syllables[i]}_{syllables[i + 1]}"
+        folded_bigram = f"{folded[i]}_{folded[i + 1]}"
+        terms.append(bigram)
+        if folded_bigram != bigram:
+            terms.append(folded_bigram)
+    return terms
+
+
+def document_key(doc: Document) -> str:
+    """
+    Khóa nhận diện một chunk độc lập với nguồn trả về (vector store hay BM25).
+
+    Args:
+        doc: Document cần lấy khóa
+
+    Returns:
+        str: Khóa của chunk
+    """
+    return f"{doc.metadata.get('source', '')}\x00{doc.metadata.get('page', '')}\x00{doc.page_content}"
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+class BM25Index:
+    """
+    Inverted index trong bộ nhớ, lưu xuống disk dạng JSON nén gzip.
+
+    Mỗi chunk được gán một số thứ tự nội bộ; posting list của term là danh
+    sách phẳng [doc, tf, doc, tf, ...] để file trên disk nhỏ gọn.
+
+    Chỉ mục nhớ chữ ký (mtime, kích thước, inode) của file đã load/lưu; khi
+    process khác (worker uvicorn khác, job ingestion) ghi lại file, refresh()
+    load lại để kết quả BM25 khớp với vector store.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        k1: float = 1.5,
+        b: float = 0.75
+    ):
+        """
+        Khởi tạo BM25Index.
+
+        Args:
+            path: File lưu chỉ mục, None để chỉ giữ trong bộ nhớ
+            k1: Tham số bão hòa tần suất term của BM25
+            b: Tham số chuẩn hóa theo độ dài chunk của BM25
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._reset()
+        self._dirty = False
+        self._signature: Optional[Tuple[int, int, int]] = None
+
+    def _reset(self):
+        self._ids: List[Optional[str]] = []
+        self._texts: List[Optional[str]] = []
+        self._metadatas: List[Optional[Dict[str, Any]]] = []
+        self._lengths: List[int] = []
+        self._slots: Dict[str, int] = {}
+        # Heap các slot trống, dùng lại theo thứ tự tăng dần để giữ thứ tự ingest
+        self._free: List[int] = []
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    @property
+    def dirty(self) -> bool:
+        """Chỉ mục có thay đổi chưa được lưu xuống disk."""
+        return self._dirty
+
+    def _remove_slot(self, slot: int):
+        for term in set(tokenize(self._texts[slot])):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(slot, None)
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths[slot]
+        self._ids[slot] = self._texts[slot] = self._metadatas[slot] = None
+        self._lengths[slot] = 0
+        heapq.heappush(self._free, slot)
+
+    def add(
+        self,
+        ids: Sequence[str],
+        texts: Sequence[str],
+        metadatas: Optional[Sequence[Optional[Dict[str, Any]]]] = None
+    ):
+        """
+        Thêm (hoặc ghi đè theo ID) các chunk vào chỉ mục.
+
+        Args:
+            ids: ID của từng chunk
+            texts: Nội dung từng chunk
+            metadatas: Metadata của từng chunk
+        """
+        metadatas = metadatas or [None] * len(ids)
+        with self._lock:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                if doc_id in self._slots:
+                    self._remove_slot(self._slots.pop(doc_id))
+                terms = tokenize(text)
+                if self._free:
+                    slot = heapq.heappop(self._free)
+                else:
+                    slot = len(self._ids)
+                    self._ids.append(None)
+                    self._texts.append(None)
+                    self._metadatas.append(None)
+                    self._lengths.append(0)
+                self._ids[slot] = doc_id
+                self._texts[slot] = text
+                self._metadatas[slot] = metadata or {}
+                self._lengths[slot] = len(terms)
+                self._slots[doc_id] = slot
+                self._total_length += len(terms)
+                for term, count in Counter(terms).items():
+                    self._postings.setdefault(term, {})[slot] = count
+            self._dirty = True
+
+    def delete(self, ids: Sequence[str]):
+        """
+        Xóa các chunk khỏi chỉ mục.
+
+        Args:
+            ids: ID của các chunk cần xóa
+        """
+        with self._lock:
+            for doc_id in ids:
+                slot = self._slots.pop(doc_id, None)
+                if slot is not None:
+                    self._remove_slot(slot)
+                    self._dirty = True
+
+    def clear(self):
+        """Xóa toàn bộ chỉ mục."""
+        with self._lock:
+            self._reset()
+            self._dirty = True
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Document, float]]:
+        """
+        Tìm các chunk có điểm BM25 cao nhất với câu hỏi.
+
+        Args:
+            query: Câu hỏi
+            k: Số kết quả trả về
+            filter: Chỉ giữ chunk có metadata bằng đúng các giá trị này
+
+        Returns:
+            List[Tuple[Document, float]]: Các chunk kèm điểm BM25, giảm dần theo điểm
+        """
+        with self._lock:
+            count = len(self._slots)
+            if not count:
+                return []
+            average_length = self._total_length / count
+            scores: Dict[int, float] = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for slot, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[slot] / average_length)
+                    scores[slot] = scores.get(slot, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            results = []
+            for slot, score in ranked:
+                metadata = self._metadatas[slot]
+                if filter and any(metadata.get(key) != value for key, value in filter.items()):
+                    continue
+                results.append((
+                    Document(page_content=self._texts[slot], metadata=dict(metadata)),
+                    score
+                ))
+                if len(results) >= k:
+                    break
+            return results
+
+    def find_ids(self, filter: Dict[str, Any]) -> List[str]:
+        """
+        Lấy ID của các chunk có metadata bằng đúng các giá trị trong filter.
+
+        Args:
+            filter: Các cặp khóa/giá trị metadata
+
+        Returns:
+            List[str]: ID của các chunk khớp
+        """
+        with self._lock:
+            return [
+                doc_id for doc_id, slot in self._slots.items()
+                if all(self._metadatas[slot].get(key) == value for key, value in filter.items())
+            ]
+
+    def documents(self) -> List[Document]:
+        """
+        Lấy tất cả chunk trong chỉ mục theo thứ tự được thêm vào.
+
+        Returns:
+            List[Document]: Các chunk
+        """
+        with self._lock:
+            return [
+                Document(page_content=self._texts[slot], metadata=dict(self._metadatas[slot]))
+                for slot in sorted(self._slots.values())
+            ]
+
+    def save(self):
+        """Ghi chỉ mục xuống disk (ghi file tạm rồi đổi tên)."""
+        if not self.path:
+            return
+        with self._lock:
+            slots = sorted(self._slots.values())
+            # Đánh số lại các slot liên tục để bỏ chỗ trống của chunk đã xóa
+            renumber = {slot: index for index, slot in enumerate(slots)}
+            payload = {
+                "k1": self.k1,
+                "b": self.b,
+                "ids": [self._ids[slot] for slot in slots],
+                "texts": [self._texts[slot] for slot in slots],
+                "metadatas": [self._metadatas[slot] for slot in slots],
+                "lengths": [self._lengths[slot] for slot in slots],
+                "postings": {
+                    term: [value for slot, tf in postings.items() for value in (renumber[slot], tf)]
+                    for term, postings in self._postings.items()
+                }
+            }
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            self._signature = _file_signature(self.path)
+
+    def _read(self, path: str):
+        with open(path, "rb") as raw:
+            # Chữ ký lấy từ file đang mở nên khớp với nội dung được đọc
+            stat = os.fstat(raw.fileno())
+            with gzip.open(raw, "rt", encoding="utf-8") as f:
+                payload = json.load(f)
+        self._reset()
+        self.k1 = payload["k1"]
+        self.b = payload["b"]
+        self._ids = payload["ids"]
+        self._texts = payload["texts"]
+        self._metadatas = payload["metadatas"]
+        self._lengths = payload["lengths"]
+        self._slots = {doc_id: slot for slot, doc_id in enumerate(self._ids)}
+        self._total_length = sum(self._lengths)
+        self._postings = {
+            term: dict(zip(flat[::2], flat[1::2]))
+            for term, flat in payload["postings"].items()
+        }
+        self._dirty = False
+        self._signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def refresh(self) -> bool:
+        """
+        Load lại chỉ mục nếu file trên disk đã được process khác ghi lại.
+
+        Không load lại khi chỉ mục đang có thay đổi chưa lưu (đang ingest).
+
+        Returns:
+            bool: True nếu chỉ mục đã được load lại
+        """
+        if not self.path:
+            return False
+        signature = _file_signature(self.path)
+        if signature == self._signature:
+            return False
+        with self._lock:
+            if self._dirty:
+                return False
+            if signature is None:
+                # File đã bị xóa (collection được reset)
+                self._reset()
+                self._signature = None
+                return True
+            self._read(self.path)
+            return True
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """
+        Đọc chỉ mục từ disk.
+
+        Args:
+            path: File chỉ mục
+
+        Returns:
+            BM25Index: Chỉ mục đã load
+        """
+        index = cls(path)
+        index._read(path)
+        return index
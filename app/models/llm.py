@@ -2,13 +2,35 @@
 Module xử lý LLM và reranking.
 """
 
-from typing import List, Optional, Dict, Any
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.retrievers import ContextualCompressionRetriever
-from langchain.retrievers.document_compressors import LLMChainExtractor
+import asyncio
+import random
+import threading
+from typing import TYPE_CHECKING, List, Optional, Dict, Any, AsyncIterator, Sequence, Tuple, Union
 from langchain_core.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from app.config import GOOGLE_API_KEY
+from langchain_core.documents import Document
+from langchain_core.documents.compressor import BaseDocumentCompressor
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import Runnable
+from app.config import (
+    GOOGLE_API_KEY,
+    RERANK_MODE,
+    RERANK_MODEL,
+    RERANK_TOP_N,
+    RERANK_SCORE_THRESHOLD,
+    BATCH_MAX_CONCURRENCY,
+    INGEST_MAX_RETRIES,
+    PROMPT_REGISTRY_SIZE
+)
+from .ingestion import is_rate_limit_error
+from .reranker import CrossEncoderReranker, load_cross_encoder
+from .metrics import record_llm_tokens
+from .response_cache import LLMResponseCache
+from .concurrency import run_blocking
+from .prompt_registry import PromptRegistry, params_key, template_hash
+
+if TYPE_CHECKING:
+    from langchain.chains import LLMChain
+    from langchain.retrievers import ContextualCompressionRetriever
 
 
 class LLMManager:
@@ -17,7 +39,13 @@ class LLMManager:
         api_key: str = GOOGLE_API_KEY,
         model_name: str = "gemini-2.0-flash-001",
         temperature: float = 0.7,
-        max_output_tokens: int = 2048
+        max_output_tokens: int = 2048,
+        rerank_mode: str = RERANK_MODE,
+        rerank_model: str = RERANK_MODEL,
+        rerank_top_n: int = RERANK_TOP_N,
+        rerank_score_threshold: Optional[float] = RERANK_SCORE_THRESHOLD,
+        response_cache: Optional[LLMResponseCache] = None,
+        prompt_registry_size: int = PROMPT_REGISTRY_SIZE
     ):
         """
         Khởi tạo LLMManager.
@@ -27,13 +55,29 @@ class LLMManager:
             model_name: Tên model LLM
             temperature: Nhiệt độ cho model
             max_output_tokens: Số token tối đa cho output
+            rerank_mode: Chế độ rerank mặc định ("cross_encoder" hoặc "llm")
+            rerank_model: Tên model cross-encoder
+            rerank_top_n: Số document giữ lại sau rerank
+            rerank_score_threshold: Điểm tối thiểu của cross-encoder
+            response_cache: Cache câu trả lời theo prompt đã render, None để tắt
+            prompt_registry_size: Số prompt/chain/compressor đã dựng được giữ lại
         """
-        self.llm = ChatGoogleGenerativeAI(
-            model=model_name,
-            google_api_key=api_key,
-            temperature=temperature,
-            max_output_tokens=max_output_tokens
-        )
+        self.rerank_mode = rerank_mode
+        self.rerank_model = rerank_model
+        self.rerank_top_n = rerank_top_n
+        self.rerank_score_threshold = rerank_score_threshold
+        self.response_cache = response_cache
+        # Prompt tùy chỉnh, chain và compressor được dựng một lần rồi dùng lại
+        self.compiled = PromptRegistry(prompt_registry_size)
+        # Client Gemini được tạo ở lần dùng đầu tiên (xem thuộc tính llm)
+        self._llm_kwargs = {
+            "model": model_name,
+            "google_api_key": api_key,
+            "temperature": temperature,
+            "max_output_tokens": max_output_tokens
+        }
+        self._llm = None
+        self._llm_lock = threading.Lock()
         self.default_prompt = PromptTemplate(
             input_variables=["context", "question"],
             template="""Dựa trên thông tin sau, hãy trả lời câu hỏi:
@@ -45,40 +89,245 @@ class LLMManager:
             
             Câu trả lời:"""
         )
+        self.condense_prompt = PromptTemplate(
+            input_variables=["history", "question"],
+            template="""Dựa trên lịch sử hội thoại, hãy viết lại câu hỏi tiếp theo thành một câu hỏi độc lập, đầy đủ ý để tìm kiếm tài liệu. Chỉ trả về câu hỏi đã viết lại.
+
+            Lịch sử hội thoại:
+            {history}
+
+            Câu hỏi tiếp theo: {question}
+
+            Câu hỏi độc lập:"""
+        )
+        self.summary_prompt = PromptTemplate(
+            input_variables=["text", "max_length"],
+            template="""Hãy tóm tắt đoạn văn bản sau trong khoảng {max_length} từ:
+            
+            {text}
+            
+            Tóm tắt:"""
+        )
+        self.combine_summaries_prompt = PromptTemplate(
+            input_variables=["summaries", "max_length"],
+            template="""Dưới đây là tóm tắt của các phần liên tiếp trong một tài liệu. Hãy tổng hợp chúng thành một bản tóm tắt mạch lạc trong khoảng {max_length} từ:
+
+            {summaries}
+
+            Tóm tắt:"""
+        )
+
+    @property
+    def llm(self):
+        """Chat model Gemini, tạo ở lần dùng đầu tiên vì import langchain_google_genai khá chậm."""
+        if self._llm is None:
+            with self._llm_lock:
+                if self._llm is None:
+                    from langchain_google_genai import ChatGoogleGenerativeAI
+
+                    self._llm = ChatGoogleGenerativeAI(**self._llm_kwargs)
+        return self._llm
+
+    @llm.setter
+    def llm(self, llm):
+        self._llm = llm
+        # Các chain đã dựng đang tham chiếu LLM cũ
+        self.compiled.clear()
+
+    def load(self):
+        """Tạo client LLM và load cross-encoder (mode "cross_encoder") ngay thay vì ở request đầu."""
+        self.llm  # Tạo client
+        if self.rerank_mode == "cross_encoder":
+            load_cross_encoder(self.rerank_model)
 
     def setup_reranker(
         self,
         base_retriever,
-        compression_prompt: Optional[str] = None
-    ) -> ContextualCompressionRetriever:
+        compression_prompt: Optional[str] = None,
+        mode: Optional[str] = None,
+        top_n: Optional[int] = None,
+        score_threshold: Optional[float] = None
+    ) -> "ContextualCompressionRetriever":
         """
         Thiết lập reranker.
 
         Args:
             base_retriever: Retriever cơ sở
-            compression_prompt: Prompt tùy chỉnh cho compression
+            compression_prompt: Prompt tùy chỉnh cho compression (chỉ dùng ở mode "llm")
+            mode: "cross_encoder" để rerank cục bộ trong một lần forward,
+                "llm" để dùng LLMChainExtractor (mỗi chunk một lần gọi LLM)
+            top_n: Số document giữ lại sau rerank (mode "cross_encoder")
+            score_threshold: Điểm tối thiểu để giữ document (mode "cross_encoder")
 
         Returns:
             ContextualCompressionRetriever: Retriever đã được rerank
         """
-        if compression_prompt:
-            compressor = LLMChainExtractor.from_llm(
-                self.llm,
-                prompt=compression_prompt
-            )
-        else:
-            compressor = LLMChainExtractor.from_llm(self.llm)
+        from langchain.retrievers import ContextualCompressionRetriever
 
         return ContextualCompressionRetriever(
-            base_compressor=compressor,
+            base_compressor=self.get_compressor(
+                compression_prompt=compression_prompt,
+                mode=mode,
+                top_n=top_n,
+                score_threshold=score_threshold
+            ),
             base_retriever=base_retriever
         )
 
+    def get_compressor(
+        self,
+        compression_prompt: Optional[str] = None,
+        mode: Optional[str] = None,
+        top_n: Optional[int] = None,
+        score_threshold: Optional[float] = None
+    ) -> BaseDocumentCompressor:
+        """
+        Lấy compressor dùng để rerank, dựng một lần cho mỗi cấu hình.
+
+        Args:
+            compression_prompt: Prompt tùy chỉnh cho compression (chỉ dùng ở mode "llm"),
+                có các biến {question} và {context}
+            mode: "cross_encoder" hoặc "llm"
+            top_n: Số document giữ lại sau rerank (mode "cross_encoder")
+            score_threshold: Điểm tối thiểu để giữ document (mode "cross_encoder")
+
+        Returns:
+            BaseDocumentCompressor: Compressor dùng chung giữa các request
+        """
+        mode = mode or self.rerank_mode
+        if mode == "cross_encoder":
+            top_n = top_n or self.rerank_top_n
+            if score_threshold is None:
+                score_threshold = self.rerank_score_threshold
+            return self.compiled.get_or_create(
+                ("cross_encoder", self.rerank_model, top_n, score_threshold),
+                lambda: CrossEncoderReranker(
+                    model_name=self.rerank_model,
+                    top_n=top_n,
+                    score_threshold=score_threshold
+                )
+            )
+        if mode == "llm":
+            from langchain.retrievers.document_compressors import LLMChainExtractor
+
+            def create() -> BaseDocumentCompressor:
+                if compression_prompt:
+                    return LLMChainExtractor.from_llm(
+                        self.llm,
+                        prompt=PromptTemplate.from_template(compression_prompt)
+                    )
+                return LLMChainExtractor.from_llm(self.llm)
+
+            return self.compiled.get_or_create(
+                ("llm_extractor", template_hash(compression_prompt)),
+                create
+            )
+        raise ValueError(f"Rerank mode không hợp lệ: {mode}")
+
+    def _response_prompt(self, custom_prompt: Optional[str] = None) -> PromptTemplate:
+        """Lấy prompt trả lời câu hỏi: prompt tùy chỉnh (đã parse sẵn) hoặc prompt mặc định."""
+        if not custom_prompt:
+            return self.default_prompt
+        return self.compiled.get_or_create(
+            ("prompt", template_hash(custom_prompt)),
+            lambda: PromptTemplate(
+                input_variables=["context", "question"],
+                template=custom_prompt
+            )
+        )
+
+    def _llm_chain(
+        self,
+        name: str,
+        prompt: PromptTemplate,
+        template: Optional[str] = None,
+        kwargs: Optional[Dict[str, Any]] = None
+    ) -> "LLMChain":
+        """Lấy LLMChain của prompt, dựng một lần cho mỗi template và tham số sinh."""
+        from langchain.chains import LLMChain
+
+        kwargs = kwargs or {}
+        # Tham số sinh (vd. max_output_tokens) được gửi tới model qua generation_config
+        # giống _stream_chain, không phải biến đầu vào của chain
+        llm_kwargs = {"generation_config": kwargs} if kwargs else {}
+        return self.compiled.get_or_create(
+            (name, template_hash(template), params_key(kwargs)),
+            lambda: LLMChain(llm=self.llm, prompt=prompt, llm_kwargs=llm_kwargs)
+        )
+
+    def _response_chain(
+        self,
+        custom_prompt: Optional[str] = None,
+        kwargs: Optional[Dict[str, Any]] = None
+    ) -> "LLMChain":
+        """Lấy chain trả lời câu hỏi từ prompt mặc định hoặc prompt tùy chỉnh."""
+        return self._llm_chain(
+            "response_chain",
+            self._response_prompt(custom_prompt),
+            custom_prompt,
+            kwargs
+        )
+
+    def _summary_chain(self, kwargs: Optional[Dict[str, Any]] = None) -> "LLMChain":
+        """Lấy chain tóm tắt văn bản."""
+        return self._llm_chain("summary_chain", self.summary_prompt, kwargs=kwargs)
+
+    def _combine_summaries_chain(self, kwargs: Optional[Dict[str, Any]] = None) -> "LLMChain":
+        """Lấy chain gộp nhiều bản tóm tắt thành phần."""
+        return self._llm_chain(
+            "combine_summaries_chain",
+            self.combine_summaries_prompt,
+            kwargs=kwargs
+        )
+
+    def _stream_chain(self, custom_prompt: Optional[str], kwargs: Dict[str, Any]) -> Runnable:
+        """Lấy pipeline prompt | LLM dùng để stream, dựng một lần cho mỗi template và tham số sinh."""
+        def create() -> Runnable:
+            llm = self.llm.bind(generation_config=kwargs) if kwargs else self.llm
+            return self._response_prompt(custom_prompt) | llm
+
+        return self.compiled.get_or_create(
+            ("stream_chain", template_hash(custom_prompt), params_key(kwargs)),
+            create
+        )
+
+    def _cache_key(self, prompt: str, kwargs: Dict[str, Any]) -> Optional[str]:
+        """Khóa cache của một lời gọi LLM: prompt đã render và tham số sinh."""
+        if self.response_cache is None or not self.response_cache.enabled:
+            return None
+        params = {
+            key: value for key, value in self._llm_kwargs.items()
+            if key != "google_api_key"
+        }
+        return self.response_cache.make_key(prompt, {**params, **kwargs})
+
+    def _cached_response(self, key: Optional[str], bypass_cache: bool) -> Optional[str]:
+        if key is None or bypass_cache:
+            return None
+        return self.response_cache.get(key)
+
+    def _store_response(self, key: Optional[str], response: str):
+        if key is not None and response:
+            self.response_cache.set(key, response)
+
+    async def _acached_response(self, key: Optional[str], bypass_cache: bool) -> Optional[str]:
+        # Tầng SQLite được đọc ngoài event loop
+        if key is not None and not bypass_cache and self.response_cache.persistent:
+            return await run_blocking(self.response_cache.get, key)
+        return self._cached_response(key, bypass_cache)
+
+    async def _astore_response(self, key: Optional[str], response: str):
+        if key is not None and response and self.response_cache.persistent:
+            await run_blocking(self.response_cache.set, key, response)
+        else:
+            self._store_response(key, response)
+
     def generate_response(
         self,
         question: str,
         context: str,
         custom_prompt: Optional[str] = None,
+        bypass_cache: bool = False,
         **kwargs
     ) -> str:
         """
@@ -88,35 +337,215 @@ class LLMManager:
             question: Câu hỏi cần trả lời
             context: Context để trả lời câu hỏi
             custom_prompt: Prompt tùy chỉnh
-            **kwargs: Các tham số bổ sung cho LLM
+            bypass_cache: Không đọc cache câu trả lời (kết quả mới vẫn được lưu)
+            **kwargs: Tham số sinh cho LLM (vd. max_output_tokens)
 
         Returns:
             str: Câu trả lời được tạo ra
         """
-        if custom_prompt:
-            prompt = PromptTemplate(
-                input_variables=["context", "question"],
-                template=custom_prompt
-            )
-        else:
-            prompt = self.default_prompt
+        prompt = self._response_prompt(custom_prompt)
+        key = self._cache_key(prompt.format(context=context, question=question), kwargs)
+        cached = self._cached_response(key, bypass_cache)
+        if cached is not None:
+            return cached
 
-        chain = LLMChain(
-            llm=self.llm,
-            prompt=prompt
+        chain = self._response_chain(custom_prompt, kwargs)
+        response = chain.run(
+            context=context,
+            question=question
         )
+        record_llm_tokens("answer", context + question, response)
+        self._store_response(key, response)
+        return response
 
-        response = chain.run(
+    async def agenerate_response(
+        self,
+        question: str,
+        context: str,
+        custom_prompt: Optional[str] = None,
+        bypass_cache: bool = False,
+        **kwargs
+    ) -> str:
+        """
+        Phiên bản async của generate_response, không chặn event loop.
+
+        Args:
+            question: Câu hỏi cần trả lời
+            context: Context để trả lời câu hỏi
+            custom_prompt: Prompt tùy chỉnh
+            bypass_cache: Không đọc cache câu trả lời (kết quả mới vẫn được lưu)
+            **kwargs: Tham số sinh cho LLM (vd. max_output_tokens)
+
+        Returns:
+            str: Câu trả lời được tạo ra
+        """
+        prompt = self._response_prompt(custom_prompt)
+        key = self._cache_key(prompt.format(context=context, question=question), kwargs)
+        cached = await self._acached_response(key, bypass_cache)
+        if cached is not None:
+            return cached
+
+        chain = self._response_chain(custom_prompt, kwargs)
+        response = await chain.arun(
             context=context,
-            question=question,
-            **kwargs
+            question=question
         )
+        record_llm_tokens("answer", context + question, response)
+        await self._astore_response(key, response)
         return response
 
+    async def agenerate_responses(
+        self,
+        items: Sequence[Tuple[str, str]],
+        custom_prompt: Optional[str] = None,
+        max_concurrency: int = BATCH_MAX_CONCURRENCY,
+        max_retries: int = INGEST_MAX_RETRIES,
+        bypass_cache: bool = False,
+        **kwargs
+    ) -> AsyncIterator[Tuple[int, Union[str, Exception]]]:
+        """
+        Sinh câu trả lời cho nhiều câu hỏi với số request đồng thời giới hạn.
+
+        Lỗi giới hạn tốc độ được thử lại với backoff; lỗi của một câu hỏi không
+        làm dừng các câu hỏi khác.
+
+        Args:
+            items: Các cặp (câu hỏi, context)
+            custom_prompt: Prompt tùy chỉnh
+            max_concurrency: Số request LLM đồng thời tối đa
+            max_retries: Số lần thử lại khi gặp lỗi giới hạn tốc độ
+            bypass_cache: Không đọc cache câu trả lời (kết quả mới vẫn được lưu)
+            **kwargs: Tham số sinh cho LLM (vd. max_output_tokens)
+
+        Yields:
+            Tuple[int, Union[str, Exception]]: Chỉ số của câu hỏi và câu trả lời
+                (hoặc lỗi), theo thứ tự hoàn thành
+        """
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def generate(index: int, question: str, context: str):
+            attempt = 0
+            while True:
+                try:
+                    async with semaphore:
+                        answer = await self.agenerate_response(
+                            question=question,
+                            context=context,
+                            custom_prompt=custom_prompt,
+                            bypass_cache=bypass_cache,
+                            **kwargs
+                        )
+                    return index, answer
+                except Exception as e:
+                    if attempt >= max_retries or not is_rate_limit_error(e):
+                        return index, e
+                    # Chờ ngoài semaphore để request khác được chạy
+                    await asyncio.sleep(min(30.0, 2 ** attempt) * (0.5 + random.random() / 2))
+                    attempt += 1
+
+        tasks = [
+            asyncio.create_task(generate(index, question, context))
+            for index, (question, context) in enumerate(items)
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            # Client ngắt kết nối giữa chừng: hủy các request chưa chạy
+            for task in tasks:
+                task.cancel()
+
+    async def astream_response(
+        self,
+        question: str,
+        context: str,
+        custom_prompt: Optional[str] = None,
+        bypass_cache: bool = False,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Sinh câu trả lời dạng stream, trả về từng đoạn text ngay khi model tạo ra.
+
+        Câu trả lời có trong cache được trả về một lần; câu trả lời chỉ được lưu
+        vào cache khi stream hoàn tất.
+
+        Args:
+            question: Câu hỏi cần trả lời
+            context: Context để trả lời câu hỏi
+            custom_prompt: Prompt tùy chỉnh
+            bypass_cache: Không đọc cache câu trả lời (kết quả mới vẫn được lưu)
+            **kwargs: Tham số sinh cho LLM (vd. max_output_tokens)
+
+        Yields:
+            str: Từng đoạn của câu trả lời
+        """
+        prompt = self._response_prompt(custom_prompt)
+        key = self._cache_key(prompt.format(context=context, question=question), kwargs)
+        cached = await self._acached_response(key, bypass_cache)
+        if cached is not None:
+            yield cached
+            return
+
+        chain = self._stream_chain(custom_prompt, kwargs)
+        parts = []
+        try:
+            async for chunk in chain.astream(
+                {"context": context, "question": question}
+            ):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield chunk.content
+            await self._astore_response(key, "".join(parts))
+        finally:
+            record_llm_tokens("answer", context + question, "".join(parts))
+
+    async def acondense_question(self, question: str, history: str) -> str:
+        """
+        Viết lại câu hỏi nối tiếp (vd. "còn ngành khác thì sao?") thành câu hỏi
+        độc lập dựa trên lịch sử hội thoại, dùng cho bước retrieval.
+
+        Args:
+            question: Câu hỏi hiện tại
+            history: Lịch sử hội thoại đã định dạng
+
+        Returns:
+            str: Câu hỏi độc lập, hoặc câu hỏi gốc nếu không có lịch sử
+        """
+        if not history:
+            return question
+        chain = self.compiled.get_or_create(
+            ("condense_chain",),
+            lambda: self.condense_prompt | self.llm
+        )
+        response = await chain.ainvoke({"history": history, "question": question})
+        record_llm_tokens("condense", history + question, response.content)
+        return response.content.strip() or question
+
+    async def aget_relevant_documents(
+        self,
+        retriever: BaseRetriever,
+        query: str
+    ) -> List[Document]:
+        """
+        Lấy relevant documents bất đồng bộ.
+
+        Dùng ainvoke của retriever: truy vấn vector store và rerank được
+        chạy trong thread pool, LLMChainExtractor gọi LLM bằng API async.
+
+        Args:
+            retriever: Retriever (thường là kết quả của setup_reranker)
+            query: Câu hỏi
+
+        Returns:
+            List[Document]: Danh sách documents liên quan
+        """
+        return await retriever.ainvoke(query)
+
     def generate_summary(
         self,
         text: str,
         max_length: int = 200,
+        bypass_cache: bool = False,
         **kwargs
     ) -> str:
         """
@@ -125,28 +554,92 @@ class LLMManager:
         Args:
             text: Văn bản cần tóm tắt
             max_length: Độ dài tối đa của tóm tắt
-            **kwargs: Các tham số bổ sung cho LLM
+            bypass_cache: Không đọc cache câu trả lời (kết quả mới vẫn được lưu)
+            **kwargs: Tham số sinh cho LLM (vd. max_output_tokens)
 
         Returns:
             str: Tóm tắt được tạo ra
         """
-        prompt = PromptTemplate(
-            input_variables=["text", "max_length"],
-            template=f"""Hãy tóm tắt đoạn văn bản sau trong khoảng {{max_length}} từ:
-            
-            {{text}}
-            
-            Tóm tắt:"""
-        )
+        key = self._cache_key(self.summary_prompt.format(text=text, max_length=max_length), kwargs)
+        cached = self._cached_response(key, bypass_cache)
+        if cached is not None:
+            return cached
 
-        chain = LLMChain(
-            llm=self.llm,
-            prompt=prompt
+        chain = self._summary_chain(kwargs)
+        response = chain.run(
+            text=text,
+            max_length=max_length
         )
+        record_llm_tokens("summary", text, response)
+        self._store_response(key, response)
+        return response
 
-        response = chain.run(
+    async def agenerate_summary(
+        self,
+        text: str,
+        max_length: int = 200,
+        bypass_cache: bool = False,
+        **kwargs
+    ) -> str:
+        """
+        Phiên bản async của generate_summary.
+
+        Args:
+            text: Văn bản cần tóm tắt
+            max_length: Độ dài tối đa của tóm tắt
+            bypass_cache: Không đọc cache câu trả lời (kết quả mới vẫn được lưu)
+            **kwargs: Tham số sinh cho LLM (vd. max_output_tokens)
+
+        Returns:
+            str: Tóm tắt được tạo ra
+        """
+        key = self._cache_key(self.summary_prompt.format(text=text, max_length=max_length), kwargs)
+        cached = await self._acached_response(key, bypass_cache)
+        if cached is not None:
+            return cached
+
+        chain = self._summary_chain(kwargs)
+        response = await chain.arun(
             text=text,
-            max_length=max_length,
-            **kwargs
+            max_length=max_length
+        )
+        record_llm_tokens("summary", text, response)
+        await self._astore_response(key, response)
+        return response
+
+    async def acombine_summaries(
+        self,
+        summaries: List[str],
+        max_length: int = 200,
+        bypass_cache: bool = False,
+        **kwargs
+    ) -> str:
+        """
+        Gộp các bản tóm tắt thành phần (bước reduce của map-reduce).
+
+        Args:
+            summaries: Tóm tắt của các phần theo thứ tự trong tài liệu
+            max_length: Độ dài tối đa của tóm tắt
+            bypass_cache: Không đọc cache câu trả lời (kết quả mới vẫn được lưu)
+            **kwargs: Tham số sinh cho LLM (vd. max_output_tokens)
+
+        Returns:
+            str: Tóm tắt tổng hợp
+        """
+        text = "\n\n".join(summaries)
+        key = self._cache_key(
+            self.combine_summaries_prompt.format(summaries=text, max_length=max_length),
+            kwargs
+        )
+        cached = await self._acached_response(key, bypass_cache)
+        if cached is not None:
+            return cached
+
+        chain = self._combine_summaries_chain(kwargs)
+        response = await chain.arun(
+            summaries=text,
+            max_length=max_length
         )
+        record_llm_tokens("summary", text, response)
+        await self._astore_response(key, response)
         return response
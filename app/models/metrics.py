@@ -0,0 +1,223 @@
+"""
+Module đo thời gian các stage của pipeline và xuất metrics theo định dạng Prometheus.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, Tuple, TypeVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from .context_builder import estimate_tokens
+
+T = TypeVar("T")
+
+# Bucket (giây) trải từ truy vấn cache vài ms tới lần gọi LLM vài chục giây
+_LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0
+)
+
+STAGE_LATENCY = Histogram(
+    "rag_stage_duration_seconds",
+    "Thời gian của từng stage trong pipeline",
+    ["pipeline", "stage"],
+    buckets=_LATENCY_BUCKETS
+)
+REQUEST_LATENCY = Histogram(
+    "rag_request_duration_seconds",
+    "Thời gian xử lý toàn bộ request",
+    ["endpoint"],
+    buckets=_LATENCY_BUCKETS
+)
+LLM_TOKENS = Counter(
+    "rag_llm_tokens_total",
+    "Số token (ước lượng theo số ký tự) gửi tới và nhận từ LLM",
+    ["operation", "direction"]
+)
+CONTEXT_TOKENS = Histogram(
+    "rag_context_tokens",
+    "Số token (ước lượng) của context gửi cho LLM",
+    buckets=(250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 16000)
+)
+INGESTED_CHUNKS = Counter(
+    "rag_ingested_chunks_total",
+    "Số chunk đã được embed và ghi vào vector store"
+)
+
+
+def observe(pipeline: str, stage: str, seconds: float):
+    """
+    Ghi thời gian của một stage vào histogram.
+
+    Args:
+        pipeline: Tên pipeline (vd. "message", "ingest")
+        stage: Tên stage
+        seconds: Thời gian (giây)
+    """
+    STAGE_LATENCY.labels(pipeline, stage).observe(seconds)
+
+
+@contextmanager
+def span(pipeline: str, stage: str):
+    """Đo thời gian của khối lệnh và ghi vào histogram của stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(pipeline, stage, time.perf_counter() - start)
+
+
+def timed_iter(iterable: Iterable[T], pipeline: str, stage: str) -> Iterator[T]:
+    """
+    Bọc một iterator, cộng dồn thời gian sinh phần tử (vd. đọc và split PDF
+    dạng stream) và ghi tổng vào histogram khi iterator kết thúc.
+
+    Args:
+        iterable: Iterator cần đo
+        pipeline: Tên pipeline
+        stage: Tên stage
+
+    Yields:
+        Các phần tử của iterable
+    """
+    total = 0.0
+    iterator = iter(iterable)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                total += time.perf_counter() - start
+            yield item
+    finally:
+        observe(pipeline, stage, total)
+
+
+class Timings:
+    """Thời gian từng stage của một request, đồng thời ghi vào histogram."""
+
+    def __init__(self, pipeline: str):
+        """
+        Khởi tạo Timings.
+
+        Args:
+            pipeline: Tên pipeline dùng làm label của histogram
+        """
+        self.pipeline = pipeline
+        self.stages: Dict[str, float] = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def span(self, stage: str):
+        """Đo thời gian của khối lệnh; stage lặp lại được cộng dồn."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages[stage] = self.stages.get(stage, 0.0) + elapsed
+            observe(self.pipeline, stage, elapsed)
+
+    def total(self) -> float:
+        """Thời gian (giây) từ khi tạo Timings."""
+        return time.perf_counter() - self._start
+
+    def as_dict(self) -> Dict[str, float]:
+        """
+        Thời gian từng stage và tổng, đơn vị mili giây.
+
+        Returns:
+            Dict[str, float]: stage -> ms, kèm khóa "total"
+        """
+        result = {stage: round(seconds * 1000, 2) for stage, seconds in self.stages.items()}
+        result["total"] = round(self.total() * 1000, 2)
+        return result
+
+
+def record_llm_tokens(operation: str, prompt: str, completion: str):
+    """
+    Cộng số token ước lượng của một lần gọi LLM.
+
+    Args:
+        operation: Loại lời gọi (vd. "answer", "summary", "condense")
+        prompt: Nội dung gửi đi (không tính phần template cố định)
+        completion: Nội dung model trả về
+    """
+    LLM_TOKENS.labels(operation, "prompt").inc(estimate_tokens(prompt))
+    LLM_TOKENS.labels(operation, "completion").inc(estimate_tokens(completion))
+
+
+class _CacheCollector:
+    """Đọc thống kê của các cache đã đăng ký tại thời điểm Prometheus scrape."""
+
+    def __init__(self):
+        self._caches: Dict[str, Callable[[], Dict[str, float]]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, stats: Callable[[], Dict[str, float]]):
+        with self._lock:
+            self._caches[name] = stats
+
+    def collect(self):
+        hits = CounterMetricFamily("rag_cache_hits", "Số lần cache hit", labels=["cache"])
+        misses = CounterMetricFamily("rag_cache_misses", "Số lần cache miss", labels=["cache"])
+        ratio = GaugeMetricFamily("rag_cache_hit_ratio", "Tỉ lệ hit của cache", labels=["cache"])
+        with self._lock:
+            caches = list(self._caches.items())
+        for name, stats in caches:
+            values = stats()
+            hits.add_metric([name], values.get("hits", 0))
+            misses.add_metric([name], values.get("misses", 0))
+            ratio.add_metric([name], values.get("hit_rate", 0.0))
+        yield hits
+        yield misses
+        yield ratio
+
+
+_cache_collector = _CacheCollector()
+REGISTRY.register(_cache_collector)
+
+
+def register_cache(name: str, stats: Callable[[], Dict[str, float]]):
+    """
+    Đăng ký một cache để xuất hits, misses và hit ratio ở /metrics.
+
+    Args:
+        name: Tên cache dùng làm label
+        stats: Hàm trả về dict có "hits", "misses" và "hit_rate"
+    """
+    _cache_collector.register(name, stats)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Xuất toàn bộ metrics theo định dạng text của Prometheus.
+
+    Khi chạy nhiều worker với PROMETHEUS_MULTIPROC_DIR, metrics của các
+    process được gộp lại (thống kê cache vẫn là của worker trả lời scrape).
+
+    Returns:
+        Tuple[bytes, str]: Nội dung và content type
+    """
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_cache_collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
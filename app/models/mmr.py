@@ -0,0 +1,215 @@
+"""
+Module chọn kết quả đa dạng bằng Maximal Marginal Relevance (MMR) vector hóa.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun
+)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from pydantic import ConfigDict
+
+from .concurrency import run_blocking
+from .embedding_backends import aembed_queries, embed_queries
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def mmr_select(
+    query: Sequence[float],
+    candidates: np.ndarray,
+    k: int = 4,
+    lambda_mult: float = 0.5,
+    score_threshold: Optional[float] = None
+) -> Tuple[List[int], np.ndarray]:
+    """
+    Chọn k candidate theo MMR.
+
+    Ma trận similarity giữa các candidate được tính một lần; mỗi bước chỉ cập
+    nhật độ giống lớn nhất của từng candidate với tập đã chọn (O(fetch_k)).
+
+    Args:
+        query: Vector câu hỏi
+        candidates: Ma trận (fetch_k, dim) vector của các candidate
+        k: Số kết quả
+        lambda_mult: 1 chỉ xét độ liên quan, 0 chỉ xét độ đa dạng
+        score_threshold: Bỏ candidate có cosine similarity với câu hỏi thấp hơn
+
+    Returns:
+        Tuple[List[int], np.ndarray]: Chỉ số các candidate được chọn theo thứ tự
+            chọn và cosine similarity của mọi candidate với câu hỏi
+    """
+    candidates = np.asarray(candidates, dtype=np.float32)
+    if candidates.ndim != 2 or not len(candidates) or k <= 0:
+        return [], np.empty(0, dtype=np.float32)
+    vectors = _normalize(candidates)
+    relevance = vectors @ _normalize(np.asarray(query, dtype=np.float32))
+    similarity = vectors @ vectors.T
+
+    score = lambda_mult * relevance
+    if score_threshold is not None:
+        score = np.where(relevance >= score_threshold, score, -np.inf)
+    # Độ giống lớn nhất của mỗi candidate với tập đã chọn; candidate đầu tiên chỉ
+    # xét độ liên quan
+    max_similarity: Optional[np.ndarray] = None
+    selected: List[int] = []
+    for _ in range(min(k, len(vectors))):
+        if max_similarity is None:
+            mmr = np.where(np.isfinite(score), relevance, -np.inf)
+        else:
+            mmr = score - (1 - lambda_mult) * max_similarity
+        index = int(np.argmax(mmr))
+        if not np.isfinite(mmr[index]):
+            break
+        selected.append(index)
+        score[index] = -np.inf
+        if max_similarity is None:
+            max_similarity = similarity[index].copy()
+        else:
+            np.maximum(max_similarity, similarity[index], out=max_similarity)
+    return selected, relevance
+
+
+def fetch_candidates_many(
+    vector_store: VectorStore,
+    embeddings: Sequence[Sequence[float]],
+    fetch_k: int,
+    filter: Optional[Dict[str, Any]] = None
+) -> List[Tuple[List[Document], np.ndarray]]:
+    """
+    Lấy fetch_k candidate gần nhất cùng vector của chúng cho nhiều câu hỏi trong
+    một lần truy vấn vector store.
+
+    Args:
+        vector_store: Chroma hoặc NumpyVectorStore
+        embeddings: Vector của các câu hỏi
+        fetch_k: Số candidate mỗi câu hỏi
+        filter: Bộ lọc metadata
+
+    Returns:
+        List[Tuple[List[Document], np.ndarray]]: Candidate và ma trận vector
+            tương ứng của từng câu hỏi
+    """
+    if not len(embeddings):
+        return []
+    if hasattr(vector_store, "search_with_vectors_many"):
+        return vector_store.search_with_vectors_many(embeddings, fetch_k, filter)
+
+    collection = getattr(vector_store, "_collection", None)
+    if collection is None:
+        raise ValueError(f"Vector store không hỗ trợ MMR: {type(vector_store).__name__}")
+    result = collection.query(
+        query_embeddings=[list(embedding) for embedding in embeddings],
+        n_results=fetch_k,
+        where=filter or None,
+        include=["documents", "metadatas", "embeddings"]
+    )
+    candidates = []
+    for i in range(len(embeddings)):
+        documents = [
+            Document(page_content=text or "", metadata=metadata or {})
+            for text, metadata in zip(result["documents"][i], result["metadatas"][i])
+        ]
+        vectors = result["embeddings"][i] if result.get("embeddings") is not None else []
+        candidates.append((documents, np.asarray(vectors, dtype=np.float32)))
+    return candidates
+
+
+def fetch_candidates(
+    vector_store: VectorStore,
+    embedding: Sequence[float],
+    fetch_k: int,
+    filter: Optional[Dict[str, Any]] = None
+) -> Tuple[List[Document], np.ndarray]:
+    """
+    Lấy fetch_k candidate gần nhất cùng vector của chúng trong một lần truy vấn.
+
+    Args:
+        vector_store: Chroma hoặc NumpyVectorStore
+        embedding: Vector câu hỏi
+        fetch_k: Số candidate
+        filter: Bộ lọc metadata
+
+    Returns:
+        Tuple[List[Document], np.ndarray]: Candidate và ma trận vector tương ứng
+    """
+    return fetch_candidates_many(vector_store, [embedding], fetch_k, filter)[0]
+
+
+class MMRRetriever(BaseRetriever):
+    """
+    Retriever lấy fetch_k candidate một lần rồi chọn k kết quả bằng MMR vector hóa.
+
+    Với lambda_mult=1 là tìm kiếm theo similarity có ngưỡng điểm.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vector_store: VectorStore
+    embeddings: Embeddings
+    k: int = 4
+    fetch_k: int = 20
+    lambda_mult: float = 0.5
+    score_threshold: Optional[float] = None
+    filter: Optional[Dict[str, Any]] = None
+
+    def _select_many(self, embeddings: Sequence[Sequence[float]]) -> List[List[Document]]:
+        candidates = fetch_candidates_many(
+            self.vector_store,
+            embeddings,
+            max(self.k, self.fetch_k),
+            self.filter
+        )
+        results = []
+        for embedding, (documents, vectors) in zip(embeddings, candidates):
+            selected, relevance = mmr_select(
+                embedding,
+                vectors,
+                k=self.k,
+                lambda_mult=self.lambda_mult,
+                score_threshold=self.score_threshold
+            )
+            results.append([
+                Document(
+                    page_content=documents[index].page_content,
+                    metadata={**documents[index].metadata, "similarity_score": float(relevance[index])}
+                )
+                for index in selected
+            ])
+        return results
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self._select_many([self.embeddings.embed_query(query)])[0]
+
+    async def _aget_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        embedding = await self.embeddings.aembed_query(query)
+        # Truy vấn vector store và tính ma trận similarity ngoài event loop
+        return (await run_blocking(self._select_many, [embedding]))[0]
+
+    def batch(self, inputs: List[str], config: Any = None, **kwargs: Any) -> List[List[Document]]:
+        # Embed các câu hỏi trong một batch và lấy candidate bằng một truy vấn vector store
+        return self._select_many(embed_queries(self.embeddings, list(inputs)))
+
+    async def abatch(self, inputs: List[str], config: Any = None, **kwargs: Any) -> List[List[Document]]:
+        embeddings = await aembed_queries(self.embeddings, list(inputs))
+        return await run_blocking(self._select_many, embeddings)
@@ -0,0 +1,801 @@
+"""
+Module vector store dùng ma trận NumPy memory-mapped, tìm kiếm chính xác bằng một
+phép nhân ma trận hoặc qua chỉ mục IVF (k-means) cho collection lớn.
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from app.config import NUMPY_STORE_DTYPE, NUMPY_IVF_MIN_VECTORS, NUMPY_IVF_NPROBE
+from .concurrency import run_blocking
+from .mmr import mmr_select
+
+try:
+    import fcntl
+except ImportError:  # Windows: chỉ khóa trong process
+    fcntl = None
+
+# Số dòng nhân mỗi lần khi ma trận lưu float16 (đổi sang float32 theo block)
+_BLOCK_ROWS = 65536
+# Dung lượng tối thiểu (số vector) khi tạo file
+_MIN_CAPACITY = 1024
+_SQL_CHUNK = 500
+_DTYPES = {"float32": np.float32, "float16": np.float16}
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _filter_sql(filter: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """
+    Chuyển filter kiểu Chroma ({"source": "a.pdf"}, {"page": {"$in": [1, 2]}},
+    {"$and": [...]}) thành điều kiện SQL trên cột metadata JSON.
+    """
+    clauses: List[str] = []
+    params: List[Any] = []
+    for key, value in filter.items():
+        if key in ("$and", "$or"):
+            parts = [_filter_sql(item) for item in value]
+            joiner = " AND " if key == "$and" else " OR "
+            clauses.append("(" + joiner.join(sql for sql, _ in parts) + ")")
+            for _, part_params in parts:
+                params.extend(part_params)
+            continue
+        column = "json_extract(metadata, ?)"
+        path = f'$."{key}"'
+        if not isinstance(value, dict):
+            value = {"$eq": value}
+        for op, operand in value.items():
+            if op in ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte"):
+                sql_op = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}[op]
+                clauses.append(f"{column} {sql_op} ?")
+                params.extend([path, operand])
+            elif op in ("$in", "$nin"):
+                placeholders = ", ".join("?" for _ in operand) or "NULL"
+                negate = "NOT " if op == "$nin" else ""
+                clauses.append(f"{column} {negate}IN ({placeholders})")
+                params.extend([path, *operand])
+            else:
+                raise ValueError(f"Toán tử filter không hỗ trợ: {op}")
+    return " AND ".join(clauses) or "1", params
+
+
+def kmeans(
+    vectors: np.ndarray,
+    n_clusters: int,
+    iterations: int = 10,
+    seed: int = 0
+) -> np.ndarray:
+    """
+    K-means cầu (theo cosine) cho vector đã chuẩn hóa.
+
+    Args:
+        vectors: Ma trận (n, dim) float32 đã chuẩn hóa
+        n_clusters: Số cụm
+        iterations: Số vòng lặp
+        seed: Seed chọn tâm khởi tạo
+
+    Returns:
+        np.ndarray: Tâm cụm (n_clusters, dim) đã chuẩn hóa
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        # Cụm rỗng lấy một điểm ngẫu nhiên làm tâm mới
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids.astype(np.float32)
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Vector store lưu embedding (đã chuẩn hóa, điểm là cosine similarity) trong
+    một ma trận memory-mapped, id/nội dung/metadata trong file SQLite đi kèm.
+
+    Nhiều worker mở cùng thư mục dùng chung page cache của ma trận (không
+    copy); thay đổi của worker khác được nhận ra qua bộ đếm generation.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        embedding: Embeddings,
+        collection_name: str = "documents",
+        dtype: str = NUMPY_STORE_DTYPE,
+        embedding_model: Optional[str] = None,
+        ivf_min_vectors: int = NUMPY_IVF_MIN_VECTORS,
+        ivf_nprobe: int = NUMPY_IVF_NPROBE
+    ):
+        """
+        Khởi tạo NumpyVectorStore, mở hoặc tạo collection trong directory.
+
+        Args:
+            directory: Thư mục của collection
+            embedding: Model embedding dùng cho câu hỏi và add_texts
+            collection_name: Tên collection
+            dtype: Kiểu lưu vector ("float32" hoặc "float16"), chỉ áp dụng khi tạo mới
+            embedding_model: Định danh model embedding, ghi lại khi tạo mới
+            ivf_min_vectors: Số vector tối thiểu để dựng chỉ mục IVF (0 để tắt)
+            ivf_nprobe: Số cụm được quét khi tìm kiếm qua IVF
+        """
+        if dtype not in _DTYPES:
+            raise ValueError(f"dtype không hợp lệ: {dtype}")
+        self.directory = directory
+        self.collection_name = collection_name
+        self._embedding = embedding
+        self.ivf_min_vectors = ivf_min_vectors
+        self.ivf_nprobe = max(1, ivf_nprobe)
+        self._lock = threading.RLock()
+        self._write_depth = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(
+            os.path.join(directory, "records.sqlite3"),
+            check_same_thread=False,
+            timeout=30
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS records (
+                slot INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );"""
+        )
+        with self._conn:
+            for key, value in (
+                ("dtype", dtype),
+                ("embedding_model", embedding_model or ""),
+                ("dim", "0"),
+                ("capacity", "0"),
+                ("size", "0"),
+                ("generation", "0"),
+                ("ivf_generation", "0"),
+                ("ivf_trained_count", "0"),
+            ):
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO info (key, value) VALUES (?, ?)",
+                    (key, value)
+                )
+
+        self.dtype = self._info()["dtype"]
+        self._dim = 0
+        self._capacity = 0
+        self._size = 0
+        self._generation = -1
+        self._ivf_generation = 0
+        self._matrix: Optional[np.memmap] = None
+        self._alive: Optional[np.memmap] = None
+        self._assignments: Optional[np.memmap] = None
+        self._centroids: Optional[np.ndarray] = None
+        # Danh sách đảo của IVF: slot sắp theo cụm và vị trí bắt đầu của từng cụm
+        self._lists: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._refresh()
+
+    # ----- Lưu trữ -----
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _info(self) -> Dict[str, str]:
+        return dict(self._conn.execute("SELECT key, value FROM info").fetchall())
+
+    def _set_info(self, **values):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)",
+            [(key, str(value)) for key, value in values.items()]
+        )
+
+    @property
+    def embedding_model(self) -> Optional[str]:
+        """Định danh model embedding đã tạo collection."""
+        with self._lock:
+            return self._info()["embedding_model"] or None
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    @contextmanager
+    def _write_lock(self):
+        # Khóa file để các worker khác không ghi cùng lúc; flock không lồng được
+        # trong cùng process nên chỉ lấy ở tầng ngoài cùng
+        with self._lock:
+            if fcntl is None or self._write_depth:
+                self._write_depth += 1
+                try:
+                    yield
+                finally:
+                    self._write_depth -= 1
+                return
+            with open(self._path("lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._write_depth += 1
+                try:
+                    yield
+                finally:
+                    self._write_depth -= 1
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _map(self, name: str, dtype, shape) -> np.memmap:
+        return np.memmap(self._path(name), dtype=dtype, mode="r+", shape=shape)
+
+    def _refresh(self):
+        """Đọc lại trạng thái nếu collection đã bị thay đổi (bởi process này hoặc khác)."""
+        info = self._info()
+        generation = int(info["generation"])
+        if generation == self._generation:
+            return
+        dim, capacity = int(info["dim"]), int(info["capacity"])
+        if capacity != self._capacity or dim != self._dim:
+            self._dim, self._capacity = dim, capacity
+            if capacity:
+                self._matrix = self._map("vectors.bin", _DTYPES[self.dtype], (capacity, dim))
+                self._alive = self._map("alive.bin", np.uint8, (capacity,))
+                self._assignments = self._map("ivf_assignments.bin", np.int32, (capacity,))
+        ivf_generation = int(info["ivf_generation"])
+        if ivf_generation != self._ivf_generation:
+            self._ivf_generation = ivf_generation
+            path = self._path("ivf_centroids.npy")
+            self._centroids = np.load(path) if os.path.exists(path) else None
+        self._size = int(info["size"])
+        self._generation = generation
+        self._lists = None
+
+    def _grow(self, needed: int, dim: int):
+        capacity = max(needed, self._capacity * 2, _MIN_CAPACITY)
+        item_size = np.dtype(_DTYPES[self.dtype]).itemsize
+        for name, row_bytes in (
+            ("vectors.bin", dim * item_size),
+            ("alive.bin", 1),
+            ("ivf_assignments.bin", 4),
+        ):
+            # Mở rộng file; vùng đã map của các worker khác vẫn hợp lệ
+            with open(self._path(name), "ab") as f:
+                f.truncate(capacity * row_bytes)
+        self._dim, self._capacity = dim, capacity
+        self._matrix = self._map("vectors.bin", _DTYPES[self.dtype], (capacity, dim))
+        self._alive = self._map("alive.bin", np.uint8, (capacity,))
+        self._assignments = self._map("ivf_assignments.bin", np.int32, (capacity,))
+        self._set_info(dim=dim, capacity=capacity)
+
+    def _commit(self, **values):
+        self._generation += 1
+        self._set_info(generation=self._generation, **values)
+        self._conn.commit()
+        self._lists = None
+
+    # ----- Ghi -----
+
+    def add_embeddings(
+        self,
+        text_embeddings: Iterable[Tuple[str, List[float]]],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> List[str]:
+        """
+        Thêm (hoặc ghi đè theo ID) các vector đã tính sẵn.
+
+        Args:
+            text_embeddings: Các cặp (nội dung, vector)
+            metadatas: Metadata của từng chunk
+            ids: ID của từng chunk, mặc định sinh theo slot
+
+        Returns:
+            List[str]: ID của các chunk đã ghi
+        """
+        pairs = list(text_embeddings)
+        if not pairs:
+            return []
+        texts = [text for text, _ in pairs]
+        vectors = _normalize(np.asarray([vector for _, vector in pairs], dtype=np.float32))
+        metadatas = metadatas or [{} for _ in pairs]
+
+        with self._write_lock():
+            self._refresh()
+            dim = vectors.shape[1]
+            if self._dim and dim != self._dim:
+                raise ValueError(f"Số chiều vector {dim} khác với collection ({self._dim})")
+
+            if ids is None:
+                ids = [str(self._size + i) for i in range(len(pairs))]
+            # Bản ghi trùng ID trong cùng batch: giữ bản cuối
+            latest = {record_id: i for i, record_id in enumerate(ids)}
+            order = sorted(latest.values())
+            ids = [ids[i] for i in order]
+            texts = [texts[i] for i in order]
+            metadatas = [metadatas[i] or {} for i in order]
+            vectors = vectors[order]
+
+            existing: Dict[str, int] = {}
+            for start in range(0, len(ids), _SQL_CHUNK):
+                chunk = ids[start:start + _SQL_CHUNK]
+                existing.update(self._conn.execute(
+                    f"SELECT id, slot FROM records WHERE id IN ({', '.join('?' for _ in chunk)})",
+                    chunk
+                ).fetchall())
+
+            new_count = sum(1 for record_id in ids if record_id not in existing)
+            free = (
+                np.flatnonzero(self._alive[:self._size] == 0)[:new_count].tolist()
+                if self._size else []
+            )
+            size = self._size + new_count - len(free)
+            if size > self._capacity:
+                self._grow(size, dim)
+            next_slot = self._size
+            slots = []
+            for record_id in ids:
+                if record_id in existing:
+                    slots.append(existing[record_id])
+                elif free:
+                    slots.append(free.pop(0))
+                else:
+                    slots.append(next_slot)
+                    next_slot += 1
+            slots_array = np.asarray(slots, dtype=np.int64)
+
+            self._matrix[slots_array] = vectors.astype(self._matrix.dtype)
+            if self._centroids is not None:
+                self._assignments[slots_array] = np.argmax(vectors @ self._centroids.T, axis=1)
+            self._matrix.flush()
+            self._assignments.flush()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO records (slot, id, text, metadata) VALUES (?, ?, ?, ?)",
+                [
+                    (slot, record_id, text, json.dumps(metadata, ensure_ascii=False))
+                    for slot, record_id, text, metadata in zip(slots, ids, texts, metadatas)
+                ]
+            )
+            # Đánh dấu còn hiệu lực sau khi vector đã được ghi
+            self._alive[slots_array] = 1
+            self._alive.flush()
+            self._size = size
+            self._commit(size=size)
+            self._maybe_train_ivf()
+        return ids
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> List[str]:
+        texts = list(texts)
+        vectors = self._embedding.embed_documents(texts)
+        return self.add_embeddings(zip(texts, vectors), metadatas=metadatas, ids=ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return True
+        with self._write_lock():
+            self._refresh()
+            slots: List[int] = []
+            for start in range(0, len(ids), _SQL_CHUNK):
+                chunk = ids[start:start + _SQL_CHUNK]
+                placeholders = ", ".join("?" for _ in chunk)
+                slots.extend(slot for (slot,) in self._conn.execute(
+                    f"SELECT slot FROM records WHERE id IN ({placeholders})", chunk
+                ))
+                self._conn.execute(f"DELETE FROM records WHERE id IN ({placeholders})", chunk)
+            if slots:
+                self._alive[np.asarray(slots, dtype=np.int64)] = 0
+                self._alive.flush()
+            self._commit()
+        return True
+
+    def delete_collection(self):
+        """Xóa toàn bộ collection khỏi disk."""
+        with self._write_lock():
+            self._conn.close()
+            self._matrix = self._alive = self._assignments = None
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def persist(self):
+        """Dữ liệu được ghi xuống disk sau mỗi batch, không cần làm gì thêm."""
+
+    # ----- IVF -----
+
+    def _maybe_train_ivf(self):
+        if not self.ivf_min_vectors:
+            return
+        count = int(self._alive[:self._size].sum()) if self._size else 0
+        trained = int(self._info()["ivf_trained_count"])
+        # Huấn luyện lần đầu khi đủ lớn, huấn luyện lại khi số vector tăng gấp đôi
+        if count >= self.ivf_min_vectors and (not trained or count >= 2 * trained):
+            self.build_ivf()
+
+    def build_ivf(self, n_lists: Optional[int] = None, sample_size: Optional[int] = None):
+        """
+        Dựng (lại) chỉ mục IVF: chia vector thành n_lists cụm bằng k-means.
+
+        Args:
+            n_lists: Số cụm, mặc định căn bậc hai của số vector
+            sample_size: Số vector dùng để huấn luyện, mặc định 64 vector mỗi cụm
+        """
+        with self._write_lock():
+            self._refresh()
+            slots = np.flatnonzero(self._alive[:self._size]) if self._size else np.empty(0, np.int64)
+            if len(slots) < 2:
+                return
+            n_lists = n_lists or max(1, int(np.sqrt(len(slots))))
+            sample_size = sample_size or 64 * n_lists
+            rng = np.random.default_rng(0)
+            sample = slots if len(slots) <= sample_size else np.sort(
+                rng.choice(slots, sample_size, replace=False)
+            )
+            centroids = kmeans(
+                _normalize(np.asarray(self._matrix[sample], dtype=np.float32)),
+                n_lists
+            )
+            for start in range(0, self._size, _BLOCK_ROWS):
+                block = np.asarray(self._matrix[start:start + _BLOCK_ROWS], dtype=np.float32)
+                self._assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+            self._assignments.flush()
+            tmp_path = self._path("ivf_centroids.tmp.npy")
+            np.save(tmp_path, centroids)
+            os.replace(tmp_path, self._path("ivf_centroids.npy"))
+            self._centroids = centroids
+            self._ivf_generation += 1
+            self._commit(ivf_generation=self._ivf_generation, ivf_trained_count=len(slots))
+
+    def _inverted_lists(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._lists is None:
+            assignments = np.asarray(self._assignments[:self._size])
+            order = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=len(self._centroids))
+            offsets = np.concatenate([[0], np.cumsum(counts)])
+            self._lists = (order, offsets)
+        return self._lists
+
+    # ----- Tìm kiếm -----
+
+    def _allowed_slots(self, filter: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        if not filter:
+            return None
+        where, params = _filter_sql(filter)
+        rows = self._conn.execute(f"SELECT slot FROM records WHERE {where}", params).fetchall()
+        return np.fromiter((slot for (slot,) in rows), dtype=np.int64, count=len(rows))
+
+    def _scores(self, query: np.ndarray, slots: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Cosine similarity của query với các slot (mặc định toàn bộ ma trận).
+
+        query là một vector (dim,) hoặc ma trận (dim, n) của n câu hỏi, khi đó
+        điểm có dạng (số slot, n).
+        """
+        if slots is not None:
+            rows = np.asarray(self._matrix[slots], dtype=np.float32)
+            scores = rows @ query
+            alive = self._alive[slots].astype(bool)
+            return slots[alive], scores[alive]
+        if self._matrix.dtype == np.float32:
+            scores = self._matrix[:self._size] @ query
+        else:
+            scores = np.empty((self._size,) + query.shape[1:], dtype=np.float32)
+            for start in range(0, self._size, _BLOCK_ROWS):
+                block = np.asarray(self._matrix[start:start + _BLOCK_ROWS], dtype=np.float32)
+                scores[start:start + len(block)] = block @ query
+        alive = np.flatnonzero(self._alive[:self._size])
+        return alive, scores[alive]
+
+    @staticmethod
+    def _top_k(slots: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            slots, scores = slots[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return slots[order], scores[order]
+
+    def _candidates_many(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        k: int,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Lấy k slot gần nhất cho từng câu hỏi.
+
+        Khi tìm kiếm chính xác, điểm của một nhóm câu hỏi được tính bằng một phép
+        nhân ma trận; với IVF mỗi câu hỏi quét các cụm riêng của nó.
+
+        Returns:
+            List[Tuple]: (slots, scores) giảm dần theo điểm của từng câu hỏi
+        """
+        queries = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+        empty = (np.empty(0, np.int64), np.empty(0, np.float32))
+        results = []
+        with self._lock:
+            self._refresh()
+            if not self._size or k <= 0:
+                return [empty] * len(queries)
+            slots = self._allowed_slots(filter)
+            if slots is None and self._centroids is not None:
+                order, offsets = self._inverted_lists()
+                nprobe = min(self.ivf_nprobe, len(self._centroids))
+                for query in queries:
+                    lists = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+                    probed = np.concatenate([order[offsets[i]:offsets[i + 1]] for i in lists])
+                    results.append(self._scores(query, probed))
+            else:
+                # Giới hạn ma trận điểm (số slot x số câu hỏi) ở khoảng _BLOCK_ROWS * 256 phần tử
+                rows = len(slots) if slots is not None else self._size
+                step = max(1, (_BLOCK_ROWS * 256) // max(1, rows))
+                for start in range(0, len(queries), step):
+                    block = queries[start:start + step]
+                    block_slots, scores = self._scores(block.T, slots)
+                    results.extend((block_slots, scores[:, i]) for i in range(len(block)))
+        return [self._top_k(slots, scores, k) for slots, scores in results]
+
+    def _candidates(
+        self,
+        embedding: Sequence[float],
+        k: int,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Lấy k slot gần nhất.
+
+        Returns:
+            Tuple: (slots, scores) giảm dần theo điểm và query đã chuẩn hóa
+        """
+        slots, scores = self._candidates_many([embedding], k, filter)[0]
+        return slots, scores, _normalize(np.asarray(embedding, dtype=np.float32))
+
+    def _rows(self, slots: Sequence[int]) -> Dict[int, Document]:
+        rows: Dict[int, Document] = {}
+        slots = [int(slot) for slot in slots]
+        for start in range(0, len(slots), _SQL_CHUNK):
+            chunk = slots[start:start + _SQL_CHUNK]
+            rows.update(
+                (slot, Document(page_content=text, metadata=json.loads(metadata)))
+                for slot, text, metadata in self._conn.execute(
+                    f"SELECT slot, text, metadata FROM records WHERE slot IN "
+                    f"({', '.join('?' for _ in chunk)})",
+                    chunk
+                )
+            )
+        return rows
+
+    def _documents(self, slots: Sequence[int]) -> List[Document]:
+        # Bỏ slot vừa bị worker khác xóa
+        rows = self._rows(slots)
+        return [rows[int(slot)] for slot in slots if int(slot) in rows]
+
+    def similarity_search_by_vector_with_score(
+        self,
+        embedding: Sequence[float],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Document, float]]:
+        """
+        Tìm k chunk gần nhất với vector.
+
+        Args:
+            embedding: Vector của câu hỏi
+            k: Số kết quả
+            filter: Bộ lọc metadata kiểu Chroma
+
+        Returns:
+            List[Tuple[Document, float]]: Chunk và cosine similarity, giảm dần
+        """
+        slots, scores, _ = self._candidates(embedding, k, filter)
+        with self._lock:
+            documents = self._documents(slots)
+        return list(zip(documents, scores.tolist()))
+
+    def similarity_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(
+            self._embedding.embed_query(query), k, filter
+        )
+
+    def similarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # Cosine similarity [-1, 1] -> [0, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> List[Document]:
+        documents, vectors = self.search_with_vectors(embedding, max(k, fetch_k), filter)
+        selected, _ = mmr_select(embedding, vectors, k=k, lambda_mult=lambda_mult)
+        return [documents[index] for index in selected]
+
+    def search_with_vectors(
+        self,
+        embedding: Sequence[float],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List[Document], np.ndarray]:
+        """
+        Tìm k chunk gần nhất và trả kèm vector của chúng (dùng cho MMR).
+
+        Args:
+            embedding: Vector của câu hỏi
+            k: Số kết quả
+            filter: Bộ lọc metadata kiểu Chroma
+
+        Returns:
+            Tuple[List[Document], np.ndarray]: Chunk giảm dần theo điểm và ma trận vector
+        """
+        return self.search_with_vectors_many([embedding], k, filter)[0]
+
+    def search_with_vectors_many(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[List[Document], np.ndarray]]:
+        """
+        Phiên bản batch của search_with_vectors: tìm cho nhiều câu hỏi trong một lần.
+
+        Args:
+            embeddings: Vector của các câu hỏi
+            k: Số kết quả mỗi câu hỏi
+            filter: Bộ lọc metadata kiểu Chroma
+
+        Returns:
+            List[Tuple[List[Document], np.ndarray]]: Kết quả của từng câu hỏi
+        """
+        if not len(embeddings):
+            return []
+        candidates = self._candidates_many(embeddings, k, filter)
+        results = []
+        with self._lock:
+            # Đọc nội dung các slot của cả batch trong một lượt truy vấn SQLite
+            rows = self._rows(np.unique(np.concatenate([slots for slots, _ in candidates])))
+            for slots, _ in candidates:
+                slots = np.asarray([slot for slot in slots.tolist() if slot in rows], dtype=np.int64)
+                vectors = np.asarray(self._matrix[slots], dtype=np.float32)
+                results.append(([rows[slot] for slot in slots.tolist()], vectors))
+        return results
+
+    def max_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self._embedding.embed_query(query), k, fetch_k, lambda_mult, filter
+        )
+
+    # Bản async: embed câu hỏi không chặn event loop, phép nhân ma trận chạy trong thread pool
+
+    async def asimilarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        embedding = await self._embedding.aembed_query(query)
+        return await run_blocking(self.similarity_search_by_vector_with_score, embedding, k, filter)
+
+    async def asimilarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k, filter)]
+
+    async def amax_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> List[Document]:
+        embedding = await self._embedding.aembed_query(query)
+        return await run_blocking(
+            self.max_marginal_relevance_search_by_vector,
+            embedding, k, fetch_k, lambda_mult, filter
+        )
+
+    # ----- Khác -----
+
+    def count(self) -> int:
+        """Số chunk trong collection."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def iter_records(self, page_size: int = 1000) -> Iterator[Tuple[List[str], List[str], List[dict]]]:
+        """
+        Đọc toàn bộ chunk theo trang.
+
+        Yields:
+            Tuple: (ids, texts, metadatas) của mỗi trang
+        """
+        last_slot = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT slot, id, text, metadata FROM records WHERE slot > ? "
+                    "ORDER BY slot LIMIT ?",
+                    (last_slot, page_size)
+                ).fetchall()
+            if not rows:
+                return
+            last_slot = rows[-1][0]
+            yield (
+                [row[1] for row in rows],
+                [row[2] for row in rows],
+                [json.loads(row[3]) for row in rows]
+            )
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        directory: Optional[str] = None,
+        **kwargs: Any
+    ) -> "NumpyVectorStore":
+        if directory is None:
+            raise ValueError("Cần directory để tạo NumpyVectorStore")
+        store = cls(directory, embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
@@ -0,0 +1,112 @@
+"""
+Module lưu các prompt template, chain và compressor đã dựng để dùng lại giữa các request.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+def template_hash(template: Optional[str]) -> str:
+    """
+    Hash của một prompt template, dùng làm một phần khóa registry.
+
+    Args:
+        template: Nội dung template, None cho prompt mặc định
+
+    Returns:
+        str: Hash của template, "default" nếu không có template
+    """
+    if not template:
+        return "default"
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()
+
+
+def params_key(params: Dict[str, Any]) -> str:
+    """
+    Chuỗi ổn định đại diện cho tham số sinh, dùng làm một phần khóa registry.
+
+    Args:
+        params: Tham số (vd. max_output_tokens)
+
+    Returns:
+        str: JSON đã sắp khóa
+    """
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+class PromptRegistry:
+    """
+    Registry LRU có giới hạn các object đã dựng (PromptTemplate, chain,
+    compressor) theo khóa là hash template và tham số.
+
+    Các object này không giữ trạng thái theo request nên dùng chung được giữa
+    các request đồng thời; mỗi cấu hình chỉ tốn chi phí parse/dựng một lần.
+    """
+
+    def __init__(self, max_items: int = 256):
+        """
+        Khởi tạo PromptRegistry.
+
+        Args:
+            max_items: Số object tối đa được giữ, 0 để luôn dựng mới
+        """
+        self.max_items = max(0, max_items)
+        self._items: "OrderedDict[Tuple[Hashable, ...], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_create(self, key: Tuple[Hashable, ...], factory: Callable[[], T]) -> T:
+        """
+        Lấy object theo khóa, dựng bằng factory nếu chưa có.
+
+        Args:
+            key: Khóa gồm loại object, hash template và tham số
+            factory: Hàm dựng object
+
+        Returns:
+            T: Object đã dựng
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item
+            self.misses += 1
+        # Dựng ngoài lock; hai request cùng dựng một khóa chỉ tốn thêm một lần
+        item = factory()
+        if not self.max_items:
+            return item
+        with self._lock:
+            item = self._items.setdefault(key, item)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return item
+
+    def clear(self):
+        """Xóa mọi object (vd. khi đổi LLM mà các chain đang tham chiếu)."""
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Lấy thống kê hit/miss của registry.
+
+        Returns:
+            Dict[str, float]: Số lần hit, miss, tỉ lệ hit và số object đang giữ
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "items": len(self._items)
+            }
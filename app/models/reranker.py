@@ -0,0 +1,111 @@
+"""
+Module rerank documents bằng cross-encoder chạy cục bộ trên CPU.
+"""
+
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import Document
+from langchain_core.documents.compressor import BaseDocumentCompressor
+
+from .concurrency import run_blocking
+
+_models: Dict[str, Any] = {}
+_models_lock = threading.Lock()
+
+
+def load_cross_encoder(model_name: str, device: str = "cpu"):
+    """
+    Load cross-encoder một lần cho mỗi model và dùng chung giữa các request.
+
+    Args:
+        model_name: Tên model trên HuggingFace Hub
+        device: Thiết bị chạy model
+
+    Returns:
+        CrossEncoder: Model đã được load
+    """
+    with _models_lock:
+        model = _models.get(model_name)
+        if model is None:
+            # Import trễ vì sentence_transformers/torch load khá chậm
+            from sentence_transformers import CrossEncoder
+
+            model = CrossEncoder(model_name, device=device)
+            _models[model_name] = model
+        return model
+
+
+class CrossEncoderReranker(BaseDocumentCompressor):
+    """Chấm điểm các cặp (câu hỏi, chunk) trong một lần forward và giữ top_n."""
+
+    model_name: str = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+    top_n: int = 5
+    score_threshold: Optional[float] = None
+    batch_size: int = 32
+
+    def score(self, query: str, documents: Sequence[Document]) -> List[float]:
+        """
+        Tính điểm liên quan của từng document với câu hỏi.
+
+        Args:
+            query: Câu hỏi
+            documents: Danh sách document cần chấm điểm
+
+        Returns:
+            List[float]: Điểm của từng document
+        """
+        if not documents:
+            return []
+        model = load_cross_encoder(self.model_name)
+        scores = model.predict(
+            [(query, doc.page_content) for doc in documents],
+            batch_size=self.batch_size,
+            show_progress_bar=False
+        )
+        return [float(score) for score in scores]
+
+    def select(
+        self,
+        documents: Sequence[Document],
+        scores: Sequence[float]
+    ) -> List[Document]:
+        """
+        Sắp xếp documents theo điểm, lọc theo ngưỡng và giữ top_n.
+
+        Args:
+            documents: Danh sách document
+            scores: Điểm tương ứng
+
+        Returns:
+            List[Document]: Documents đã rerank, điểm nằm trong metadata["relevance_score"]
+        """
+        ranked = sorted(zip(documents, scores), key=lambda item: item[1], reverse=True)
+        results = []
+        for doc, score in ranked[:self.top_n]:
+            if self.score_threshold is not None and score < self.score_threshold:
+                break
+            results.append(Document(
+                page_content=doc.page_content,
+                metadata={**doc.metadata, "relevance_score": score}
+            ))
+        return results
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None
+    ) -> Sequence[Document]:
+        return self.select(documents, self.score(query, documents))
+
+    async def acompress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None
+    ) -> Sequence[Document]:
+        # Forward pass của cross-encoder tốn CPU, chạy trong thread pool chung
+        scores = await run_blocking(self.score, query, documents)
+        return self.select(documents, scores)
@@ -0,0 +1,179 @@
+"""
+Module cache câu trả lời của LLM theo prompt đã render (khớp chính xác).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class LLMResponseCache:
+    """
+    Cache output của LLM theo hash của prompt đã render và tham số sinh (model,
+    temperature, số token tối đa...): tầng LRU trong bộ nhớ và tầng SQLite tùy chọn.
+
+    Khác SemanticAnswerCache, chỉ prompt giống hệt từng byte mới được dùng lại,
+    nên cache đúng cho mọi lời gọi (trả lời, tóm tắt) mà không cần ngưỡng.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        max_memory_items: int = 1000,
+        ttl_seconds: float = 86400
+    ):
+        """
+        Khởi tạo LLMResponseCache.
+
+        Args:
+            db_path: File SQLite lưu cache, None để chỉ cache trong bộ nhớ
+            max_memory_items: Số câu trả lời tối đa trong tầng bộ nhớ
+            ttl_seconds: Thời gian sống của một entry (giây), 0 để không hết hạn
+        """
+        self.max_memory_items = max(0, max_memory_items)
+        self.ttl_seconds = max(0.0, ttl_seconds)
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._conn = None
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )"""
+            )
+            # Dọn các entry đã hết hạn từ lần chạy trước
+            if self.ttl_seconds:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE created_at < ?",
+                    (time.time() - self.ttl_seconds,)
+                )
+            self._conn.commit()
+
+    @property
+    def enabled(self) -> bool:
+        """Cache có tầng nào để lưu không."""
+        return bool(self.max_memory_items) or self._conn is not None
+
+    @property
+    def persistent(self) -> bool:
+        """Cache có tầng SQLite (tra cứu là I/O blocking) không."""
+        return self._conn is not None
+
+    @staticmethod
+    def make_key(prompt: str, params: Dict[str, Any]) -> str:
+        """
+        Tạo khóa cache từ prompt đã render và tham số sinh.
+
+        Args:
+            prompt: Prompt đầy đủ gửi tới LLM
+            params: Model, temperature, số token tối đa và các tham số khác
+
+        Returns:
+            str: Khóa cache
+        """
+        payload = json.dumps(
+            {"prompt": prompt, "params": params},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and now - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, response: str, created_at: float):
+        if not self.max_memory_items:
+            return
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Tra cứu câu trả lời đã lưu.
+
+        Args:
+            key: Khóa tạo bởi make_key
+
+        Returns:
+            Optional[str]: Câu trả lời, None nếu chưa có hoặc đã hết hạn
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[1], now):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[0]
+                del self._memory[key]
+
+            row = None
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and self._expired(row[1], now):
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                    row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._remember(key, row[0], row[1])
+            self.disk_hits += 1
+            return row[0]
+
+    def set(self, key: str, response: str):
+        """
+        Lưu câu trả lời vào cache.
+
+        Args:
+            key: Khóa tạo bởi make_key
+            response: Output của LLM
+        """
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created_at) "
+                    "VALUES (?, ?, ?)",
+                    (key, response, now)
+                )
+                self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Lấy thống kê hit/miss của cache.
+
+        Returns:
+            Dict[str, float]: Số lần hit, miss và tỉ lệ hit
+        """
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                "memory_items": len(self._memory)
+            }
@@ -0,0 +1,212 @@
+"""
+Module tóm tắt văn bản dài theo kiểu map-reduce.
+"""
+
+import asyncio
+import random
+from typing import Dict, List, Sequence
+
+from langchain_core.documents import Document
+from langchain_text_splitters import TextSplitter
+
+from app.config import (
+    SUMMARY_MAX_CONCURRENCY,
+    SUMMARY_MAP_LENGTH,
+    SUMMARY_REDUCE_MAX_CHARS
+)
+from .ingestion import is_rate_limit_error
+from .llm import LLMManager
+
+class SummarizationEngine:
+    def __init__(
+        self,
+        llm_manager: LLMManager,
+        text_splitter: TextSplitter,
+        max_concurrency: int = SUMMARY_MAX_CONCURRENCY,
+        map_length: int = SUMMARY_MAP_LENGTH,
+        reduce_max_chars: int = SUMMARY_REDUCE_MAX_CHARS,
+        max_retries: int = 5,
+        initial_backoff: float = 1.0,
+        max_backoff: float = 30.0
+    ):
+        """
+        Khởi tạo SummarizationEngine.
+
+        Văn bản được split thành các chunk, mỗi chunk được tóm tắt song song
+        (map), sau đó các bản tóm tắt được gộp theo nhóm nhiều tầng cho tới khi
+        còn một bản (reduce). Mỗi lời gọi được cache bởi response cache của
+        LLMManager nên chunk không đổi không bị tóm tắt lại.
+
+        Args:
+            llm_manager: Manager dùng để gọi LLM
+            text_splitter: Splitter dùng để chia văn bản (của DocumentProcessor)
+            max_concurrency: Số request LLM chạy đồng thời tối đa
+            map_length: Độ dài (số từ) của các bản tóm tắt trung gian
+            reduce_max_chars: Số ký tự tối đa của một nhóm tóm tắt ở bước reduce
+            max_retries: Số lần thử lại khi gặp lỗi giới hạn tốc độ
+            initial_backoff: Thời gian chờ (giây) trước lần thử lại đầu tiên
+            max_backoff: Thời gian chờ tối đa giữa hai lần thử
+        """
+        self.llm_manager = llm_manager
+        self.text_splitter = text_splitter
+        self.max_concurrency = max(1, max_concurrency)
+        self.map_length = map_length
+        self.reduce_max_chars = reduce_max_chars
+        self.max_retries = max(0, max_retries)
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+    async def _call(self, semaphore: asyncio.Semaphore, func, *args, **kwargs) -> str:
+        attempt = 0
+        while True:
+            try:
+                async with semaphore:
+                    return await func(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_rate_limit_error(e):
+                    raise
+                delay = min(self.max_backoff, self.initial_backoff * (2 ** attempt))
+                # Chờ ngoài semaphore để request khác được chạy
+                await asyncio.sleep(delay * (0.5 + random.random() / 2))
+                attempt += 1
+
+    async def _summarize_chunk(
+        self,
+        semaphore: asyncio.Semaphore,
+        text: str,
+        max_length: int,
+        bypass_cache: bool = False
+    ) -> str:
+        return await self._call(
+            semaphore,
+            self.llm_manager.agenerate_summary,
+            text=text,
+            max_length=max_length,
+            bypass_cache=bypass_cache
+        )
+
+    async def _combine(
+        self,
+        semaphore: asyncio.Semaphore,
+        summaries: List[str],
+        max_length: int,
+        bypass_cache: bool = False
+    ) -> str:
+        return await self._call(
+            semaphore,
+            self.llm_manager.acombine_summaries,
+            summaries,
+            max_length=max_length,
+            bypass_cache=bypass_cache
+        )
+
+    def _group(self, summaries: List[str]) -> List[List[str]]:
+        """
+        Chia các bản tóm tắt thành nhóm liên tiếp không quá reduce_max_chars.
+
+        Mỗi nhóm có ít nhất hai bản để số bản tóm tắt giảm sau mỗi tầng.
+        """
+        groups: List[List[str]] = [[]]
+        size = 0
+        for summary in summaries:
+            if len(groups[-1]) >= 2 and size + len(summary) > self.reduce_max_chars:
+                groups.append([])
+                size = 0
+            groups[-1].append(summary)
+            size += len(summary)
+        # Nhóm cuối chỉ có một bản sẽ không được rút gọn, gộp vào nhóm trước
+        if len(groups) > 1 and len(groups[-1]) == 1:
+            groups[-2].extend(groups.pop())
+        return groups
+
+    async def asummarize_chunks(
+        self,
+        chunks: Sequence[str],
+        max_length: int = 200,
+        bypass_cache: bool = False
+    ) -> Dict:
+        """
+        Tóm tắt các chunk theo map-reduce.
+
+        Args:
+            chunks: Nội dung các chunk theo thứ tự trong tài liệu
+            max_length: Độ dài tối đa (số từ) của bản tóm tắt cuối
+            bypass_cache: Không đọc cache (kết quả mới vẫn được lưu)
+
+        Returns:
+            Dict: summary, số chunk và số tầng reduce
+        """
+        chunks = [chunk for chunk in chunks if chunk.strip()]
+        if not chunks:
+            return {"summary": "", "chunks": 0, "levels": 0}
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        if len(chunks) == 1:
+            summary = await self._summarize_chunk(semaphore, chunks[0], max_length, bypass_cache)
+            return {"summary": summary, "chunks": 1, "levels": 0}
+
+        # Map: tóm tắt từng chunk song song
+        map_length = min(max_length, self.map_length)
+        summaries = list(await asyncio.gather(*(
+            self._summarize_chunk(semaphore, chunk, map_length, bypass_cache)
+            for chunk in chunks
+        )))
+
+        # Reduce: gộp theo nhóm cho tới khi còn một bản tóm tắt
+        levels = 0
+        while len(summaries) > 1:
+            levels += 1
+            groups = self._group(summaries)
+            # Chỉ tầng cuối cùng dùng độ dài yêu cầu
+            length = max_length if len(groups) == 1 else map_length
+            summaries = list(await asyncio.gather(*(
+                self._combine(semaphore, group, length, bypass_cache)
+                for group in groups
+            )))
+        return {"summary": summaries[0], "chunks": len(chunks), "levels": levels}
+
+    async def asummarize_text(
+        self,
+        text: str,
+        max_length: int = 200,
+        bypass_cache: bool = False
+    ) -> Dict:
+        """
+        Tóm tắt văn bản dài tùy ý.
+
+        Args:
+            text: Văn bản cần tóm tắt
+            max_length: Độ dài tối đa (số từ) của tóm tắt
+            bypass_cache: Không đọc cache (kết quả mới vẫn được lưu)
+
+        Returns:
+            Dict: summary, số chunk và số tầng reduce
+        """
+        return await self.asummarize_chunks(
+            self.text_splitter.split_text(text),
+            max_length=max_length,
+            bypass_cache=bypass_cache
+        )
+
+    async def asummarize_documents(
+        self,
+        documents: Sequence[Document],
+        max_length: int = 200,
+        bypass_cache: bool = False
+    ) -> Dict:
+        """
+        Tóm tắt các chunk đã được split sẵn (vd. lấy từ một collection).
+
+        Args:
+            documents: Các chunk theo thứ tự trong tài liệu
+            max_length: Độ dài tối đa (số từ) của tóm tắt
+            bypass_cache: Không đọc cache (kết quả mới vẫn được lưu)
+
+        Returns:
+            Dict: summary, số chunk và số tầng reduce
+        """
+        return await self.asummarize_chunks(
+            [doc.page_content for doc in documents],
+            max_length=max_length,
+            bypass_cache=bypass_cache
+        )
@@ -0,0 +1,416 @@
+"""
+Benchmark /upload và /message-generator chạy trong process với backend giả lập.
+
+Mỗi kích thước corpus chạy trong một subprocess riêng (thư mục làm việc tạm, cache
+rỗng) để số liệu bộ nhớ và cache không ảnh hưởng lẫn nhau. Với mỗi mức concurrency,
+C client gửi request liên tiếp cho tới khi đủ số request; kết quả gồm throughput,
+p50/p95/p99 latency, thời gian từng stage và peak RSS.
+
+Ví dụ:
+    python -m benchmarks.bench --corpus-sizes 0,50,200 --concurrency 1,4,16 \\
+        --output bench.json
+    python -m benchmarks.bench --baseline bench.json  # lỗi nếu p95 chậm hơn baseline
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+DATA_DIR = ROOT / "data"
+
+# Câu hỏi về tài liệu trong data/, trộn với câu hỏi sinh từ corpus
+_SEED_QUESTIONS = [
+    "Học phí một năm là bao nhiêu?",
+    "Điểm chuẩn ngành công nghệ thông tin năm trước?",
+    "Các phương thức xét tuyển của trường",
+    "Chỉ tiêu tuyển sinh ngành kỹ thuật phần mềm",
+    "Thời gian nộp hồ sơ xét tuyển",
+    "Trường có những ngành đào tạo nào?",
+]
+
+
+def _reset_peak_rss():
+    # Đặt lại VmHWM của process (Linux); nơi khác peak chỉ tăng dần
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _summarize(latencies: Sequence[float], elapsed: float, errors: int) -> Dict:
+    values = np.asarray(latencies, dtype=np.float64) * 1000
+    summary = {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+    }
+    for name, q in (("p50_ms", 50), ("p95_ms", 95), ("p99_ms", 99)):
+        summary[name] = round(float(np.percentile(values, q)), 2) if len(values) else None
+    summary["mean_ms"] = round(float(values.mean()), 2) if len(values) else None
+    return summary
+
+
+def _vocabulary(texts: Sequence[str]) -> List[str]:
+    words = re.findall(r"[^\W\d_]{2,}", " ".join(texts).lower())
+    return sorted(set(words)) or ["tuyển", "sinh", "ngành", "học", "phí"]
+
+
+def make_synthetic_documents(
+    directory: Path,
+    count: int,
+    words_per_document: int,
+    vocabulary: Sequence[str],
+    seed: int
+) -> List[Path]:
+    """
+    Sinh các file .txt từ vocabulary của tài liệu thật, tất định theo seed.
+
+    Args:
+        directory: Thư mục ghi file
+        count: Số file
+        words_per_document: Số từ mỗi file
+        vocabulary: Tập từ dùng để sinh văn bản
+        seed: Seed của bộ sinh số ngẫu nhiên
+
+    Returns:
+        List[Path]: Đường dẫn các file đã sinh
+    """
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(count):
+        sentences = []
+        remaining = words_per_document
+        while remaining > 0:
+            length = min(remaining, rng.randint(8, 20))
+            sentence = " ".join(rng.choice(vocabulary) for _ in range(length))
+            sentences.append(sentence.capitalize() + ".")
+            remaining -= length
+        path = directory / f"synthetic_{i:05d}.txt"
+        path.write_text("\n".join(sentences), encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+def make_questions(vocabulary: Sequence[str], count: int, seed: int) -> List[str]:
+    """Sinh count câu hỏi tất định: câu hỏi mẫu và tổ hợp 3-6 từ của corpus."""
+    rng = random.Random(seed)
+    questions = []
+    for i in range(count):
+        if i % 3 == 0:
+            questions.append(_SEED_QUESTIONS[(i // 3) % len(_SEED_QUESTIONS)])
+        else:
+            words = [rng.choice(vocabulary) for _ in range(rng.randint(3, 6))]
+            questions.append(" ".join(words) + "?")
+    return questions
+
+
+async def _run_uploads(client, files: Sequence[Path], collection: str, concurrency: int) -> Dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+    chunks = 0
+
+    async def upload(path: Path):
+        nonlocal errors, chunks
+        async with semaphore:
+            start = time.perf_counter()
+            with path.open("rb") as f:
+                response = await client.post(
+                    "/api/v1/upload",
+                    params={"collection_name": collection},
+                    files={"file": (path.name, f.read())}
+                )
+            if response.status_code >= 400:
+                print(f"⚠️ {path.name}: {response.text}", file=sys.stderr)
+                errors += 1
+                return
+            job_id = response.json()["job_id"]
+            while True:
+                job = (await client.get(f"/api/v1/upload/{job_id}")).json()
+                if job["status"] in ("completed", "failed"):
+                    break
+                await asyncio.sleep(0.01)
+            if job["status"] == "failed":
+                print(f"⚠️ {path.name}: {job['error']}", file=sys.stderr)
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - start)
+            chunks += job.get("chunks_embedded") or 0
+
+    start = time.perf_counter()
+    await asyncio.gather(*(upload(path) for path in files))
+    elapsed = time.perf_counter() - start
+    result = _summarize(latencies, elapsed, errors)
+    result["chunks"] = chunks
+    result["chunks_per_second"] = round(chunks / elapsed, 2) if elapsed else 0.0
+    result["elapsed_s"] = round(elapsed, 3)
+    return result
+
+
+async def _run_messages(
+    client,
+    questions: Sequence[str],
+    collection: str,
+    concurrency: int,
+    params: Dict
+) -> Dict:
+    queue = list(reversed(questions))
+    latencies: List[float] = []
+    stages: Dict[str, List[float]] = {}
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            question = queue.pop()
+            start = time.perf_counter()
+            response = await client.post(
+                "/api/v1/message-generator",
+                params={"collection_name": collection, "include_timings": "true", **params},
+                json={"question": question}
+            )
+            if response.status_code != 200:
+                print(f"⚠️ {question}: {response.text}", file=sys.stderr)
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            for stage, ms in (response.json().get("timings") or {}).items():
+                stages.setdefault(stage, []).append(ms)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    result = _summarize(latencies, elapsed, errors)
+    result["concurrency"] = concurrency
+    result["stage_p50_ms"] = {
+        stage: round(float(np.percentile(values, 50)), 2)
+        for stage, values in stages.items() if stage != "total"
+    }
+    return result
+
+
+async def _run_corpus(args, corpus_size: int) -> Dict:
+    # Import sau khi fakes.install() đã thay backend Google
+    import httpx
+    from fastapi import FastAPI
+    from app.api import endpoints
+    from app.models.document import DocumentProcessor
+
+    app = FastAPI()
+    app.include_router(endpoints.router, prefix="/api/v1")
+
+    pdfs = sorted(DATA_DIR.glob("*.pdf")) if not args.no_pdfs else []
+    texts = [doc.page_content for pdf in pdfs for doc in DocumentProcessor().load_pages(str(pdf))]
+    vocabulary = _vocabulary(texts)
+    synthetic = make_synthetic_documents(
+        Path("synthetic"), corpus_size, args.words_per_document, vocabulary, args.seed
+    )
+    collection = f"bench_{corpus_size}"
+
+    result: Dict = {"corpus_size": corpus_size, "files": len(pdfs) + len(synthetic)}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        _reset_peak_rss()
+        result["upload"] = await _run_uploads(
+            client, [*pdfs, *synthetic], collection, args.upload_concurrency
+        )
+        result["upload"]["peak_rss_mb"] = round(_peak_rss_mb(), 1)
+
+        params = {"retrieval_mode": args.retrieval_mode, "rerank_mode": "cross_encoder"}
+        # Lượt làm nóng: mở collection và load chỉ mục BM25
+        await _run_messages(client, make_questions(vocabulary, 2, args.seed), collection, 1, params)
+
+        result["message"] = []
+        for level, concurrency in enumerate(args.concurrency):
+            questions = make_questions(vocabulary, args.requests, args.seed + 1 + level)
+            _reset_peak_rss()
+            level_result = await _run_messages(client, questions, collection, concurrency, params)
+            level_result["peak_rss_mb"] = round(_peak_rss_mb(), 1)
+            result["message"].append(level_result)
+    endpoints.chat_history_manager.close()
+    return result
+
+
+def _child(args):
+    """Chạy một kích thước corpus trong thư mục làm việc tạm và in kết quả dạng JSON."""
+    workdir = Path(tempfile.mkdtemp(prefix="rag-bench-"))
+    try:
+        os.chdir(workdir)
+        os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+        os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+        if not args.answer_cache:
+            os.environ["ANSWER_CACHE_SIZE"] = "0"
+        sys.path.insert(0, str(ROOT))
+
+        from benchmarks import fakes
+
+        fakes.install(
+            embedding_dimensions=args.embedding_dimensions,
+            embedding_latency=args.embedding_latency,
+            embedding_latency_per_text=args.embedding_latency_per_text,
+            llm_first_token_latency=args.llm_first_token_latency,
+            llm_tokens_per_second=args.llm_tokens_per_second,
+            llm_output_tokens=args.llm_output_tokens,
+            rerank_latency_per_pair=args.rerank_latency_per_pair
+        )
+        result = asyncio.run(_run_corpus(args, args.child))
+        print("BENCH_RESULT " + json.dumps(result, ensure_ascii=False), flush=True)
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _print_report(results: List[Dict]):
+    print(f"\n{'corpus':>7} {'files':>6} {'chunks':>7} {'upload chunk/s':>15} {'upload p95 ms':>14} {'rss MB':>8}")
+    for result in results:
+        upload = result["upload"]
+        print(
+            f"{result['corpus_size']:>7} {result['files']:>6} {upload['chunks']:>7} "
+            f"{upload['chunks_per_second']:>15} {upload['p95_ms']!s:>14} {upload['peak_rss_mb']:>8}"
+        )
+    print(f"\n{'corpus':>7} {'conc':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'rss MB':>8}")
+    for result in results:
+        for level in result["message"]:
+            print(
+                f"{result['corpus_size']:>7} {level['concurrency']:>5} {level['throughput_rps']:>8} "
+                f"{level['p50_ms']!s:>9} {level['p95_ms']!s:>9} {level['p99_ms']!s:>9} "
+                f"{level['errors']:>7} {level['peak_rss_mb']:>8}"
+            )
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    """
+    So sánh p95 và throughput với baseline.
+
+    Args:
+        results: Kết quả lần chạy hiện tại
+        baseline: Kết quả đã lưu bằng --output
+        tolerance: Tỉ lệ chậm hơn cho phép (0.2 = 20%)
+
+    Returns:
+        List[str]: Mô tả các chỉ số bị chậm đi quá tolerance
+    """
+    previous = {
+        (result["corpus_size"], level["concurrency"]): level
+        for result in baseline for level in result["message"]
+    }
+    regressions = []
+    for result in results:
+        for level in result["message"]:
+            key = (result["corpus_size"], level["concurrency"])
+            old = previous.get(key)
+            if not old or level["p95_ms"] is None or old["p95_ms"] is None:
+                continue
+            if level["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+                regressions.append(
+                    f"corpus={key[0]} concurrency={key[1]}: p95 {old['p95_ms']} -> {level['p95_ms']} ms"
+                )
+            if level["throughput_rps"] < old["throughput_rps"] * (1 - tolerance):
+                regressions.append(
+                    f"corpus={key[0]} concurrency={key[1]}: "
+                    f"throughput {old['throughput_rps']} -> {level['throughput_rps']} req/s"
+                )
+    return regressions
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus-sizes", type=_int_list, default=[0, 50],
+                        help="Số tài liệu sinh thêm ngoài các PDF trong data/")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 4, 16],
+                        help="Các mức concurrency của /message-generator")
+    parser.add_argument("--requests", type=int, default=100, help="Số request mỗi mức concurrency")
+    parser.add_argument("--upload-concurrency", type=int, default=4)
+    parser.add_argument("--words-per-document", type=int, default=2000)
+    parser.add_argument("--no-pdfs", action="store_true", help="Không ingest các PDF trong data/")
+    parser.add_argument("--retrieval-mode", default="hybrid", choices=["hybrid", "vector", "bm25"])
+    parser.add_argument("--answer-cache", action="store_true", help="Bật cache câu trả lời")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--embedding-dimensions", type=int, default=768)
+    parser.add_argument("--embedding-latency", type=float, default=0.05,
+                        help="Độ trễ (giây) mỗi request embedding")
+    parser.add_argument("--embedding-latency-per-text", type=float, default=0.0005)
+    parser.add_argument("--llm-first-token-latency", type=float, default=0.3)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--llm-output-tokens", type=int, default=150)
+    parser.add_argument("--rerank-latency-per-pair", type=float, default=0.002)
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    parser.add_argument("--baseline", help="File JSON của lần chạy trước để so sánh")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Tỉ lệ chậm hơn baseline cho phép trước khi báo lỗi")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    if args.child is not None:
+        _child(args)
+        return 0
+
+    argv = list(sys.argv[1:] if argv is None else argv)
+    results = []
+    for corpus_size in args.corpus_sizes:
+        print(f"🔹 Corpus size {corpus_size} ...", flush=True)
+        process = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench", *argv, "--child", str(corpus_size)],
+            cwd=ROOT,
+            stdout=subprocess.PIPE,
+            text=True
+        )
+        lines = [line for line in process.stdout.splitlines() if line.startswith("BENCH_RESULT ")]
+        if process.returncode != 0 or not lines:
+            print(process.stdout)
+            print(f"⚠️ Benchmark failed for corpus size {corpus_size}")
+            return 1
+        results.append(json.loads(lines[-1][len("BENCH_RESULT "):]))
+
+    _print_report(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"❌ {regression}")
+        if regressions:
+            return 1
+        print("✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""
+Backend giả lập Google Gemini (embedding, chat) và cross-encoder chạy cục bộ,
+dùng cho benchmark không cần mạng.
+
+Kết quả là tất định: cùng đầu vào luôn cho cùng vector/câu trả lời; độ trễ được
+giả lập bằng sleep nên đo được ảnh hưởng của concurrency mà không tốn CPU.
+"""
+
+import asyncio
+import hashlib
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun
+)
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_WORD = re.compile(r"\w+")
+
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Thay cho GoogleGenerativeAIEmbeddings: vector là feature hashing của các từ
+    (đã chuẩn hóa) nên văn bản có nhiều từ chung vẫn gần nhau như embedding thật.
+    """
+
+    # Cấu hình dùng chung cho mọi instance, đặt bởi configure()
+    dimensions: int = 768
+    latency: float = 0.05
+    latency_per_text: float = 0.0005
+
+    def __init__(self, model: str = "fake-embedding", google_api_key: Optional[str] = None, **kwargs):
+        """
+        Khởi tạo FakeEmbeddings với cùng tham số như GoogleGenerativeAIEmbeddings.
+
+        Args:
+            model: Tên model (chỉ để tương thích)
+            google_api_key: Bỏ qua
+        """
+        self.model = model
+        self.calls = 0
+
+    @classmethod
+    def configure(cls, dimensions: int, latency: float, latency_per_text: float):
+        """
+        Đặt số chiều và độ trễ giả lập.
+
+        Args:
+            dimensions: Số chiều của vector
+            latency: Độ trễ (giây) cố định của mỗi request
+            latency_per_text: Độ trễ (giây) thêm cho mỗi văn bản trong request
+        """
+        cls.dimensions = dimensions
+        cls.latency = latency
+        cls.latency_per_text = latency_per_text
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            seed = _seed(word)
+            vector[seed % self.dimensions] += 1.0 if (seed >> 32) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[_seed(text) % self.dimensions] = 1.0
+            norm = 1.0
+        return (vector / norm).tolist()
+
+    def _delay(self, count: int) -> float:
+        self.calls += 1
+        return self.latency + self.latency_per_text * count
+
+    # task_type giữ cùng chữ ký với GoogleGenerativeAIEmbeddings (embed batch câu hỏi)
+    def embed_documents(self, texts: List[str], task_type: Optional[str] = None, **kwargs) -> List[List[float]]:
+        time.sleep(self._delay(len(texts)))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self._delay(1))
+        return self._vector(text)
+
+    async def aembed_documents(
+        self,
+        texts: List[str],
+        task_type: Optional[str] = None,
+        **kwargs
+    ) -> List[List[float]]:
+        await asyncio.sleep(self._delay(len(texts)))
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self._delay(1))
+        return self._vector(text)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Thay cho ChatGoogleGenerativeAI: trả về output_tokens "token" tất định theo
+    prompt, sau độ trễ first_token_latency và với tốc độ tokens_per_second.
+    """
+
+    model: str = "fake-chat"
+    first_token_latency: float = 0.3
+    tokens_per_second: float = 100.0
+    output_tokens: int = 150
+
+    def __init__(self, **kwargs: Any):
+        # Bỏ các tham số riêng của Gemini (google_api_key, temperature, ...)
+        known = {key: value for key, value in kwargs.items() if key in type(self).model_fields}
+        super().__init__(**{**_FAKE_CHAT_DEFAULTS, **known})
+
+    @classmethod
+    def configure(cls, first_token_latency: float, tokens_per_second: float, output_tokens: int):
+        """
+        Đặt độ trễ và tốc độ sinh token cho các instance tạo sau đó.
+
+        Args:
+            first_token_latency: Thời gian (giây) tới token đầu tiên
+            tokens_per_second: Tốc độ sinh token
+            output_tokens: Số token của mỗi câu trả lời
+        """
+        _FAKE_CHAT_DEFAULTS.update(
+            first_token_latency=first_token_latency,
+            tokens_per_second=tokens_per_second,
+            output_tokens=output_tokens
+        )
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = "\n".join(str(message.content) for message in messages)
+        words = _WORD.findall(prompt) or ["ok"]
+        seed = _seed(prompt)
+        return [
+            words[(seed + i * 2654435761) % len(words)] + " "
+            for i in range(self.output_tokens)
+        ]
+
+    @property
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        tokens = self._tokens(messages)
+        time.sleep(self.first_token_latency + self._token_delay * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self.first_token_latency + self._token_delay * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_latency)
+        for token in self._tokens(messages):
+            time.sleep(self._token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.first_token_latency)
+        for token in self._tokens(messages):
+            await asyncio.sleep(self._token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+_FAKE_CHAT_DEFAULTS = {
+    "first_token_latency": FakeChatModel.model_fields["first_token_latency"].default,
+    "tokens_per_second": FakeChatModel.model_fields["tokens_per_second"].default,
+    "output_tokens": FakeChatModel.model_fields["output_tokens"].default
+}
+
+
+class FakeCrossEncoder:
+    """Thay cho sentence_transformers.CrossEncoder: điểm là tỉ lệ từ chung với câu hỏi."""
+
+    def __init__(self, latency_per_pair: float = 0.002):
+        """
+        Khởi tạo FakeCrossEncoder.
+
+        Args:
+            latency_per_pair: Thời gian (giây) chấm điểm một cặp, tính cả batch
+        """
+        self.latency_per_pair = latency_per_pair
+
+    def predict(
+        self,
+        pairs: Sequence[Tuple[str, str]],
+        batch_size: int = 32,
+        show_progress_bar: bool = False
+    ) -> List[float]:
+        time.sleep(self.latency_per_pair * len(pairs))
+        scores = []
+        for query, passage in pairs:
+            query_words = set(_WORD.findall(query.lower()))
+            passage_words = set(_WORD.findall(passage.lower()))
+            scores.append(len(query_words & passage_words) / (len(query_words) or 1))
+        return scores
+
+
+def install(
+    embedding_dimensions: int = 768,
+    embedding_latency: float = 0.05,
+    embedding_latency_per_text: float = 0.0005,
+    llm_first_token_latency: float = 0.3,
+    llm_tokens_per_second: float = 100.0,
+    llm_output_tokens: int = 150,
+    rerank_latency_per_pair: float = 0.002
+):
+    """
+    Thay các class của langchain_google_genai bằng bản giả và đăng ký
+    cross-encoder giả. Phải gọi trước khi import app.
+
+    Args:
+        embedding_dimensions: Số chiều của vector embedding
+        embedding_latency: Độ trễ (giây) của mỗi request embedding
+        embedding_latency_per_text: Độ trễ thêm cho mỗi văn bản
+        llm_first_token_latency: Thời gian (giây) tới token đầu tiên
+        llm_tokens_per_second: Tốc độ sinh token của LLM
+        llm_output_tokens: Số token của mỗi câu trả lời
+        rerank_latency_per_pair: Thời gian (giây) chấm điểm một cặp (câu hỏi, chunk)
+    """
+    import langchain_google_genai
+
+    FakeEmbeddings.configure(embedding_dimensions, embedding_latency, embedding_latency_per_text)
+    FakeChatModel.configure(llm_first_token_latency, llm_tokens_per_second, llm_output_tokens)
+    langchain_google_genai.GoogleGenerativeAIEmbeddings = FakeEmbeddings
+    langchain_google_genai.ChatGoogleGenerativeAI = FakeChatModel
+
+    from app.config import RERANK_MODEL
+    from app.models import reranker
+
+    reranker._models[RERANK_MODEL] = FakeCrossEncoder(rerank_latency_per_pair)
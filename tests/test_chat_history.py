@@ -0,0 +1,60 @@
+import asyncio
+
+from app.models.chat_history import ChatHistoryManager
+from app.models.chat_store import InMemoryChatBackend, SQLiteChatBackend
+
+
+def _write(manager: ChatHistoryManager, count: int) -> str:
+    session_id = manager.create_session()
+    for i in range(count):
+        assert manager.add_message(session_id, "user" if i % 2 == 0 else "assistant", f"tin nhắn {i}")
+    return session_id
+
+
+def test_full_history_survives_cache_truncation():
+    manager = ChatHistoryManager(backend=InMemoryChatBackend(), cache_messages=5)
+    try:
+        session_id = _write(manager, 12)
+        history = manager.get_chat_history(session_id)
+        assert [message["content"] for message in history] == [f"tin nhắn {i}" for i in range(12)]
+        # limit nhỏ hơn cache vẫn trả về các tin nhắn cuối
+        recent = manager.get_chat_history(session_id, limit=3)
+        assert [message["content"] for message in recent] == [f"tin nhắn {i}" for i in range(9, 12)]
+        assert len(manager.get_session(session_id).messages) == 12
+    finally:
+        manager.close()
+
+
+def test_full_history_from_sqlite_after_truncation(tmp_path):
+    manager = ChatHistoryManager(
+        backend=SQLiteChatBackend(str(tmp_path / "chat.sqlite3")),
+        cache_messages=5
+    )
+    try:
+        session_id = _write(manager, 12)
+        assert len(manager.get_chat_history(session_id)) == 12
+        # Ghi thêm sau khi đã đọc lại từ backend
+        manager.add_message(session_id, "user", "tin nhắn 12")
+        assert len(manager.get_chat_history(session_id)) == 13
+    finally:
+        manager.close()
+
+
+def test_async_variants_match_sync(tmp_path):
+    manager = ChatHistoryManager(backend=SQLiteChatBackend(str(tmp_path / "chat.sqlite3")))
+
+    async def main():
+        session_id = await manager.acreate_session()
+        assert await manager.aadd_message(session_id, "user", "xin chào")
+        assert await manager.aadd_message(session_id, "assistant", "chào bạn")
+        history = await manager.aget_chat_history(session_id, limit=1)
+        assert [message["content"] for message in history] == ["chào bạn"]
+        assert await manager.aget_session_info(session_id) is not None
+        assert await manager.adelete_session(session_id)
+        assert await manager.aget_chat_history(session_id) is None
+        assert not await manager.aadd_message(session_id, "user", "còn không?")
+
+    try:
+        asyncio.run(main())
+    finally:
+        manager.close()
@@ -0,0 +1,26 @@
+import asyncio
+import time
+
+import numpy as np
+
+from app.models.embedding_backends import DynamicBatcher
+
+
+def _encode(texts):
+    time.sleep(0.05)
+    return np.ones((len(texts), 3), dtype=np.float32)
+
+
+def test_batcher_survives_cancelled_caller():
+    batcher = DynamicBatcher(_encode, max_wait=0.01)
+
+    async def main():
+        cancelled = asyncio.ensure_future(asyncio.wrap_future(batcher.submit(["a"])))
+        await asyncio.sleep(0.001)
+        cancelled.cancel()
+        await asyncio.sleep(0.2)
+        assert batcher._worker.is_alive()
+        vectors = await asyncio.wait_for(asyncio.wrap_future(batcher.submit(["x", "y"])), 2)
+        assert vectors.shape == (2, 3)
+
+    asyncio.run(main())